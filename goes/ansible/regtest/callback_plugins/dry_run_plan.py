@@ -0,0 +1,182 @@
+""" Callback plugin writing the command plan of a dry run to a plan file """
+
+#
+# This file is part of Ansible
+#
+# Ansible is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Ansible is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Ansible. If not, see <http://www.gnu.org/licenses/>.
+#
+
+#
+# With -e dry_run=True the test modules only plan their commands and return
+# them in 'cmds'. This plugin collects them, in task order, into one plan
+# file per playbook, inventory and extra variables, e.g.
+#   ~/.ansible/regression_plans/quagga_main_hosts_testbed1_3f9c0a1b2c4d.json
+# Plans of two branches can then be compared with plan_diff.py.
+#
+# Set REGTEST_PLAN_DIR to write the plans to another directory.
+#
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import hashlib
+import json
+import os
+import re
+import time
+
+from ansible.plugins.callback import CallbackBase
+
+REGTEST_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_PLAN_DIR = '~/.ansible/regression_plans'
+
+# Extra variables which change on every run without changing the plan
+IGNORED_VARS = ('build_no', 'time', 'main_job_build')
+
+# Hash keys of the test modules are '<switch name> <exec time> <command>'
+_KEY_RE = re.compile(r'^(?P<switch>\S+) \d{10}:\d\d:\d\d (?P<cmd>.*)$',
+                     re.DOTALL)
+
+
+def plan_command(key):
+    """
+    Method to drop the exec time from a planned command, so that plans of
+    different runs compare equal.
+    :param key: Hash key returned by a module in dry run mode.
+    :return: '<switch name> <command>'.
+    """
+    match = _KEY_RE.match(key)
+    if not match:
+        return key
+    return '{} {}'.format(match.group('switch'), match.group('cmd'))
+
+
+def plan_key(playbook, inventory, variables):
+    """
+    Method to get the key of a plan.
+    :param playbook: Playbook path, relative to the regtest directory.
+    :param inventory: List of inventory file names.
+    :param variables: Dict of extra variables.
+    :return: Hex digest.
+    """
+    data = json.dumps([playbook, inventory, variables], sort_keys=True)
+    return hashlib.sha1(data.encode('utf-8')).hexdigest()[:12]
+
+
+def _is_true(value):
+    return str(value).lower() in ('1', 'true', 'yes', 'on')
+
+
+class CallbackModule(CallbackBase):
+    """
+    Writes the commands planned by the modules of a dry run to a plan file.
+    """
+
+    CALLBACK_VERSION = 2.0
+    CALLBACK_TYPE = 'notification'
+    CALLBACK_NAME = 'dry_run_plan'
+    CALLBACK_NEEDS_WHITELIST = True
+
+    def __init__(self):
+        super(CallbackModule, self).__init__()
+        self.playbook = None
+        self.inventory = None
+        self.variables = {}
+        self.dry_run = False
+        self.play_index = -1
+        self.task_index = -1
+        self.task_order = {}
+        self.steps = []
+
+    def v2_playbook_on_start(self, playbook):
+        self.playbook = os.path.relpath(os.path.abspath(playbook._file_name),
+                                        REGTEST_DIR)
+
+    def v2_playbook_on_play_start(self, play):
+        self.play_index += 1
+        if self.inventory is not None:
+            return
+
+        manager = play.get_variable_manager()
+        extra_vars = getattr(manager, 'extra_vars', None)
+        if extra_vars is None:
+            extra_vars = getattr(manager, '_extra_vars', {})
+
+        self.dry_run = _is_true(extra_vars.get('dry_run', False))
+        self.variables = dict((name, value)
+                              for name, value in extra_vars.items()
+                              if name not in IGNORED_VARS)
+
+        inventory = getattr(manager, '_inventory', None)
+        sources = getattr(inventory, '_sources', None)
+        if sources is None and hasattr(inventory, 'src'):
+            sources = [inventory.src()]
+        self.inventory = sorted(os.path.basename(str(source))
+                                for source in sources or [])
+
+    def v2_playbook_on_task_start(self, task, is_conditional):
+        self.task_index += 1
+        self.task_order[task._uuid] = (self.play_index, self.task_index)
+
+    def v2_runner_on_ok(self, result):
+        if not self.dry_run:
+            return
+
+        cmds = result._result.get('cmds')
+        if not isinstance(cmds, list):
+            return
+
+        task = result._task
+        play_index, task_index = self.task_order.get(
+            task._uuid, (self.play_index, self.task_index))
+        self.steps.append({
+            'play': play_index,
+            'task': task_index,
+            'name': task.get_name(),
+            'module': task.action,
+            'host': result._host.get_name(),
+            'cmds': [plan_command(cmd) for cmd in cmds],
+        })
+
+    def v2_playbook_on_stats(self, stats):
+        if not self.dry_run or self.playbook is None:
+            return
+
+        plan_dir = os.path.expanduser(
+            os.environ.get('REGTEST_PLAN_DIR', DEFAULT_PLAN_DIR))
+        if not os.path.isdir(plan_dir):
+            os.makedirs(plan_dir)
+
+        inventory = self.inventory or []
+        key = plan_key(self.playbook, inventory, self.variables)
+        name = '_'.join([os.path.splitext(os.path.basename(self.playbook))[0]]
+                        + [os.path.splitext(i)[0] for i in inventory] + [key])
+        path = os.path.join(plan_dir, name + '.json')
+
+        self.steps.sort(key=lambda step: (step['play'], step['task'],
+                                          step['host']))
+        plan = {
+            'key': key,
+            'playbook': self.playbook,
+            'inventory': inventory,
+            'variables': self.variables,
+            'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'steps': self.steps,
+        }
+        with open(path, 'w') as f:
+            json.dump(plan, f, indent=2, sort_keys=True)
+
+        self._display.display('Dry run plan of {} commands written to {}'.format(
+            sum(len(step['cmds']) for step in self.steps), path))
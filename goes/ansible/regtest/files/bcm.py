@@ -3,197 +3,371 @@
 #send command into broadcom shell and return result
 #expect bcm_shell already running on local machine in a screen shell
 #
-# Usage: python bcm.py [help]
+# Usage: python bcm.py "command" ["command" ...]
+#        python bcm.py --daemon [--idle SECONDS]
+#        python bcm.py --stop
+#
+# Commands are run by a bcm-shell broker, a background process which takes
+# requests on a UNIX socket and runs them one at a time. It stays attached to
+# the screen session while requests keep coming, so a burst of calls pays for
+# attaching to the shell once, and detaches a few seconds after the last one
+# so that screen -r works again. The broker is started on first use and exits
+# after being idle for a while. Several commands given in one call are sent
+# as one request.
+#
+# A command which fails in the broker is not retried, since bcm-shell commands
+# such as "cint stoploop.cint" must not run twice: the outputs of the commands
+# run before it are printed with the error, and bcm.py exits with 1.
 #
 
+from __future__ import print_function
+
+import json
+import os
+import socket
+import stat
+import subprocess
 import sys
-import re
+import time
+import uuid
+
 import pexpect
 
 #
-# For talking to bcm-shell.
+# One broker per user, since each user has its own screen session. Its socket
+# is in a directory only the user can enter.
 #
-bcm_pe = None
+if os.getuid() == 0 and os.path.isdir("/run"):
+    SOCKET_DIR = "/run/bcm_shell"
+else:
+    SOCKET_DIR = "/tmp/bcm_shell.{}".format(os.getuid())
+SOCKET_PATH = os.path.join(SOCKET_DIR, "broker.sock")
 
-#----------------------------------------------------
-#
-# bcm_wait_prompt
 #
-# Wait for prompt to return.
+# bcm-shell prompt, BCM.0> (spine), BCM.1> and BCM.2> (leaf).
 #
-def bcm_wait_prompt():
-    try:
-        bcm_pe.expect("BCM", timeout=5)
-    except:
-        return(False)
-    #endtry
-    return(True)
-#enddef
+PROMPT = r"BCM\.\d+> ?"
 
+IDLE_TIMEOUT = 600
+ATTACH_TIMEOUT = 5
+COMMAND_TIMEOUT = 30
+
+#----------------------------------------------------
 #
-# bcm_conenct
+# BcmShell
 #
-# Setup pexpect so we have connection to the bcm-shell to send commands to
-# bcm.0 (spine), bcm.2 (leaf ports ce0-ce15), and bcm.1 (leaf ports ce16-ce31).
+# Connection to the bcm-shell running in a screen session, to send commands
+# to bcm.0 (spine), bcm.2 (leaf ports ce0-ce15), and bcm.1 (leaf ports
+# ce16-ce31).
 #
-def bcm_connect():
-    global bcm_pe
+class BcmShell(object):
 
-    bcm_pe = pexpect.spawn("screen -r")
-    if (bcm_pe == None): return(False)
+    def __init__(self):
+        self.pe = None
 
-    bcm_pe.sendline("\n")
-    bcm_pe.sendline("\n")
-    bcm_pe.sendline("\n")
-    bcm_pe.sendline("\n")
-    bcm_pe.sendline("\n")
-    bcm_pe.sendline("\n")
-    if (bcm_wait_prompt() == False): return(False)
+    #
+    # connect
+    #
+    # Attach to the screen session and wait for the prompt.
+    #
+    def connect(self):
+        self.pe = pexpect.spawn("screen -r")
+        self.pe.sendline("")
+        try:
+            self.pe.expect(PROMPT, timeout=5)
+        except (pexpect.TIMEOUT, pexpect.EOF):
+            self.pe = None
+            return(False)
+        #endtry
+        return(True)
+    #enddef
 
-    if (bcm_wait_prompt() == False): return(False)
-    return(True)
-#enddef
+    #
+    # disconnect
+    #
+    # Detach from screen, which leaves the bcm-shell running.
+    #
+    def disconnect(self):
+        if self.pe is not None:
+            self.pe.sendcontrol("a")
+            self.pe.send("d")
+            self.pe.close()
+        self.pe = None
+    #enddef
+
+    #
+    # run
+    #
+    # Run one command and return its output. The command is followed by an
+    # echo of a unique marker; the output ends where the echoed marker starts
+    # a line (the typed input 'BCM.0> echo marker' never does), and the
+    # prompt after it is consumed, so nothing is left over for the next one.
+    #
+    def run(self, command, timeout=COMMAND_TIMEOUT):
+        marker = "endCommand_{}".format(uuid.uuid4().hex)
+        self.pe.sendline(command)
+        self.pe.sendline("echo " + marker)
+        self.pe.expect(r"\n" + marker, timeout=timeout)
+        output = self.pe.before
+        self.pe.expect(PROMPT, timeout=timeout)
+
+        if isinstance(output, bytes):
+            output = output.decode("utf-8", "replace")
+
+        # drop the echoed command and the trailing prompt with the echo
+        lines = output.replace("\r", "").split("\n")
+        if lines and lines[0].strip().endswith(command.strip()):
+            lines = lines[1:]
+        if lines and lines[-1].strip().endswith("echo " + marker):
+            lines = lines[:-1]
+        return "\n".join(lines)
+    #enddef
+
+    #
+    # run_all
+    #
+    # Run a batch of commands, attaching first if needed. The output of each
+    # command is appended to outputs as soon as it completes, so the caller
+    # has the outputs of the commands run before one that failed. A failed
+    # command is never sent again, as it may have run already.
+    #
+    def run_all(self, commands, timeout=COMMAND_TIMEOUT, outputs=None):
+        if outputs is None:
+            outputs = []
+        if self.pe is None and not self.connect():
+            raise IOError("cannot connect to bcm_shell")
+        for command in commands:
+            outputs.append(self.run(command, timeout))
+        #endfor
+        return outputs
+    #enddef
+#endclass
 
 #
-# bcm_disconnect
+# send_line / recv_line
 #
-# Disconnect from telenet which terminates the bcm-shell.
+# Requests and replies are one JSON document per line.
 #
-def bcm_disconnect():
-    global bcm_pe
+def send_line(sock, data):
+    sock.sendall((json.dumps(data) + "\n").encode("utf-8"))
+#enddef
+
+def recv_line(sock):
+    data = b""
+    while not data.endswith(b"\n"):
+        chunk = sock.recv(65536)
+        if not chunk:
+            break
+        data += chunk
+    #endwhile
+    return json.loads(data.decode("utf-8")) if data else None
+#enddef
 
-    bcm_pe.sendcontrol("a")
-    bcm_pe.sendline("d")
-    bcm_pe = None
-    #try:
-    #    bcm_pe.expect("platina@ubuntu:~/bin$", timeout=5)
-    #    bcm_pe = None
-    #except:
-    #    return(False)
+#
+# private_dir
+#
+# Create the socket directory, or check that an existing one is a directory
+# of ours only we can enter. Returns False if it cannot be used.
+#
+def private_dir(path=SOCKET_DIR):
+    try:
+        os.mkdir(path, 0o700)
+    except OSError:
+        pass
     #endtry
-    return(True)
+    try:
+        st = os.lstat(path)
+    except OSError:
+        return(False)
+    #endtry
+    return(stat.S_ISDIR(st.st_mode) and st.st_uid == os.getuid() and
+           stat.S_IMODE(st.st_mode) == 0o700)
 #enddef
 
 #
-# bcm_send
+# serve
 #
-# Send command to bcm-shell. If there is a multi-command in variable "command"
-# make sure we put chip unit number in front of each of them. Value "chip"
-# is in Platina naming convention (i.e. Lx-0, Lx-1, Sx-2).
+# Broker main loop. Connections are handled one at a time, which serializes
+# the commands of concurrent callers. The screen session is detached once no
+# request came for ATTACH_TIMEOUT seconds.
 #
-def bcm_send(command):
-    commands = command.split(";")
+def serve(idle):
+    shell = BcmShell()
+    if not shell.connect():
+        print("Cannot connect to bcm_shell; check if screen -r gets to bcm_shell")
+        return(1)
 
-    new_commands = []
-    for command in commands:
-        new_commands.append(command)
-    #endfor
-    command = ";".join(new_commands)
-    bcm_pe.sendline(command)
-    print "{}".format(command)
+    if not private_dir():
+        print("Cannot use {} for the broker socket".format(SOCKET_DIR))
+        shell.disconnect()
+        return(1)
+
+    if os.path.exists(SOCKET_PATH):
+        os.unlink(SOCKET_PATH)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    umask = os.umask(0o077)
+    try:
+        server.bind(SOCKET_PATH)
+    finally:
+        os.umask(umask)
+    #endtry
+    server.listen(8)
+
+    try:
+        while True:
+            server.settimeout(ATTACH_TIMEOUT if shell.pe is not None else idle)
+            try:
+                conn, addr = server.accept()
+            except socket.timeout:
+                if shell.pe is None:
+                    break
+                shell.disconnect()
+                continue
+            #endtry
+            try:
+                conn.settimeout(None)
+                request = recv_line(conn)
+                if not request or request.get("stop"):
+                    send_line(conn, {"outputs": []})
+                    if request and request.get("stop"):
+                        break
+                    continue
+                outputs = []
+                try:
+                    shell.run_all(request["commands"],
+                                  request.get("timeout", COMMAND_TIMEOUT),
+                                  outputs)
+                    send_line(conn, {"outputs": outputs})
+                except (IOError, pexpect.ExceptionPexpect) as e:
+                    shell.disconnect()
+                    error = (str(e).splitlines() or [type(e).__name__])[0]
+                    send_line(conn, {"outputs": outputs, "error": error})
+                #endtry
+            except (IOError, OSError, ValueError):
+                pass
+            finally:
+                conn.close()
+            #endtry
+        #endwhile
+    finally:
+        server.close()
+        if os.path.exists(SOCKET_PATH):
+            os.unlink(SOCKET_PATH)
+        shell.disconnect()
+    #endtry
+    return(0)
 #enddef
 
 #
-# bcm_read
+# request
 #
-# Read from bcm-shell display.
+# Send a request to the broker, starting it if it is not running.
+# Returns the reply, or None if no broker could be reached. A reply cut
+# short by the broker is returned as an error.
 #
-def bcm_read():
-    output = ""
-    #skip 2 first lines, which typically is the previous line command input
-    #sometimes it catches "BCM.0" so rest of read doesn't happen
-    #dump = bcm_pe.readline()
-    #print "skipping.."+dump
-    while (True):
+def request(data, start=True):
+    if not private_dir():
+        return None
+    for attempt in range(50):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
         try:
-            out = bcm_pe.read_nonblocking(size=40000, timeout=2)
-            output += out
-            #if (out.find("BCM.0") != -1): return(output)
-            if (out.find("endCommand") != -1): return(output)
-        except:
-            return(output+'timed out')
+            sock.connect(SOCKET_PATH)
+        except (IOError, OSError):
+            sock.close()
+            if not start:
+                return None
+            if attempt == 0:
+                devnull = open(os.devnull, "wb")
+                subprocess.Popen([sys.executable, os.path.abspath(__file__),
+                                  "--daemon"], stdout=devnull, stderr=devnull,
+                                 close_fds=True, preexec_fn=os.setsid)
+                devnull.close()
+            time.sleep(0.2)
+            continue
         #endtry
-    #endwhile
-#endde
-
-def flush():
-    output = ""
-    #skip 2 first lines, which typically is the previous line command input
-    #sometimes it catches "BCM.0" so rest of read doesn't happen
-    while (True):
         try:
-            out = bcm_pe.read_nonblocking(size=40000, timeout=0.5)
-            output += out
-            if (out.find("BCM.0") != -1): return(output)
-        except:
-            return(output)
+            send_line(sock, data)
+            reply = recv_line(sock)
+        except (IOError, OSError, ValueError) as e:
+            return {"error": "incomplete reply from bcm_shell broker: {}".format(e)}
+        finally:
+            sock.close()
         #endtry
-    #endwhile
-#endde
+        if reply is None:
+            return {"error": "no reply from bcm_shell broker"}
+        return reply
+    #endfor
+    return None
+#enddef
 
 #
-# flush_read()
+# run_direct
 #
-# clear out any left over lines in read buffer
-# doesn' work, causes problem...
+# Attach, run and detach without a broker, as a last resort.
 #
-def flush_read():
-    output = ""
-    while (True):
-        i = bcm_pe.expect ([pexpect.TIMEOUT, pexpect.EOF], timeout=2)
-        if i == 0:
-            if (repr(bcm_pe.before) == '\'\''):
-                break
-            print "before = {}".format(repr(bcm_pe.before))
-            if bcm_pe.before:
-                bcm_pe.expect (r'.+')
-        else:
-            break
-    #end while
-#endde
+def run_direct(commands):
+    shell = BcmShell()
+    if not shell.connect():
+        return None
+    try:
+        return shell.run_all(commands)
+    finally:
+        shell.disconnect()
+    #endtry
+#enddef
 
 #----------------------------------------------
 
-#print "len(sys.argv) = {}".format(len(sys.argv))
-if (help in sys.argv or len(sys.argv) < 2):
-    print
-    print "Usage: bcm.py \"command\""
-    print "where command is the entire line of command, inclosed in quoates, as you would enter into bcm_shell"
-    print
+args = sys.argv[1:]
+if ("help" in args or len(args) < 1):
+    print()
+    print("Usage: bcm.py \"command\" [\"command\" ...]")
+    print("where command is the entire line of command, inclosed in quoates, as you would enter into bcm_shell")
+    print("       bcm.py --daemon [--idle SECONDS]   run the bcm_shell broker")
+    print("       bcm.py --stop                      stop the bcm_shell broker")
+    print()
     exit(1)
 #endif
 
-if (bcm_connect() == False): 
-    print "Cannot connect to bcm_shell; check if screen -r gets to bcm_shell"
-    exit(0)
+if args[0] == "--daemon":
+    idle = IDLE_TIMEOUT
+    if len(args) > 2 and args[1] == "--idle":
+        idle = float(args[2])
+    exit(serve(idle))
 #endif
 
-#flush_read()
-#do a read in lieu of a flush
-#throwaway = flush()
-#print "throwing away..."+throwaway
-
-bcm_send(sys.argv[1])
+if args[0] == "--stop":
+    request({"stop": True}, start=False)
+    exit(0)
+#endif
 
-bcm_send('echo endCommand')
+#
+# Only run the commands directly when no broker could be reached: after a
+# broker error some of them may have run already.
+#
+reply = request({"commands": args})
+error = None
+if reply is None:
+    outputs = run_direct(args)
+else:
+    outputs = reply.get("outputs") or []
+    error = reply.get("error")
+#endif
 
-output = bcm_read()
-if (bcm_disconnect() == False):
-    print "Did not quit out of screen correctly"
+if outputs is None:
+    print("Cannot connect to bcm_shell; check if screen -r gets to bcm_shell")
     exit(0)
 #endif
 
-lines = output.split("\n")
-i = 1
-for line in lines:
-    #special2 = repr(line)
-    #line = re.sub('\x1b.*?23d', '', line)
-    #line = re.sub('\x1b.*?H', '', line)
-    #line = re.sub('\x1b.*?C', '', line)
-    #line = re.sub('\+', '   +', line)
-    #special = repr(line)
-    #print "line {}: {}".format(i, special)
-    print "{}".format(line)
-    i = i + 1
+for command, output in zip(args, outputs):
+    print("{}".format(command))
+    print("{}".format(output))
+#endfor
+
+if error is not None:
+    print("bcm_shell failed after {} of {} commands: {}".format(
+        len(outputs), len(args), error), file=sys.stderr)
+    exit(1)
+#endif
 
 #end
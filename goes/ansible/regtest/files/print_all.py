@@ -29,10 +29,12 @@ from mrtparse import *
 
 indt = ' ' * 4
 indt_num = 0
-contents = ''
+
+# output sink, every line is written out as soon as it is formatted
+out = sys.stdout
 
 def prerror(m):
-    print('%s: %s' % (MRT_ERR_C[m.err], m.err_msg))
+    out.write('%s: %s\n' % (MRT_ERR_C[m.err], m.err_msg))
     if m.err == MRT_ERR_C['MRT Header Error']:
         buf = m.buf
     else:
@@ -45,17 +47,16 @@ def prerror(m):
             s += '%02x ' % buf[i]
 
         if (i + 1) % 16 == 0:
-            print('    %s' % s)
+            out.write('    %s\n' % s)
             s = ''
         elif (i + 1) % 8 == 0:
             s += ' '
     if len(s):
-        print('    %s' % s)
+        out.write('    %s\n' % s)
 
 def put_lines(*lines):
-    global contents
     for line in lines:
-        contents += indt * indt_num + line + '\n'
+        out.write(indt * indt_num + line + '\n')
 
 def print_mrt(m):
     global indt_num
@@ -511,14 +512,220 @@ def print_nlri(nlri, title, *args):
         else:
             put_lines('%s: %s/%d' % (title, nlri.prefix, nlri.plen))
 
-def main():
-    global contents
+def nlri_prefix(nlri):
+    return '%s/%d' % (nlri.prefix, nlri.plen)
+
+def record_names(m):
+    # names a record can be filtered by: MRT type, subtype and BGP message type
+    names = [MRT_T.get(m.type, 'Unknown')]
+    if m.type == MRT_T['TABLE_DUMP_V2']:
+        names.append(TD_V2_ST.get(m.subtype, 'Unknown'))
+    elif m.type == MRT_T['BGP4MP'] or m.type == MRT_T['BGP4MP_ET']:
+        names.append(BGP4MP_ST.get(m.subtype, 'Unknown'))
+        msg = getattr(m.bgp, 'msg', None)
+        if msg is not None:
+            names.append(BGP_MSG_T.get(msg.type, 'Unknown'))
+    return names
+
+def record_routes(m, peer_table):
+    # returns (peers, announced prefixes, withdrawn prefixes) of a record;
+    # peer_table keeps the peers of the last TABLE_DUMP_V2 PEER_INDEX_TABLE
+    peers, announced, withdrawn = [], [], []
+
+    if m.type == MRT_T['TABLE_DUMP']:
+        peers = [m.td.peer_ip]
+        announced = ['%s/%d' % (m.td.prefix, m.td.plen)]
+
+    elif m.type == MRT_T['TABLE_DUMP_V2']:
+        if m.subtype == TD_V2_ST['PEER_INDEX_TABLE']:
+            peer_table[:] = [entry.ip for entry in m.peer.entry]
+        elif getattr(m, 'rib', None) is not None:
+            if hasattr(m.rib, 'nlri'):
+                announced = [nlri_prefix(nlri) for nlri in m.rib.nlri]
+            else:
+                announced = ['%s/%d' % (m.rib.prefix, m.rib.plen)]
+            for entry in m.rib.entry:
+                if entry.peer_index < len(peer_table):
+                    peers.append(peer_table[entry.peer_index])
+                else:
+                    peers.append('peer index %d' % entry.peer_index)
+
+    elif m.type == MRT_T['BGP4MP'] or m.type == MRT_T['BGP4MP_ET']:
+        peers = [m.bgp.peer_ip]
+        msg = getattr(m.bgp, 'msg', None)
+        if msg is not None and msg.type == BGP_MSG_T['UPDATE']:
+            announced = [nlri_prefix(nlri) for nlri in msg.nlri]
+            withdrawn = [nlri_prefix(nlri) for nlri in msg.withdrawn]
+            for attr in msg.attr:
+                if attr.type == BGP_ATTR_T['MP_REACH_NLRI']:
+                    announced.extend(nlri_prefix(nlri)
+                                     for nlri in attr.mp_reach.get('nlri', []))
+                elif attr.type == BGP_ATTR_T['MP_UNREACH_NLRI']:
+                    withdrawn.extend(nlri_prefix(nlri)
+                                     for nlri in attr.mp_unreach.get('withdrawn', []))
+
+    return peers, announced, withdrawn
+
+def match_prefix(prefixes, wanted):
+    for prefix in prefixes:
+        if prefix in wanted or prefix.split('/')[0] in wanted:
+            return True
+    return False
+
+def records(filename, types=None, peers=None, prefixes=None):
+    # generator over the records of a dump, one at a time, yielding
+    # (mrt, peers, announced, withdrawn) for the records passing the filters;
+    # records with errors are always yielded
+    peer_table = []
+    for m in Reader(filename):
+        m = m.mrt
+        if m.err is not None:
+            yield m, [], [], []
+            continue
+
+        r_peers, announced, withdrawn = record_routes(m, peer_table)
+        if types and not set(record_names(m)) & types:
+            continue
+        if peers and not set(r_peers) & peers:
+            continue
+        if prefixes and not match_prefix(announced + withdrawn, prefixes):
+            continue
+        yield m, r_peers, announced, withdrawn
 
-    if len(sys.argv) != 2:
-        print('Usage: %s FILENAME' % sys.argv[0])
+def print_record(m):
+    out.write('---------------------------------------------------------------\n')
+    if m.err == MRT_ERR_C['MRT Header Error']:
+        prerror(m)
+        return
+    print_mrt(m)
+
+    if m.err == MRT_ERR_C['MRT Data Error']:
+        prerror(m)
+        return
+    if m.type == MRT_T['TABLE_DUMP']:
+        print_td(m)
+    elif m.type == MRT_T['TABLE_DUMP_V2']:
+        print_td_v2(m)
+    elif m.type == MRT_T['BGP4MP'] \
+        or m.type == MRT_T['BGP4MP_ET']:
+        print_bgp4mp(m)
+
+class Summary(object):
+    # aggregate churn statistics, built in a single pass over the records
+
+    def __init__(self, burst):
+        self.burst = burst
+        self.records = 0
+        self.errors = 0
+        self.first = None
+        self.last = None
+        self.updates = {}
+        self.withdrawals = {}
+        self.peers = {}
+
+    def add(self, m, peers, announced, withdrawn):
+        self.records += 1
+        if m.err is not None:
+            self.errors += 1
+            return
+
+        ts = m.ts
+        if self.first is None or ts < self.first:
+            self.first = ts
+        if self.last is None or ts > self.last:
+            self.last = ts
+
+        if 'UPDATE' in record_names(m):
+            self.updates[ts] = self.updates.get(ts, 0) + 1
+        if withdrawn:
+            self.withdrawals[ts] = self.withdrawals.get(ts, 0) + len(withdrawn)
+
+        for peer in peers:
+            stats = self.peers.get(peer)
+            if stats is None:
+                stats = self.peers[peer] = [0, 0, set()]
+            # a RIB record lists several peers for its one prefix
+            stats[0] += len(announced)
+            stats[1] += len(withdrawn)
+            stats[2].update(announced)
+
+    def bursts(self):
+        # runs of consecutive seconds with at least `burst` withdrawals each
+        runs = []
+        for ts in sorted(self.withdrawals):
+            if self.withdrawals[ts] < self.burst:
+                continue
+            if runs and runs[-1][1] == ts - 1:
+                runs[-1][1] = ts
+                runs[-1][2] += self.withdrawals[ts]
+            else:
+                runs.append([ts, ts, self.withdrawals[ts]])
+        return runs
+
+    def write(self):
+        global indt_num
+        indt_num = 0
+        put_lines('MRT Summary')
+        indt_num = 1
+        put_lines('Records: %d (%d with errors)' % (self.records, self.errors))
+        if self.first is None:
+            return
+
+        span = self.last - self.first + 1
+        put_lines('Time Span: %s - %s (%ds)' % (
+            datetime.fromtimestamp(self.first),
+            datetime.fromtimestamp(self.last), span))
+
+        total = sum(self.updates.values())
+        put_lines('BGP Updates: %d' % total)
+        if total:
+            peak = max(self.updates, key=lambda ts: self.updates[ts])
+            indt_num = 2
+            put_lines(
+                'Average: %.2f/s' % (float(total) / span),
+                'Peak: %d/s at %s' % (self.updates[peak],
+                                      datetime.fromtimestamp(peak)))
+
+        indt_num = 1
+        put_lines('Prefixes per Peer (announced/withdrawn/unique):')
+        indt_num = 2
+        for peer in sorted(self.peers):
+            stats = self.peers[peer]
+            put_lines('%s: %d/%d/%d' % (peer, stats[0], stats[1], len(stats[2])))
+
+        indt_num = 1
+        put_lines('Withdraw Bursts (>= %d withdrawals/s):' % self.burst)
+        indt_num = 2
+        for start, end, count in self.bursts():
+            put_lines('%s - %s: %d withdrawals in %ds' % (
+                datetime.fromtimestamp(start), datetime.fromtimestamp(end),
+                count, end - start + 1))
+
+def main():
+    global out
+
+    parser = OptionParser(usage='%prog [options] FILENAME')
+    parser.add_option('-t', '--type', action='append', default=[],
+                      help='only records of this MRT type, subtype or BGP '
+                           'message type, e.g. UPDATE (repeatable)')
+    parser.add_option('-p', '--peer', action='append', default=[],
+                      help='only records from/for this peer IP (repeatable)')
+    parser.add_option('-x', '--prefix', action='append', default=[],
+                      help='only records announcing or withdrawing this '
+                           'prefix, e.g. 10.0.0.0/24 (repeatable)')
+    parser.add_option('-s', '--summary', action='store_true', default=False,
+                      help='print aggregate churn statistics only')
+    parser.add_option('-b', '--burst', type='int', default=100,
+                      help='withdrawals per second counted as a burst')
+    parser.add_option('-o', '--output', help='write to this file')
+    (options, args) = parser.parse_args()
+
+    if len(args) != 1:
+        parser.print_usage()
         exit(1)
 
-    d = Reader(sys.argv[1])
+    if options.output:
+        out = open(options.output, 'w')
 
     # if you want to use 'asdot+' or 'asdot' for AS numbers,
     # comment out either line below.
@@ -526,28 +733,18 @@ def main():
     #
     # as_repr(AS_REPR['asdot+'])
     # as_repr(AS_REPR['asdot'])
-    for m in d:
-        contents = ''
-        m = m.mrt
-        print('---------------------------------------------------------------')
-        if m.err == MRT_ERR_C['MRT Header Error']:
-            prerror(m)
-            continue
-        print_mrt(m)
-        sys.stdout.write(contents)
+    summary = Summary(options.burst) if options.summary else None
+    for m, peers, announced, withdrawn in records(
+            args[0], set(options.type), set(options.peer),
+            set(options.prefix)):
+        if summary is not None:
+            summary.add(m, peers, announced, withdrawn)
+        else:
+            print_record(m)
 
-        contents = ''
-        if m.err == MRT_ERR_C['MRT Data Error']:
-            prerror(m)
-            continue
-        if m.type == MRT_T['TABLE_DUMP']:
-            print_td(m)
-        elif m.type == MRT_T['TABLE_DUMP_V2']:
-            print_td_v2(m)
-        elif m.type == MRT_T['BGP4MP'] \
-            or m.type == MRT_T['BGP4MP_ET']:
-            print_bgp4mp(m)
-        sys.stdout.write(contents)
+    if summary is not None:
+        summary.write()
+    out.flush()
 
 if __name__ == '__main__':
     main()
@@ -1,92 +1,97 @@
 #!/usr/bin/python3
 import argparse
 import datetime
+import io
 import os
-import sys
+import re
+import signal
+import subprocess
+import tarfile
+import tempfile
+import threading
 import time
 from collections import namedtuple
-from subprocess import call
-from subprocess import check_output
+from concurrent.futures import ThreadPoolExecutor
 
 Tech = namedtuple('Tech', 'name cmdlist')
 
 # run each cmdlist, add timestamp to name
-# these commands run at start and end of show tech to get incremental stats
+# these commands run twice, back to back, to get incremental stats
 TechTimeStampList = [
     Tech(name="vnet_stats",
-         cmdlist={
+         cmdlist=(
              "goes vnet show errors",
              "goes vnet show hardware",
-         }),
+         )),
     Tech(name="fe1_stats",
-         cmdlist={
+         cmdlist=(
              "goes vnet show fe1 int",
              "goes vnet show fe1 pipe",
-         }),
+         )),
 ]
 
 # run each cmdlist, write output to 'name'
 TechList = [
     Tech(name="hardware",
-         cmdlist={
+         cmdlist=(
              "goes hget platina-mk1 eeprom",
              "goes hget platina-mk1 qsfp",
              "goes vnet show fe1 switches",
              "goes vnet show fe1 temp",
-         }),
+         )),
     Tech(name="system",
-         cmdlist={
+         cmdlist=(
              "date",
              "uname -a",
              "uptime",
              "cat /etc/modprobe.d/goesd-platina-mk1-modprobe.conf",
              "modinfo platina-mk1",
              "ethtool -i xeth1",
-         }),
+         )),
     Tech(name="journalctl",
-         cmdlist={
+         cmdlist=(
              "journalctl",
-         }),
+         )),
     Tech(name="ip",
-         cmdlist={
+         cmdlist=(
              "arp -v",
              "ip route",
              "ip neighbor",
              "ip netns",
              "ip -s link",
-         }),
+         )),
     Tech(name="interfaces",
-         cmdlist={
+         cmdlist=(
              "cat /etc/network/interfaces",
              "grep -H . /etc/network/interfaces.d/*",
-         }),
+         )),
     Tech(name="xeth_util",
-         cmdlist={
+         cmdlist=(
              "./xeth_util.sh netns_showup",
              "./xeth_util.sh netns_show ip route vrf",
-         }),
+         )),
     Tech(name="docker",
-         cmdlist={
+         cmdlist=(
              "docker ps",
-         }),
+         )),
     Tech(name="lldp",
-         cmdlist={
+         cmdlist=(
              "cat /etc/lldpd.conf",
              "lldpcli show config",
              "lldpcli show neighbor",
-         }),
+         )),
     Tech(name="goes",
-         cmdlist={
+         cmdlist=(
              "goes status",
              "goes version",
-         }),
+         )),
     Tech(name="phy",
-         cmdlist={
+         cmdlist=(
              "goes vnet show fe1 port phy",
              "goes vnet show fe1 serdes",
-         }),
+         )),
     Tech(name="fe1",
-         cmdlist={
+         cmdlist=(
              "goes vnet show fe1 port-map vlan",
              "goes vnet show fe1 port-tab",
              "goes vnet show fe1 vlan",
@@ -95,22 +100,21 @@ TechList = [
              "goes vnet show fe1 l2",
              "goes vnet show fe1 station",
              "goes vnet show fe1 vlan br",
-             "goes vnet show fe1 station",
              "goes vnet show fe1 vlan rx",
              "goes vnet show fe1 vlan tx",
              "goes vnet show fe1 tcam",
              "goes vnet show fe1 l3 rx",
              "goes vnet show fe1 l3 tx",
-         }),
+         )),
     Tech(name="vnet",
-         cmdlist={
+         cmdlist=(
              "goes vnet show ports",
              "goes vnet show int",
              "goes vnet show buf",
              "goes vnet show ip fib",
              "goes vnet show neighbor",
              "goes vnet show br",
-         }),
+         )),
 ]
 
 
@@ -121,33 +125,142 @@ def techTime():
     st = datetime.datetime.fromtimestamp(ts).strftime('%Y%m%d_%H%M%S_%f')[:-3]
     return st
 
-def dumpTime(path):
-    for d in TechTimeStampList:
-        print(d.name)
-        with open(path + "/" + d.name + "_" + techTime() + ".log", "w") as f:
-            for c in d.cmdlist:
-                f.write("# show_tech " + techTime() + " '" + c + "'\n")
-                f.flush()
-                call(c, stdout=f, stderr=f, shell=True)
 
-def dump(path):
+# run one command, killing its whole process group on timeout so that
+# children of the shell cannot keep the output pipe open
+def runCmd(c, f, timeout):
+    f.write(("# show_tech " + techTime() + " '" + c + "'\n").encode())
+    p = subprocess.Popen(c, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                         shell=True, start_new_session=True)
+    try:
+        out = p.communicate(timeout=timeout)[0]
+    except subprocess.TimeoutExpired:
+        os.killpg(p.pid, signal.SIGKILL)
+        out = p.communicate()[0]
+        out += ("# show_tech timeout after %ds\n" % timeout).encode()
+    f.write(out)
+    return out
+
+
+class TechTar(object):
+    """ compressed tar written member by member, from several threads """
+
+    def __init__(self, path):
+        self.tar = tarfile.open(path, "w:gz")
+        self.lock = threading.Lock()
+
+    def add(self, name, f):
+        size = f.tell()
+        f.seek(0)
+        info = tarfile.TarInfo("./" + name)
+        info.size = size
+        info.mtime = time.time()
+        with self.lock:
+            self.tar.addfile(info, f)
+
+    def close(self):
+        self.tar.close()
+
+
+# run the commands of one Tech, spooling to disk once output gets large,
+# then add it to the tar as name.log
+def dumpTech(tar, d, timeout):
+    print(d.name)
+    with tempfile.SpooledTemporaryFile(max_size=8 << 20) as f:
+        for c in d.cmdlist:
+            runCmd(c, f, timeout)
+        tar.add(d.name + ".log", f)
+
 
-    dumpTime(path)
-    
-    for d in TechList:
-        print(d.name)
-        with open(path + "/" + d.name + ".log", "w") as f:
+# take one snapshot of all stats commands, all at once
+def snapshot(tar, pool, timeout):
+    def take(d):
+        name = d.name + "_" + techTime() + ".log"
+        outs = {}
+        with tempfile.SpooledTemporaryFile() as f:
             for c in d.cmdlist:
-                f.write("# show_tech " + techTime() + " '" + c + "'\n")
-                f.flush()
-                call(c, stdout=f, stderr=f, shell=True)
+                outs[c] = runCmd(c, f, timeout).decode("utf-8", "replace")
+            tar.add(name, f)
+        return outs
+    counters = {}
+    for outs in pool.map(take, TechTimeStampList):
+        counters.update(outs)
+    return counters
+
+
+numberRe = re.compile(r"^\d+$")
+
+# any numeric column: integers, decimals, exponent forms and percentages,
+# e.g. 1500, 0.25, 2.00e+01, 12%
+anyNumberRe = re.compile(r"^[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?%?$")
+
+
+# map each integer counter of a command output to a key made of the line
+# with all its numbers blanked out, so rate columns changing between
+# snapshots do not change the key, numbered if the same line text repeats
+def parseCounters(out):
+    counters = {}
+    seen = {}
+    for line in out.splitlines():
+        if line.startswith("# show_tech"):
+            continue
+        tokens = line.split()
+        numbers = [t.replace(",", "") for t in tokens]
+        numbers = [int(t) for t in numbers if numberRe.match(t)]
+        if not numbers:
+            continue
+        key = " ".join("#" if anyNumberRe.match(t.replace(",", "")) else t
+                       for t in tokens)
+        seen[key] = seen.get(key, 0) + 1
+        if seen[key] > 1:
+            key += " (%d)" % seen[key]
+        counters[key] = numbers
+    return counters
+
+
+def deltaReport(before, after, interval):
+    lines = ["# show_tech counter deltas over %.2fs" % interval]
+    for c in sorted(after):
+        old = parseCounters(before.get(c, ""))
+        new = parseCounters(after[c])
+        changed = []
+        for key in new:
+            if key not in old or len(old[key]) != len(new[key]):
+                continue
+            deltas = [b - a for a, b in zip(old[key], new[key])]
+            if any(deltas):
+                changed.append("  %s: %s" % (
+                    key, " ".join("%+d" % x for x in deltas)))
+        lines.append("'" + c + "'")
+        lines.extend(changed or ["  no change"])
+    return "\n".join(lines) + "\n"
+
+
+def dump(tar, interval, timeout):
+    with ThreadPoolExecutor(max_workers=len(TechList)) as pool:
+        # stats snapshots first, back to back, so deltas cover a known
+        # interval instead of the length of the whole dump
+        start = time.time()
+        before = snapshot(tar, pool, timeout)
+        time.sleep(max(interval - (time.time() - start), 0))
+        after = snapshot(tar, pool, timeout)
+        report = deltaReport(before, after, time.time() - start)
+        with io.BytesIO() as f:
+            f.write(report.encode())
+            tar.add("counter_deltas.log", f)
 
-    dumpTime(path)
+        # independent command groups run concurrently
+        for r in [pool.submit(dumpTech, tar, d, timeout) for d in TechList]:
+            r.result()
 
 
 parser = argparse.ArgumentParser()
 parser.add_argument('-path', '--path', help='directory')
 parser.add_argument('-hash_name', '--hash_name', help='test_case name with time stamp')
+parser.add_argument('-interval', '--interval', type=float, default=5,
+                    help='seconds between the two stats snapshots')
+parser.add_argument('-timeout', '--timeout', type=int, default=120,
+                    help='seconds after which a command is killed')
 
 args = parser.parse_args()
 if args.path == None:
@@ -158,10 +271,11 @@ if args.hash_name == None:
     print("--hash_name is required")
     exit(1)
 
-logTime = techTime()
-showDir = args.path + "/" + logTime
-os.makedirs(showDir)
+if not os.path.isdir(args.path):
+    os.makedirs(args.path)
 
-dump(showDir)
-tarfile = "../" + args.hash_name + ".tar"
-status = check_output("cd " + showDir + "; tar cfz " + tarfile + " .", shell=True)
\ No newline at end of file
+tar = TechTar(args.path + "/" + args.hash_name + ".tar")
+try:
+    dump(tar, args.interval, args.timeout)
+finally:
+    tar.close()
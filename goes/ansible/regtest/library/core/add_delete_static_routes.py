@@ -18,9 +18,8 @@
 # along with Ansible. If not, see <http://www.gnu.org/licenses/>.
 #
 
-import shlex
-
 from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.regtest_executor import CommandExecutor
 
 DOCUMENTATION = """
 ---
@@ -68,23 +67,7 @@ hash_dict:
 """
 
 
-def run_cli(module, cli):
-    """
-    Method to execute the cli command on the target node(s) and
-    returns the output.
-    :param module: The Ansible module to fetch input parameters.
-    :param cli: The complete cli string to be executed on the target node(s).
-    :return: Output/Error or None depending upon the response from cli.
-    """
-    cli = shlex.split(cli)
-    rc, out, err = module.run_command(cli)
-
-    if out:
-        return out.rstrip()
-    elif err:
-        return err.rstrip()
-    else:
-        return None
+run_cli = CommandExecutor().run_cli
 
 
 def main():
@@ -18,12 +18,11 @@
 # along with Ansible. If not, see <http://www.gnu.org/licenses/>.
 #
 
-import shlex
-import calendar
-
 from collections import OrderedDict
 
 from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.regtest_executor import CommandExecutor
+from ansible.module_utils.regtest_logscan import OffsetRegistry, scan_logs
 
 DOCUMENTATION = """
 ---
@@ -53,6 +52,23 @@ options:
         - The error msg which is to be checked for in the log file.
       required: False
       type: str
+    error_patterns:
+      description:
+        - More error msgs to check for in the same pass over the log files.
+      required: False
+      type: list
+      default: []
+    offset_file:
+      description:
+        - File on the switch recording where each log file ended at the last check, so that only newly logged lines are read. Empty to always scan from start_time.
+      required: False
+      type: str
+      default: '/var/tmp/check_core_dump.offsets'
+    log_offsets:
+      description:
+        - Log offsets of this switch as read from the result redis by the log_offsets module. When given, they are used instead of offset_file and the updated offsets are returned.
+      required: False
+      type: dict
 """
 
 EXAMPLES = """
@@ -62,6 +78,7 @@ EXAMPLES = """
     start_time: "{{ hostvars['server_emulator']['start_time'] }}"
     log_file_names: "/var/log/syslog"
     error_msg: "panic"
+    error_patterns: ["segfault", "Kernel BUG"]
   register: module_out
 """
 
@@ -70,102 +87,40 @@ msg:
   description: String describing the core dumps in file, if found
   returned: always
   type: str
+log_offsets:
+  description: Where each log file ended at this check, to store back with the log_offsets module.
+  returned: always
+  type: dict
 """
 
 RESULT_STATUS = True
 HASH_DICT = OrderedDict()
 
 
-def run_cli(module, cli):
-    """
-    Method to execute the cli command on the target node(s) and
-    returns the output.
-    :param module: The Ansible module to fetch input parameters.
-    :param cli: The complete cli string to be executed on the target node(s).
-    :return: Output/Error or None depending upon the response from cli.
-    """
-    cli = shlex.split(cli)
-    rc, out, err = module.run_command(cli)
-
-    if out:
-        return out.rstrip()
-    elif err:
-        return err.rstrip()
-    else:
-        return None
+EXECUTOR = CommandExecutor(HASH_DICT, max_output_len=512)
+run_cli = EXECUTOR.run_cli
+execute_commands = EXECUTOR.execute_commands
 
 
-def execute_commands(module, cmd):
-    """
-    Method to execute given commands and return the output.
-    :param module: The Ansible module to fetch input parameters.
-    :param cmd: Command to execute.
-    :return: Output of the commands.
-    """
-    global HASH_DICT
-
-    out = run_cli(module, cmd)
-
-    # Store command prefixed with exec time as key and
-    # command output as value in the hash dictionary
-    exec_time = run_cli(module, 'date +%Y%m%d%T')
-    key = '{0} {1} {2}'.format(module.params['switch_name'], exec_time, cmd)
-
-    if out:
-        HASH_DICT[key] = out[:512] if len(out.encode('utf-8')) > 512 else out
-    else:
-        HASH_DICT[key] = out
-
-    return out
-
-
-def verify_log_dumps(module):
+def verify_log_dumps(module, registry):
     """
     Method to verify dumps in log files on invader.
     :param module: The Ansible module to fetch input parameters.
+    :param registry: OffsetRegistry of the log files of this switch.
     """
     global RESULT_STATUS
-    failure_summary = ''
 
     switch_name = module.params['switch_name']
     start_time = module.params['start_time']
     log_file_names = module.params['log_file_names'].split(',')
-    error_msg = module.params['error_msg']
-
-    # Getting the time stamp in log file's time stamp format
-    month = start_time[4:6]
-    month_abb = calendar.month_abbr[int(month)]
-    date = start_time[6:8]
-    if date[0] == '0':
-        date = ' {}'.format(date[1])
-    time = start_time[8:-2:]
-    time_stamp = month_abb + ' ' + date + ' ' + time
-
-    # Check for errors in log files
-    for file_name in log_file_names:
-        try:
-            with open(file_name, 'r') as f:
-                content = f.read()
-            log_file = content.split('\n')
-
-            core_dump = []
-
-            for line in log_file:
-                if time_stamp in line:
-                    for i in range(log_file.index(line), len(log_file)):
-                        if error_msg in log_file[i] and 'check_core_dump' not in log_file[i]:
-                            core_dump.append(log_file[i])
-                            RESULT_STATUS = False
-                    break
-
-            errors = '\n'.join(core_dump)
-            if not RESULT_STATUS:
-                failure_summary += 'On switch {} '.format(switch_name)
-                failure_summary += 'runtime error found in {} file.\n'.format(file_name)
-                failure_summary += 'Errors:\n{}\n'.format(errors)
-
-        except IOError:
-            failure_summary += "Unable to open {} file\n".format(file_name)
+    patterns = [module.params['error_msg']] + module.params['error_patterns']
+
+    # Check for errors in log files, reading only lines logged since the
+    # start time or the previous check
+    found, failure_summary = scan_logs(switch_name, log_file_names, patterns,
+                                       start_time, registry)
+    if found:
+        RESULT_STATUS = False
 
     return failure_summary
 
@@ -178,12 +133,31 @@ def main():
             start_time=dict(required=False, type='str'),
             log_file_names=dict(required=False, type='str'),
             error_msg=dict(required=False, type='str'),
+            error_patterns=dict(required=False, type='list', default=[]),
+            offset_file=dict(required=False, type='str',
+                             default='/var/tmp/check_core_dump.offsets'),
+            log_offsets=dict(required=False, type='dict'),
             hash_name=dict(required=False, type='str')
         )
     )
 
     global RESULT_STATUS, HASH_DICT
-    failure_summary = verify_log_dumps(module)
+
+    # Log offsets come from the result redis when the playbook passes them,
+    # else from the offset file on the switch
+    if module.params['log_offsets'] is not None:
+        registry = OffsetRegistry('check_core_dump',
+                                  offsets=module.params['log_offsets'])
+    else:
+        registry = OffsetRegistry('check_core_dump',
+                                  module.params['offset_file'] or None)
+
+    failure_summary = verify_log_dumps(module, registry)
+
+    try:
+        registry.save()
+    except (IOError, OSError):
+        pass
 
     # Calculate the entire test result
     HASH_DICT['result.detail'] = failure_summary
@@ -194,7 +168,8 @@ def main():
     module.exit_json(
         hash_dict=HASH_DICT,
         found=found,
-        summary=failure_summary
+        summary=failure_summary,
+        log_offsets=registry.offsets
     )
 
 
@@ -0,0 +1,112 @@
+#!/usr/bin/python
+""" Get or store the log offset registry of a switch in redis db """
+
+#
+# This file is part of Ansible
+#
+# Ansible is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Ansible is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Ansible.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import socket
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.regtest_redis import LogOffsetStore, RedisError
+
+DOCUMENTATION = """
+---
+module: log_offsets
+author: Platina Systems
+short_description: Module to get or store log offsets of a switch in redis db.
+description:
+    Module to keep, in the result redis db on server emulator, where each
+    watched log file of a switch ended at the last check, so that log checks
+    only read newly logged lines.
+options:
+    switch_name:
+      description:
+        - Name of the switch whose log offsets are read or stored.
+      required: True
+      type: str
+    state:
+      description:
+        - get to read the offsets, present to store them.
+      required: False
+      type: str
+      choices: ['get', 'present']
+      default: 'get'
+    log_offsets:
+      description:
+        - Offsets to store, as returned by the log checking module.
+      required: False
+      type: dict
+      default: {}
+"""
+
+EXAMPLES = """
+- name: Get log offsets of the switch
+  log_offsets:
+    switch_name: "{{ inventory_hostname }}"
+  register: offsets_out
+  delegate_to: 127.0.0.1
+
+- name: Store log offsets of the switch
+  log_offsets:
+    switch_name: "{{ inventory_hostname }}"
+    state: present
+    log_offsets: "{{ module_out.log_offsets }}"
+  delegate_to: 127.0.0.1
+"""
+
+RETURN = """
+log_offsets:
+  description: Dict of <module>:<log file path> to the offset and inode of
+    the last check of the log file by that module.
+  returned: always
+  type: dict
+"""
+
+
+def main():
+    """ This section is for arguments parsing """
+    module = AnsibleModule(
+        argument_spec=dict(
+            switch_name=dict(required=True, type='str'),
+            state=dict(required=False, type='str', default='get',
+                       choices=['get', 'present']),
+            log_offsets=dict(required=False, type='dict', default={}),
+        )
+    )
+
+    switch_name = module.params['switch_name']
+    log_offsets = module.params['log_offsets']
+    changed = False
+
+    try:
+        if module.params['state'] == 'present':
+            changed = bool(LogOffsetStore().store(switch_name, log_offsets))
+        else:
+            log_offsets = LogOffsetStore().load(switch_name)
+    except (RedisError, socket.error) as e:
+        module.fail_json(msg='Failed to access the log offsets of switch '
+                             '{}: {}'.format(switch_name, e))
+
+    # Exit the module and return the required JSON.
+    module.exit_json(
+        changed=changed,
+        log_offsets=log_offsets
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -18,9 +18,10 @@
 # along with Ansible.  If not, see <http://www.gnu.org/licenses/>.
 #
 
-import shlex
+import socket
 
 from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.regtest_redis import RedisError, ResultStore
 
 DOCUMENTATION = """
 ---
@@ -57,60 +58,6 @@ msg:
 """
 
 
-def get_cli():
-    """
-    Method to get the initial cli string.
-    :return: Initial cli string.
-    """
-    return 'redis-cli -p 9090 '
-
-
-def run_cli(module, cli):
-    """
-    Method to execute the cli command on the target node(s) and returns the
-    output.
-    :param module: The Ansible module to fetch input parameters.
-    :param cli: The complete cli string to be executed on the target node(s).
-    :return: Output/Error or None depending upon the response from cli.
-    """
-    cli = shlex.split(cli)
-    rc, out, err = module.run_command(cli)
-
-    if out:
-        return out
-    elif err:
-        return err
-    else:
-        return None
-
-
-def store_in_hash(module, hash_name, key, value):
-    """
-    Method to store test result in a hash on server emulator redis db
-    :param module: The Ansible module to fetch input parameters.
-    :param hash_name: Name of the hash.
-    :param key: Key name in the hash.
-    :param value: Value for the key.
-    """
-    if (key == 'result.detail' or key == 'result.status' or
-            key == 'result.raw'):
-        cli = get_cli()
-        cli += 'hget {0} {1}'.format(hash_name, key)
-        existing_value = run_cli(module, cli)
-
-        value = existing_value + value
-        if key == 'result.status':
-            value = 'Failed' if 'Failed' in value else 'Passed'
-
-        cli = get_cli()
-        cli += 'hset {0} "{1}" "{2}"'.format(hash_name, key, value)
-        run_cli(module, cli)
-    elif '.time' in key:
-        cli = get_cli()
-        cli += 'hset {0} "{1}" "{2}"'.format(hash_name, key, value)
-        run_cli(module, cli)
-
-
 def main():
     """ This section is for arguments parsing """
     module = AnsibleModule(
@@ -123,8 +70,11 @@ def main():
     hash_name = module.params['hash_name']
 
     # Store key value pairs in the hash
-    for key, value in module.params['hash_dict'].iteritems():
-        store_in_hash(module, hash_name, key, value)
+    try:
+        ResultStore().store(hash_name, module.params['hash_dict'])
+    except (RedisError, socket.error) as e:
+        module.fail_json(msg='Failed to store the core dump result in hash '
+                             '{}: {}'.format(hash_name, e))
 
     out_msg = 'Stored the core dump result in hash: {}'.format(hash_name)
 
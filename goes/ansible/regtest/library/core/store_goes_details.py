@@ -18,9 +18,8 @@
 # along with Ansible.  If not, see <http://www.gnu.org/licenses/>.
 #
 
-import shlex
-
 from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.regtest_executor import run_command
 
 DOCUMENTATION = """
 ---
@@ -86,8 +85,7 @@ def run_cli(module, cli):
     :param cli: The complete cli string to be executed on the target node(s).
     :return: Output/Error or None depending upon the response from cli.
     """
-    cli = shlex.split(cli)
-    rc, out, err = module.run_command(cli)
+    rc, out, err = run_command(module, cli)
 
     if out:
         return out
@@ -18,9 +18,12 @@
 # along with Ansible.  If not, see <http://www.gnu.org/licenses/>.
 #
 
-import shlex
+import socket
+
+from collections import OrderedDict
 
 from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.regtest_redis import RedisError, ResultStore
 
 DOCUMENTATION = """
 ---
@@ -45,6 +48,18 @@ options:
         - Time at which test execution ended.
       required: False
       type: str
+    log_content:
+      description:
+        - Entire log content to append to result.raw in hash.
+      required: False
+      type: str
+    compress_log:
+      description:
+        - Flag to store log_content gzip compressed in result.raw.gz
+          instead of as plain text in result.raw.
+      required: False
+      type: bool
+      default: False
     hash_dict:
       description:
         - Dict containing key value pairs to store in hash.
@@ -69,60 +84,6 @@ msg:
 """
 
 
-def get_cli():
-    """
-    Method to get the initial cli string.
-    :return: Initial cli string.
-    """
-    return 'redis-cli -p 9090 '
-
-
-def run_cli(module, cli):
-    """
-    Method to execute the cli command on the target node(s) and returns the
-    output.
-    :param module: The Ansible module to fetch input parameters.
-    :param cli: The complete cli string to be executed on the target node(s).
-    :return: Output/Error or None depending upon the response from cli.
-    """
-    cli = shlex.split(cli)
-    rc, out, err = module.run_command(cli)
-
-    if out:
-        return out
-    elif err:
-        return err
-    else:
-        return None
-
-
-def store_in_hash(module, hash_name, key, value):
-    """
-    Method to store test result in a hash on server emulator redis db
-    :param module: The Ansible module to fetch input parameters.
-    :param hash_name: Name of the hash.
-    :param key: Key name in the hash.
-    :param value: Value for the key.
-    """
-    if (key == 'result.detail' or key == 'result.status' or
-            key == 'result.raw'):
-        cli = get_cli()
-        cli += 'hget {0} {1}'.format(hash_name, key)
-        existing_value = run_cli(module, cli)
-
-        value = existing_value + value
-        if key == 'result.status':
-            value = 'Failed' if 'Failed' in value else 'Passed'
-
-        cli = get_cli()
-        cli += 'hset {0} "{1}" "{2}"'.format(hash_name, key, value)
-        run_cli(module, cli)
-    elif '.time' in key:
-        cli = get_cli()
-        cli += 'hset {0} "{1}" "{2}"'.format(hash_name, key, value)
-        run_cli(module, cli)
-
-
 def main():
     """ This section is for arguments parsing """
     module = AnsibleModule(
@@ -131,27 +92,28 @@ def main():
             start_time=dict(required=False, type='str'),
             end_time=dict(required=False, type='str'),
             log_content=dict(required=False, type='str'),
+            compress_log=dict(required=False, type='bool', default=False),
             hash_dict=dict(required=False, type='dict'),
         )
     )
 
     hash_name = module.params['hash_name']
 
-    # Store start time of test run in hash
-    start_time = module.params['start_time']
-    store_in_hash(module, hash_name, 'start.time', start_time)
-
-    # Store end time of test run in the hash
-    end_time = module.params['end_time']
-    store_in_hash(module, hash_name, 'end.time', end_time)
-
-    # Store entire long content in hash
-    log_content = module.params['log_content']
-    store_in_hash(module, hash_name, 'result.raw', log_content)
-
-    # Store key value pairs in the hash
-    for key, value in module.params['hash_dict'].iteritems():
-        store_in_hash(module, hash_name, key, value)
+    # Store start/end time of test run, followed by the key value pairs
+    hash_dict = OrderedDict()
+    hash_dict['start.time'] = module.params['start_time']
+    hash_dict['end.time'] = module.params['end_time']
+    hash_dict.update(module.params['hash_dict'] or {})
+
+    # Store everything, including the entire long log content,
+    # in one atomic round trip
+    try:
+        ResultStore().store(hash_name, hash_dict,
+                            raw=module.params['log_content'],
+                            compress_raw=module.params['compress_log'])
+    except (RedisError, socket.error) as e:
+        module.fail_json(msg='Failed to store the test result in hash '
+                             '{}: {}'.format(hash_name, e))
 
     out_msg = 'Stored the test result in hash: {}'.format(hash_name)
 
@@ -24,9 +24,12 @@
 #It also gather some additional information of the host involved in the run.
 #It exports all the above gathering into a file(var_file.txt) in key value pairs.
 
-import shlex
+import socket
 
 from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.regtest_history import (RunHistory, metrics_from_hash,
+                                                  split_summary_line)
+from ansible.module_utils.regtest_redis import RedisError, ResultStore
 
 DOCUMENTATION = """
 ---
@@ -41,12 +44,38 @@ options:
         - Name of the testbed on which regresion executed.
       required: False
       type: str
+    build:
+      description:
+        - Build number of the regression job.
+      required: False
+      type: str
+    history_db:
+      description:
+        - Path of the SQLite database keeping the history of all runs.
+          Defaults to /var/log/regression/regression_history_<testbed_name>.db
+      required: False
+      type: str
+    history_runs:
+      description:
+        - Number of previous runs to compare the metrics of this run with.
+      required: False
+      type: int
+      default: 5
+    regression_threshold:
+      description:
+        - Relative change of a metric, e.g. test duration, convergence time
+          or iperf throughput, against the previous runs which counts as a
+          performance regression.
+      required: False
+      type: float
+      default: 0.2
 """
 
 EXAMPLES = """
 - name: Summarize the regerssion suite result
   summarize_regression:
     testbed_name: {{ testbed_name }}
+    build: {{ main_job_build }}
 """
 
 RETURN = """
@@ -57,6 +86,54 @@ hash_dict:
 """
 
 
+def record_history(module, results):
+    """
+    Method to store the results and metrics of this run in the run history
+    and compare the metrics with the previous runs on the same testbed.
+    :param module: The Ansible module to fetch input parameters.
+    :param results: List of (test name, hash name, status) of this run.
+    :return: Tuple of (html list of regressed metrics, regression count).
+    """
+    testbed_name = module.params['testbed_name']
+    history_db = module.params['history_db']
+    if not history_db:
+        history_db = '/var/log/regression/regression_history_{}.db'.format(
+            testbed_name)
+
+    # Read all result hashes of the run in a single round trip
+    try:
+        hashes = ResultStore().load([hash_name for test, hash_name, status
+                                     in results])
+    except (RedisError, socket.error):
+        hashes = [{} for result in results]
+
+    regressed_testcase_list = ''
+    with RunHistory(history_db) as history:
+        run_id = history.add_run(testbed_name, module.params['build'],
+                                 module.params['goes_version'],
+                                 module.params['goes_build_id'])
+
+        for (test, hash_name, status), fields in zip(results, hashes):
+            history.add_result(run_id, test, hash_name, status,
+                               metrics_from_hash(fields))
+        history.commit()
+
+        regressions = history.regressions(
+            run_id, module.params['history_runs'],
+            module.params['regression_threshold'])
+
+    for regression in regressions:
+        if regression.baseline:
+            change = '{:+.1f}%'.format(regression.change * 100)
+        else:
+            change = 'new'
+        regressed_testcase_list += '<li>{}: {} is {:g}, was {:g} ({})</li>'.format(
+            regression.test, regression.metric, regression.value,
+            regression.baseline, change)
+
+    return regressed_testcase_list, len(regressions)
+
+
 def main():
     """ This section is for arguments parsing """
     module = AnsibleModule(
@@ -67,7 +144,12 @@ def main():
             goes_build_id=dict(required=False, type='str'),
             goes_tags=dict(required=False, type='str'),
             goes_vnetd_id=dict(required=False, type='str'),
-            kernel_version=dict(required=False, type='str')
+            kernel_version=dict(required=False, type='str'),
+            build=dict(required=False, type='str'),
+            history_db=dict(required=False, type='str'),
+            history_runs=dict(required=False, type='int', default=5),
+            regression_threshold=dict(required=False, type='float',
+                                      default=0.2),
         )
     )
 
@@ -111,13 +193,13 @@ def main():
             message=message
         )
 
-    for line1 in all_testcase_list:
-        found = False
-        for line2 in regression_summary_report:
-            if line1 == line2[:-25]:
-                found = True
-        if not found:
-            skipped_testcase_list += '<li>{}</li>'.format(line1)
+    results = [split_summary_line(line) for line in regression_summary_report]
+    results = [result for result in results if result is not None]
+    reported = set(test for test, hash_name, status in results)
+
+    for test in all_testcase_list:
+        if test not in reported:
+            skipped_testcase_list += '<li>{}</li>'.format(test)
             skipped_count += 1
 
     for line in regression_summary_report:
@@ -128,6 +210,8 @@ def main():
             failed_testcase_list += '<li><a href="http://172.17.2.28/regression_logs/logs.html">{}</a></li>'.format(line)
             failed_count += 1
 
+    regressed_testcase_list, regressed_count = record_history(module, results)
+
     total_count = failed_count + passed_count
     failure_percent = float(failed_count*100)/total_count
     failure_percent = round(failure_percent, 2)
@@ -142,6 +226,8 @@ def main():
         failed_list=failed_testcase_list,
         skipped_count=skipped_count,
         skipped_list=skipped_testcase_list,
+        regressed_count=regressed_count,
+        regressed_list=regressed_testcase_list,
         goes_version=goes_version,
         goes_build_id=goes_build_id,
         goes_tags=goes_tags,
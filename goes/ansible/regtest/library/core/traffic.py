@@ -18,9 +18,8 @@
 # along with Ansible. If not, see <http://www.gnu.org/licenses/>.
 #
 
-import shlex
-
 from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.regtest_executor import CommandExecutor
 
 from getmac import get_mac_address
 
@@ -65,42 +64,7 @@ hash_dict:
 """
 
 
-def run_cli(module, cli):
-    """
-    Method to execute the cli command on the target node(s) and
-    returns the output.
-    :param module: The Ansible module to fetch input parameters.
-    :param cli: The complete cli string to be executed on the target node(s).
-    :return: Output/Error or None depending upon the response from cli.
-    """
-    cli = shlex.split(cli)
-    rc, out, err = module.run_command(cli)
-
-    if out:
-        return out.rstrip()
-    elif err:
-        return err.rstrip()
-    else:
-        return None
-
-def execute_commands(module, cmd):
-    """
-    Method to execute given commands and return the output.
-    :param module: The Ansible module to fetch input parameters.
-    :param cmd: Command to execute.
-    :return: Output of the commands.
-    """
-    global HASH_DICT
-
-    out = run_cli(module, cmd)
-
-    # Store command prefixed with exec time as key and
-    # command output as value in the hash dictionary
-    exec_time = run_cli(module, 'date +%Y%m%d%T')
-    key = '{}  {}'.format(exec_time, cmd)
-    HASH_DICT[key] = out
-
-    return out
+run_cli = CommandExecutor().run_cli
 
 def main():
     """ This section is for arguments parsing """
@@ -18,10 +18,11 @@
 # along with Ansible. If not, see <http://www.gnu.org/licenses/>.
 #
 
-import shlex
-import time
-
 from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.regtest_executor import CommandExecutor
+from ansible.module_utils.regtest_ping import (PingSweep, PingTarget,
+                                               ping_failures)
+from ansible.module_utils.regtest_ports import get_port_table
 
 DOCUMENTATION = """
 ---
@@ -71,23 +72,7 @@ msg:
 """
 
 
-def run_cli(module, cli):
-    """
-    Method to execute the cli command on the target node(s) and
-    returns the output.
-    :param module: The Ansible module to fetch input parameters.
-    :param cli: The complete cli string to be executed on the target node(s).
-    :return: Output/Error or None depending upon the response from cli.
-    """
-    cli = shlex.split(cli)
-    rc, out, err = module.run_command(cli)
-
-    if out:
-        return out.rstrip()
-    elif err:
-        return err.rstrip()
-    else:
-        return None
+run_cli = CommandExecutor().run_cli
 
 
 def main():
@@ -110,11 +95,10 @@ def main():
     msg = ''
     result_status = True
 
-    for eth in eth_list:
-        cmd = 'goes hget {} vnet.xeth{}.link'.format(platina_redis_channel, eth)
-        link_status = run_cli(module, cmd)
+    port_table = get_port_table(module, run_cli, platina_redis_channel)
 
-        if 'true' not in link_status:
+    for eth in eth_list:
+        if not port_table.get('xeth{}'.format(eth)).link:
             result_status = False
             msg += 'On switch {} '.format(switch_name)
             msg += 'port link is not up for '
@@ -128,27 +112,17 @@ def main():
             last_octet1 = '32'
             last_octet2 = '31'
 
-        for eth in range(1, 16, 2):
-            ip = '10.0.{}.{}'.format(eth, last_octet1)
-            cmd = 'ping -c 3 {}'.format(ip)
-            ping_out = run_cli(module, cmd)
-            if '100% packet loss' in ping_out:
-                result_status = False
-                msg += 'On switch {} '.format(switch_name)
-                msg += 'unable to ping interface ip {}\n'.format(ip)
-                msg += 'Ping Out:\n{}\n'.format(ping_out)
-            time.sleep(1)
-
-        for eth in range(17, 32, 2):
-            ip = '10.0.{}.{}'.format(eth, last_octet2)
-            cmd = 'ping -c 3 {}'.format(ip)
-            ping_out = run_cli(module, cmd)
-            if '100% packet loss' in ping_out:
-                result_status = False
-                msg += 'On switch {} '.format(switch_name)
-                msg += 'unable to ping interface ip {}\n'.format(ip)
-                msg += 'Ping Out:\n{}\n'.format(ping_out)
-            time.sleep(1)
+        # Ping the neighbor ip of every link at once
+        targets = [PingTarget('10.0.{}.{}'.format(eth, last_octet1))
+                   for eth in range(1, 16, 2)]
+        targets += [PingTarget('10.0.{}.{}'.format(eth, last_octet2))
+                    for eth in range(17, 32, 2)]
+        PingSweep().sweep(module, targets)
+
+        failures = ping_failures(switch_name, targets)
+        if failures:
+            result_status = False
+            msg += failures
 
     if result_status:
         msg = 'Links b/w invaders are UP\n'
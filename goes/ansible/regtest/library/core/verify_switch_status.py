@@ -18,11 +18,11 @@
 # along with Ansible. If not, see <http://www.gnu.org/licenses/>.
 #
 
-import shlex
 import time
 from ansible.module_utils.basic import AnsibleModule
-from collections import OrderedDict
-
+from ansible.module_utils.regtest_executor import CommandExecutor
+from ansible.module_utils.regtest_log import StreamingLog
+from ansible.module_utils.regtest_ports import get_port_table
 DOCUMENTATION = """
 ---
 module: verify_switch_status
@@ -76,46 +76,12 @@ hash_dict:
 """
 
 RESULT_STATUS = True
-HASH_DICT = OrderedDict()
-
-
-def run_cli(module, cli):
-    """
-    Method to execute the cli command on the target node(s) and
-    returns the output.
-    :param module: The Ansible module to fetch input parameters.
-    :param cli: The complete cli string to be executed on the target node(s).
-    :return: Output/Error or None depending upon the response from cli.
-    """
-    cli = shlex.split(cli)
-    rc, out, err = module.run_command(cli)
-
-    if out:
-        return out.rstrip()
-    elif err:
-        return err.rstrip()
-    else:
-        return None
-
-
-def execute_commands(module, cmd):
-    """
-    Method to execute given commands and return the output.
-    :param module: The Ansible module to fetch input parameters.
-    :param cmd: Command to execute.
-    :return: Output of the commands.
-    """
-    global HASH_DICT
+HASH_DICT = StreamingLog()
 
-    out = run_cli(module, cmd)
 
-    # Store command prefixed with exec time as key and
-    # command output as value in the hash dictionary
-    exec_time = run_cli(module, 'date +%Y%m%d%T')
-    key = '{0} {1} {2}'.format(module.params['switch_name'], exec_time, cmd)
-    HASH_DICT[key] = out
-
-    return out
+EXECUTOR = CommandExecutor(HASH_DICT)
+run_cli = EXECUTOR.run_cli
+execute_commands = EXECUTOR.execute_commands
 
 
 def verify_goes_status(module, switch_name):
@@ -184,20 +150,21 @@ def verify_port_links(module):
     # Verify networking service status before upgrade
     failure_summary += verify_networking_status(module, switch_name)
 
+    # Read media/speed/fec/link of all ports in one go
+    port_table = get_port_table(module, run_cli, platina_redis_channel)
+
     for eth in range(1, 33, 2):
+        port = 'xeth{}'.format(eth)
+
         # Verify interface media is set to correct value
-        cmd = 'goes hget {} vnet.xeth{}.media'.format(platina_redis_channel, eth)
-        out = run_cli(module, cmd)
-        if media not in out:
+        if not port_table.check(port, 'media', media):
             RESULT_STATUS = False
             failure_summary += 'On switch {} '.format(switch_name)
             failure_summary += 'interface media is not set to copper '
             failure_summary += 'for the interface xeth{} {} powercycle\n'.format(eth, state)
 
         # Verify speed of interfaces are set to correct value
-        cmd = 'goes hget {} vnet.xeth{}.speed'.format(platina_redis_channel, eth)
-        out = run_cli(module, cmd)
-        if speed not in out:
+        if not port_table.check(port, 'speed', speed):
             RESULT_STATUS = False
             failure_summary += 'On switch {} '.format(switch_name)
             failure_summary += 'speed of the interface '
@@ -205,23 +172,18 @@ def verify_port_links(module):
             failure_summary += 'the interface xeth{} {} powercycle\n'.format(eth, state)
 
         # Verify fec of interfaces are set to correct value
-        cmd = 'goes hget {} vnet.xeth{}.fec'.format(platina_redis_channel, eth)
-        out = run_cli(module, cmd)
-        if fec not in out:
+        if not port_table.check(port, 'fec', fec):
             RESULT_STATUS = False
             failure_summary += 'On switch {} '.format(switch_name)
             failure_summary += 'fec is not set to {} for '.format(fec)
             failure_summary += 'the interface xeth{} {} powercycle\n'.format(eth, state)
 
-        if eth%2 != 0:
-            # Verify if port links are up
-            cmd = 'goes hget {} vnet.xeth{}.link'.format(platina_redis_channel, eth)
-            out = run_cli(module, cmd)
-            if 'true' not in out:
-                RESULT_STATUS = False
-                failure_summary += 'On switch {} '.format(switch_name)
-                failure_summary += 'port link is not up '
-                failure_summary += 'for the interface xeth{} {} powercycle\n'.format(eth, state)
+        # Verify if port links are up
+        if not port_table.get(port).link:
+            RESULT_STATUS = False
+            failure_summary += 'On switch {} '.format(switch_name)
+            failure_summary += 'port link is not up '
+            failure_summary += 'for the interface xeth{} {} powercycle\n'.format(eth, state)
 
     # Verify cmdline status    below command are not valid for current version of redis
     #cmd = 'redis-cli -h 172.17.3.{} hget platina-mk1-bmc "cmdline.start"'.format(switch_name[-2::])
@@ -250,28 +212,23 @@ def main():
 
     global HASH_DICT, RESULT_STATUS
 
+    # Stream executed commands to the log file as they run
+    log_file_path = module.params['log_dir_path']
+    log_file_path += '/{}.log'.format(module.params['hash_name'])
+    HASH_DICT.open(log_file_path, 'a')
+
     # Verify port link
     verify_port_links(module)
 
     # Calculate the entire test result
     HASH_DICT['result.status'] = 'Passed' if RESULT_STATUS else 'Failed'
 
-    # Create a log file
-    log_file_path = module.params['log_dir_path']
-    log_file_path += '/{}.log'.format(module.params['hash_name'])
-    log_file = open(log_file_path, 'a')
-    for key, value in HASH_DICT.iteritems():
-        log_file.write(key)
-        log_file.write('\n')
-        log_file.write(str(value))
-        log_file.write('\n')
-        log_file.write('\n')
-
-    log_file.close()
+    # Close the log file, appending the test result
+    log_file_path = HASH_DICT.close()
 
     # Exit the module and return the required JSON.
     module.exit_json(
-        hash_dict=HASH_DICT,
+        hash_dict=HASH_DICT.summary(),
         log_file_path=log_file_path
     )
 
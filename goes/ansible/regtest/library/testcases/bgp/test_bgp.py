@@ -18,11 +18,10 @@
 # along with Ansible. If not, see <http://www.gnu.org/licenses/>.
 #
 
-import shlex
-
 from collections import OrderedDict
 
 from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.regtest_executor import CommandExecutor, get_exec_time
 
 DOCUMENTATION = """
 ---
@@ -128,43 +127,9 @@ RESULT_STATUS = True
 HASH_DICT = OrderedDict()
 
 
-def run_cli(module, cli):
-    """
-    Method to execute the cli command on the target node(s) and
-    returns the output.
-    :param module: The Ansible module to fetch input parameters.
-    :param cli: The complete cli string to be executed on the target node(s).
-    :return: Output/Error or None depending upon the response from cli.
-    """
-    cli = shlex.split(cli)
-    rc, out, err = module.run_command(cli)
-
-    if out:
-        return out.rstrip()
-    elif err:
-        return err.rstrip()
-    else:
-        return None
-
-
-def execute_commands(module, cmd):
-    """
-    Method to execute given commands and return the output.
-    :param module: The Ansible module to fetch input parameters.
-    :param cmd: Command to execute.
-    :return: Output of the commands.
-    """
-    global HASH_DICT
-
-    out = run_cli(module, cmd)
-
-    # Store command prefixed with exec time as key and
-    # command output as value in the hash dictionary
-    exec_time = run_cli(module, 'date +%Y%m%d%T')
-    key = '{}  {}'.format(exec_time, cmd)
-    HASH_DICT[key] = out
-
-    return out
+EXECUTOR = CommandExecutor(HASH_DICT)
+run_cli = EXECUTOR.run_cli
+execute_commands = EXECUTOR.execute_commands
 
 
 def verify_bgp_neighbors(module):
@@ -259,7 +224,7 @@ def main():
     testcase_name = module.params['testcase_name']
 
     # Get the start time
-    start_time = run_cli(module, 'date +%Y%m%d%T')
+    start_time = get_exec_time()
 
     # Create a hash name
     hash_name = switch_name + '-' + testcase_name + '-' + start_time
@@ -268,7 +233,7 @@ def main():
     verify_bgp_neighbors(module)
 
     # Get the end time
-    end_time = run_cli(module, 'date +%Y%m%d%T')
+    end_time = get_exec_time()
 
     # Calculate the entire test result
     test_result = 'Passed' if RESULT_STATUS else 'Failed'
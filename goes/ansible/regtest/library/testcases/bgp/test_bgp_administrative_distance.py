@@ -18,13 +18,11 @@
 # along with Ansible. If not, see <http://www.gnu.org/licenses/>.
 #
 
-import shlex
-
-from collections import OrderedDict
-
 import time
 
 from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.regtest_executor import CommandExecutor
+from ansible.module_utils.regtest_log import StreamingLog
 
 DOCUMENTATION = """
 ---
@@ -86,49 +84,16 @@ hash_dict:
 """
 
 RESULT_STATUS = True
-HASH_DICT = OrderedDict()
-
-
-def run_cli(module, cli):
-    """
-    Method to execute the cli command on the target node(s) and
-    returns the output.
-    :param module: The Ansible module to fetch input parameters.
-    :param cli: The complete cli string to be executed on the target node(s).
-    :return: Output/Error or None depending upon the response from cli.
-    """
-    cli = shlex.split(cli)
-    rc, out, err = module.run_command(cli)
-
-    if out:
-        return out.rstrip()
-    elif err:
-        return err.rstrip()
-    else:
-        return None
-
-
-def execute_commands(module, cmd):
-    """
-    Method to execute given commands and return the output.
-    :param module: The Ansible module to fetch input parameters.
-    :param cmd: Command to execute.
-    :return: Output of the commands.
-    """
-    global HASH_DICT
+HASH_DICT = StreamingLog()
 
-    if ('service' in cmd and 'restart' in cmd) or module.params['dry_run_mode']:
-        out = None
-    else:
-        out = run_cli(module, cmd)
 
-    # Store command prefixed with exec time as key and
-    # command output as value in the hash dictionary
-    exec_time = run_cli(module, 'date +%Y%m%d%T')
-    key = '{0} {1} {2}'.format(module.params['switch_name'], exec_time, cmd)
-    HASH_DICT[key] = out
+EXECUTOR = CommandExecutor(
+    HASH_DICT,
+    skip=lambda module, cmd: (('service' in cmd and 'restart' in cmd) or
+                              module.params['dry_run_mode']))
+run_cli = EXECUTOR.run_cli
+execute_commands = EXECUTOR.execute_commands
 
-    return out
 
 def ip_routes(module):
 
@@ -239,6 +204,12 @@ def main():
 
     global HASH_DICT, RESULT_STATUS
 
+    # Stream executed commands to the log file as they run
+    if not module.params['dry_run_mode']:
+        log_file_path = module.params['log_dir_path']
+        log_file_path += '/{}.log'.format(module.params['hash_name'])
+        HASH_DICT.open(log_file_path, 'w')
+
     if module.params['dry_run_mode']:
         cmds_list = []
         package_name = module.params['package_name']
@@ -266,22 +237,12 @@ def main():
         # Calculate the entire test result
         HASH_DICT['result.status'] = 'Passed' if RESULT_STATUS else 'Failed'
 
-        # Create a log file
-        log_file_path = module.params['log_dir_path']
-        log_file_path += '/{}.log'.format(module.params['hash_name'])
-        log_file = open(log_file_path, 'w')
-        for key, value in HASH_DICT.iteritems():
-            log_file.write(key)
-            log_file.write('\n')
-            log_file.write(str(value))
-            log_file.write('\n')
-            log_file.write('\n')
-
-        log_file.close()
+        # Close the log file, appending the test result
+        log_file_path = HASH_DICT.close()
 
         # Exit the module and return the required JSON.
         module.exit_json(
-            hash_dict=HASH_DICT,
+            hash_dict=HASH_DICT.summary(),
             log_file_path=log_file_path
         )
 
@@ -1,7 +1,8 @@
-import shlex
 from ansible.module_utils.basic import AnsibleModule
-from collections import OrderedDict
-
+from ansible.module_utils.regtest_executor import CommandExecutor
+from ansible.module_utils.regtest_ports import get_port_table
+from ansible.module_utils.regtest_log import StreamingLog
+from ansible.module_utils.regtest_vnet import VnetSnapshot
 DOCUMENTATION = """
 ---
 module: verify_blackhole_route
@@ -64,52 +65,18 @@ hash_dict:
   type: dict
 """
 
-HASH_DICT = OrderedDict()
+HASH_DICT = StreamingLog()
 result_status = True
 is_subports = False
 failure_summary = ''
 
 
-def run_cli(module, cli):
-    """
-    Method to execute the cli command on the target node(s) and
-    returns the output.
-    :param module: The Ansible module to fetch input parameters.
-    :param cli: The complete cli string to be executed on the target node(s).
-    :return: Output/Error or None depending upon the response from cli.
-    """
-    cli = shlex.split(cli)
-    rc, out, err = module.run_command(cli)
-
-    if out:
-        return out.rstrip()
-    elif err:
-        return err.rstrip()
-    else:
-        return None
-
-
-def execute_commands(module, cmd):
-    """
-    Method to execute given commands and return the output.
-    :param module: The Ansible module to fetch input parameters.
-    :param cmd: Command to execute.
-    :return: Output of the commands.
-    """
-    global HASH_DICT
-
-    if ('service' in cmd and 'restart' in cmd) or module.params['dry_run_mode']:
-        out = None
-    else:
-        out = run_cli(module, cmd)
-
-    # Store command prefixed with exec time as key and
-    # command output as value in the hash dictionary
-    exec_time = run_cli(module, 'date +%Y%m%d%T')
-    key = '{0} {1} {2}'.format(module.params['switch_name'], exec_time, cmd)
-    HASH_DICT[key] = out
-
-    return out
+EXECUTOR = CommandExecutor(
+    HASH_DICT,
+    skip=lambda module, cmd: (('service' in cmd and 'restart' in cmd) or
+                              module.params['dry_run_mode']))
+run_cli = EXECUTOR.run_cli
+execute_commands = EXECUTOR.execute_commands
 
 
 def verify_port_links(module):
@@ -118,15 +85,16 @@ def verify_port_links(module):
     eth_list = ['1', '3', '5', '7', '9', '11', '13', '15', '17', '19', '21', '23', '25', '27', '29', '31']
     subports = ['1', '2', '3', '4']
 
-    for eth in eth_list:
-        for port in subports:
-            cmd = 'goes hget {} vnet.xeth{}-{}.link'.format('platina-mk1', eth, port)
-            out = run_cli(module, cmd)
-            if 'true' not in out:
-                result_status = False
-                failure_summary += 'On switch {} '.format(switch_name)
-                failure_summary += 'port link is not up '
-                failure_summary += 'for the interface xeth{}-{}\n'.format(eth, port)
+    # Read the link state of all ports in one go
+    port_table = get_port_table(module, run_cli, 'platina-mk1')
+    ports = ['xeth{}-{}'.format(eth, port)
+             for eth in eth_list for port in subports]
+
+    for port in port_table.links_down(ports):
+        result_status = False
+        failure_summary += 'On switch {} '.format(switch_name)
+        failure_summary += 'port link is not up '
+        failure_summary += 'for the interface {}\n'.format(port)
     return failure_summary
 
 
@@ -172,8 +140,9 @@ def verify_blackhole_route_tables(module):
                     blackhole_ip.append('10.{0}.{1}.{2}/32'.format(eth, sub, p_list[0][-2:]))
 
     out1 = execute_commands(module, 'ip route')
-    out2 = execute_commands(module, 'goes vnet show ip fib')
-    out3 = execute_commands(module, 'goes vnet show fe1 tcam')
+    snapshot = VnetSnapshot(module, execute_commands)
+    fib = snapshot.fib()
+    tcam = snapshot.tcam()
 
     # verify kernel ip route table
 
@@ -185,22 +154,20 @@ def verify_blackhole_route_tables(module):
 
 
 # verify goes table
-    for line in out2.splitlines():
-        for ip_check in blackhole_ip:
-            if ip_check in line and 'Installed' in line:
-                if 'drop' not in line:
-                    result_status = False
-                    failure_summary += 'Drop not found in goES table for blackhole {}'.format(ip_check)
+    for ip_check in blackhole_ip:
+        for entry in fib.lookup(ip_check):
+            if not entry.is_drop:
+                result_status = False
+                failure_summary += 'Drop not found in goES table for blackhole {}'.format(ip_check)
 
 # verify tcam table(check in all four pipelines)
     count = 0
-    for line in out3.splitlines():
-        for ip_check in blackhole_ip:
-            if ip_check[:-3] in line:
-                if 'Drop' not in line:
-                    result_status = False
-                    failure_summary += ' Adj:Drop not found in tcam table for blackhole {}'.format(ip_check)
-                count += 1
+    for ip_check in blackhole_ip:
+        for entry in tcam.find(ip_check[:-3]):
+            if not entry.is_drop:
+                result_status = False
+                failure_summary += ' Adj:Drop not found in tcam table for blackhole {}'.format(ip_check)
+            count += 1
 
     if count != 4:
         result_status = False
@@ -260,6 +227,12 @@ def main():
     )
 
     global result_status, HASH_DICT, failure_summary
+
+    # Stream executed commands to the log file as they run
+    if not module.params['dry_run_mode']:
+        log_file_path = module.params['log_dir_path']
+        log_file_path += '/{}.log'.format(module.params['hash_name'])
+        HASH_DICT.open(log_file_path, 'a')
     if module.params['dry_run_mode']:
         cmds_list = []
 
@@ -290,22 +263,12 @@ def main():
         HASH_DICT['result.detail'] = failure_summary
         HASH_DICT['result.status'] = 'Passed' if result_status else 'Failed'
 
-        # Create a log file
-        log_file_path = module.params['log_dir_path']
-        log_file_path += '/{}.log'.format(module.params['hash_name'])
-        log_file = open(log_file_path, 'a')
-        for key, value in HASH_DICT.iteritems():
-            log_file.write(key)
-            log_file.write('\n')
-            log_file.write(str(value))
-            log_file.write('\n')
-            log_file.write('\n')
-
-        log_file.close()
+        # Close the log file, appending the test result
+        log_file_path = HASH_DICT.close()
 
         # Exit the module and return the required JSON.
         module.exit_json(
-            hash_dict=HASH_DICT,
+            hash_dict=HASH_DICT.summary(),
             log_file_path=log_file_path
         )
 
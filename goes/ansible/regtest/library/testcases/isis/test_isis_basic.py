@@ -18,12 +18,10 @@
 # along with Ansible. If not, see <http://www.gnu.org/licenses/>.
 #
 
-import shlex
-import time
-
-from collections import OrderedDict
-
 from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.regtest_executor import CommandExecutor
+from ansible.module_utils.regtest_log import StreamingLog
+from ansible.module_utils.regtest_wait import wait_until
 
 DOCUMENTATION = """
 ---
@@ -89,49 +87,90 @@ hash_dict:
 """
 
 RESULT_STATUS = True
-HASH_DICT = OrderedDict()
+HASH_DICT = StreamingLog()
+
 
+EXECUTOR = CommandExecutor(
+    HASH_DICT,
+    skip=lambda module, cmd: 'service' in cmd and 'restart' in cmd)
+run_cli = EXECUTOR.run_cli
+execute_commands = EXECUTOR.execute_commands
 
-def run_cli(module, cli):
+
+def check_isis_neighbors(module):
     """
-    Method to execute the cli command on the target node(s) and
-    returns the output.
+    Method to check isis neighbors once.
     :param module: The Ansible module to fetch input parameters.
-    :param cli: The complete cli string to be executed on the target node(s).
-    :return: Output/Error or None depending upon the response from cli.
+    :return: Failure summary, empty if neighbors are as expected.
     """
-    cli = shlex.split(cli)
-    rc, out, err = module.run_command(cli)
+    summary = ''
+    switch_name = module.params['switch_name']
+    spine_list = module.params['spine_list']
+    leaf_list = module.params['leaf_list']
+    is_spine = True if switch_name in spine_list else False
+
+    # Get isis neighbor info
+    cmd = "vtysh -c 'sh isis neighbor'"
+    isis_out = execute_commands(module, cmd)
 
-    if out:
-        return out.rstrip()
-    elif err:
-        return err.rstrip()
+    if not isis_out:
+        summary += 'On Switch {} '.format(switch_name)
+        summary += 'isis neighbors cannot be verified since '
+        summary += 'output of command {} is None\n'.format(cmd)
     else:
-        return None
+        if is_spine:
+            for leaf in leaf_list:
+                if isis_out.count(leaf) != 2:
+                    summary += 'On switch {} '.format(switch_name)
+                    summary += 'two neighbors for {} is not '.format(
+                        leaf)
+                    summary += 'present in the output of {}\n'.format(
+                        cmd)
+        else:
+            for spine in spine_list:
+                if isis_out.count(spine) != 2:
+                    summary += 'On switch {} '.format(switch_name)
+                    summary += 'two neighbors for {} is not '.format(
+                        spine)
+                    summary += 'present in the output of {}\n'.format(
+                        cmd)
+
+        if isis_out.count('Up') != 4:
+            summary += 'On switch {} '.format(switch_name)
+            summary += 'isis neighbors state is not Up\n'
 
+    return summary
 
-def execute_commands(module, cmd):
+
+def check_isis_routes(module):
     """
-    Method to execute given commands and return the output.
+    Method to check isis routes once.
     :param module: The Ansible module to fetch input parameters.
-    :param cmd: Command to execute.
-    :return: Output of the commands.
+    :return: Failure summary, empty if routes are as expected.
     """
-    global HASH_DICT
+    summary = ''
+    switch_name = module.params['switch_name']
 
-    if 'service' in cmd and 'restart' in cmd:
-        out = None
-    else:
-        out = run_cli(module, cmd)
+    # Check and verify neighbor routes
+    if module.params['check_neighbors']:
+        cmd = "vtysh -c 'sh ip route'"
+        all_routes = execute_commands(module, cmd)
+        route_count = 0
+
+        for route in all_routes.splitlines():
+            if route.startswith('I'):
+                route_count += 1
+                if '115' not in route:
+                    summary += 'On switch {} '.format(switch_name)
+                    summary += 'administrative value 115 is not present'
+                    summary += ' in isis route {}\n'.format(route)
 
-    # Store command prefixed with exec time as key and
-    # command output as value in the hash dictionary
-    exec_time = run_cli(module, 'date +%Y%m%d%T')
-    key = '{0} {1} {2}'.format(module.params['switch_name'], exec_time, cmd)
-    HASH_DICT[key] = out
+        if route_count < 4:
+            summary += 'On switch {} '.format(switch_name)
+            summary += 'output of {} '.format(cmd)
+            summary += 'is not displaying required isis routes\n'
 
-    return out
+    return summary
 
 
 def verify_isis_neighbors(module):
@@ -143,9 +182,6 @@ def verify_isis_neighbors(module):
     failure_summary = ''
     switch_name = module.params['switch_name']
     package_name = module.params['package_name']
-    spine_list = module.params['spine_list']
-    leaf_list = module.params['leaf_list']
-    is_spine = True if switch_name in spine_list else False
 
     # Get the current/running configurations
     execute_commands(module, "vtysh -c 'sh running-config'")
@@ -154,100 +190,30 @@ def verify_isis_neighbors(module):
     execute_commands(module, 'service {} restart'.format(package_name))
     execute_commands(module, 'service {} status'.format(package_name))
 
-    retries = 1
-    found = False
     retries_summary = ''
+    checks = [
+        ('Get isis neighbor info', 'neighbors', check_isis_neighbors),
+        ('Check and verify neighbor routes', 'routes', check_isis_routes),
+    ]
 
-    while retries != 6 and not found:
-        # Wait 50 secs(max) for routes to become reachable
-        time.sleep(10)
-        summary = ''
-
-        # Get isis neighbor info
-        cmd = "vtysh -c 'sh isis neighbor'"
-        isis_out = execute_commands(module, cmd)
-
-        if not isis_out:
-            summary += 'On Switch {} '.format(switch_name)
-            summary += 'isis neighbors cannot be verified since '
-            summary += 'output of command {} is None\n'.format(cmd)
-        else:
-            if is_spine:
-                for leaf in leaf_list:
-                    if isis_out.count(leaf) != 2:
-                        summary += 'On switch {} '.format(switch_name)
-                        summary += 'two neighbors for {} is not '.format(
-                            leaf)
-                        summary += 'present in the output of {}\n'.format(
-                            cmd)
-            else:
-                for spine in spine_list:
-                    if isis_out.count(spine) != 2:
-                        summary += 'On switch {} '.format(switch_name)
-                        summary += 'two neighbors for {} is not '.format(
-                            spine)
-                        summary += 'present in the output of {}\n'.format(
-                            cmd)
-
-            if isis_out.count('Up') != 4:
-                summary += 'On switch {} '.format(switch_name)
-                summary += 'isis neighbors state is not Up\n'
-
-        if not summary:
-            found = True
-            summary = 'No. of retries {}'.format(retries)
-        else:
-            retries += 1
+    for description, name, check in checks:
+        summaries = []
 
-    if not found:
-        RESULT_STATUS = False
-        failure_summary += summary
-        retries_summary += 'No. of retries {} approx {} sec(Get isis neighbor info)\n'.format(retries,
-                                                                                            retries * 10)
-    else:
-        retries_summary += 'No. of retries {} approx {} sec(Get isis neighbor info)\n'.format(retries,
-                                                                                            retries * 10)
-    retries = 1
-    found = False
+        def verified():
+            summaries.append(check(module))
+            return not summaries[-1]
 
-    while retries != 6 and not found:
         # Wait 50 secs(max) for routes to become reachable
-        time.sleep(10)
-        summary = ''
-
-        # Check and verify neighbor routes
-        if module.params['check_neighbors']:
-            cmd = "vtysh -c 'sh ip route'"
-            all_routes = execute_commands(module, cmd)
-            route_count = 0
-
-            for route in all_routes.splitlines():
-                if route.startswith('I'):
-                    route_count += 1
-                    if '115' not in route:
-                        summary += 'On switch {} '.format(switch_name)
-                        summary += 'administrative value 115 is not present'
-                        summary += ' in isis route {}\n'.format(route)
-
-            if route_count < 4:
-                summary += 'On switch {} '.format(switch_name)
-                summary += 'output of {} '.format(cmd)
-                summary += 'is not displaying required isis routes\n'
-
-        if not summary:
-            found = True
-            summary = 'No. of retries {}'.format(retries)
-        else:
-            retries += 1
+        found, elapsed = wait_until(
+            verified, 50, hash_dict=HASH_DICT,
+            key='{}.isis.{}.convergence.time'.format(switch_name, name))
 
-    if not found:
-        RESULT_STATUS = False
-        failure_summary += summary
-        retries_summary += 'No. of retries {} approx {} sec(Check and verify neighbor routes)\n'.format(retries,
-                                                                                            retries * 10)
-    else:
-        retries_summary += 'No. of retries {} approx {} sec(Check and verify neighbor routes)\n'.format(retries,
-                                                                                            retries * 10)
+        if not found:
+            RESULT_STATUS = False
+            failure_summary += summaries[-1]
+
+        retries_summary += 'No. of retries {} approx {:.0f} sec({})\n'.format(
+            len(summaries), elapsed, description)
 
     HASH_DICT['retries'] = retries_summary
     HASH_DICT['result.detail'] = failure_summary
@@ -272,27 +238,22 @@ def main():
 
     global HASH_DICT, RESULT_STATUS
 
+    # Stream executed commands to the log file as they run
+    log_file_path = module.params['log_dir_path']
+    log_file_path += '/{}.log'.format(module.params['hash_name'])
+    HASH_DICT.open(log_file_path, 'w')
+
     verify_isis_neighbors(module)
 
     # Calculate the entire test result
     HASH_DICT['result.status'] = 'Passed' if RESULT_STATUS else 'Failed'
 
-    # Create a log file
-    log_file_path = module.params['log_dir_path']
-    log_file_path += '/{}.log'.format(module.params['hash_name'])
-    log_file = open(log_file_path, 'w')
-    for key, value in HASH_DICT.iteritems():
-        log_file.write(key)
-        log_file.write('\n')
-        log_file.write(str(value))
-        log_file.write('\n')
-        log_file.write('\n')
-
-    log_file.close()
+    # Close the log file, appending the test result
+    log_file_path = HASH_DICT.close()
 
     # Exit the module and return the required JSON.
     module.exit_json(
-        hash_dict=HASH_DICT,
+        hash_dict=HASH_DICT.summary(),
         log_file_path=log_file_path
     )
 
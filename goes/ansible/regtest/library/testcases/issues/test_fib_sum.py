@@ -18,11 +18,11 @@
 # along with Ansible. If not, see <http://www.gnu.org/licenses/>.
 #
 
-import shlex
-
-from collections import OrderedDict
-
 from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.regtest_executor import CommandExecutor
+from ansible.module_utils.regtest_log import StreamingLog
+from ansible.module_utils.regtest_vnet import (
+    FIB_CMD, FIB_SUMMARY_CMD, FibSummary, FibTable)
 
 DOCUMENTATION = """
 ---
@@ -75,45 +75,13 @@ hash_dict:
 """
 
 RESULT_STATUS = True
-HASH_DICT = OrderedDict()
-
-def run_cli(module, cli):
-    """
-    Method to execute the cli command on the target node(s) and
-    returns the output.
-    :param module: The Ansible module to fetch input parameters.
-    :param cli: The complete cli string to be executed on the target node(s).
-    :return: Output/Error or None depending upon the response from cli.
-    """
-    cli = shlex.split(cli)
-    rc, out, err = module.run_command(cli)
-
-    if out:
-        return out.rstrip()
-    elif err:
-        return err.rstrip()
-    else:
-        return None
-
-
-def execute_commands(module, cmd):
-    """
-    Method to execute given commands and return the output.
-    :param module: The Ansible module to fetch input parameters.
-    :param cmd: Command to execute.
-    :return: Output of the commands.
-    """
-    global HASH_DICT
+HASH_DICT = StreamingLog()
 
-    out = run_cli(module, cmd)
 
-    # Store command prefixed with exec time as key and
-    # command output as value in the hash dictionary
-    exec_time = run_cli(module, 'date +%Y%m%d%T')
-    key = '{0} {1} {2}'.format(module.params['switch_name'], exec_time, cmd)
-    HASH_DICT[key] = out
+EXECUTOR = CommandExecutor(HASH_DICT)
+run_cli = EXECUTOR.run_cli
+execute_commands = EXECUTOR.execute_commands
 
-    return out
 
 import time
 
@@ -141,13 +109,11 @@ def verify_fib_entries(module):
             failure_summary += 'On switch {} '.format(switch_name)
             failure_summary += 'unable to move the interface xeth{} into docker.\n'.format(eth)
 
-        cmd = 'goes vnet show ip fib'
-	time.sleep(5)
-        fib_out = execute_commands(module, cmd).splitlines()
-	for line in fib_out:
-            if ip in line and 'xeth{}'.format(eth[i]) in line:
-	                line = line.strip()
-        	        fib.append(line.split()[0])
+        time.sleep(5)
+        fib_out = execute_commands(module, FIB_CMD)
+        fib_table = FibTable.from_output(fib_out)
+        for entry in fib_table.find(ip, 'xeth{}'.format(eth[i])):
+            fib.append(entry.table)
     
     if fib[0] == fib[1]:
         RESULT_STATUS = False
@@ -156,9 +122,9 @@ def verify_fib_entries(module):
         failure_summary += 'assigning same IP to 2 different containers.\n'
         failure_summary += 'FIB Output- {}\n'.format(fib_out)
 
-    cmd = 'goes vnet show ip fib sum'
+    cmd = FIB_SUMMARY_CMD
     out = execute_commands(module, cmd)
-    if container_name[0] and container_name[1] not in out:
+    if container_name[0] and container_name[1] not in FibSummary.from_output(out):
         RESULT_STATUS = False
         failure_summary += 'On switch {} '.format(switch_name)
         failure_summary += 'FIB summary is not appropriate for interface {}\n'.format(eth)
@@ -213,27 +179,22 @@ def main():
 
     global HASH_DICT, RESULT_STATUS
 
+    # Stream executed commands to the log file as they run
+    log_file_path = module.params['log_dir_path']
+    log_file_path += '/{}_'.format(module.params['hash_name']) + '.log'
+    HASH_DICT.open(log_file_path, 'w')
+
     verify_fib_entries(module)
 
     # Calculate the entire test result
     HASH_DICT['result.status'] = 'Passed' if RESULT_STATUS else 'Failed'
 
-    # Create a log file
-    log_file_path = module.params['log_dir_path']
-    log_file_path += '/{}_'.format(module.params['hash_name']) + '.log'
-    log_file = open(log_file_path, 'w')
-    for key, value in HASH_DICT.iteritems():
-        log_file.write(key)
-        log_file.write('\n')
-        log_file.write(str(value))
-        log_file.write('\n')
-        log_file.write('\n')
-
-    log_file.close()
+    # Close the log file, appending the test result
+    log_file_path = HASH_DICT.close()
 
     # Exit the module and return the required JSON.
     module.exit_json(
-        hash_dict=HASH_DICT,
+        hash_dict=HASH_DICT.summary(),
         log_file_path=log_file_path
     )
 
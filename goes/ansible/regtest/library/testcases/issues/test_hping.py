@@ -18,11 +18,12 @@
 # along with Ansible. If not, see <http://www.gnu.org/licenses/>.
 #
 
-import shlex
 import time
-from collections import OrderedDict
-
 from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.regtest_executor import CommandExecutor
+from ansible.module_utils.regtest_log import StreamingLog
+from ansible.module_utils.regtest_ping import (PingSweep, PingTarget, ping_cmd,
+                                               record_ping)
 
 DOCUMENTATION = """
 ---
@@ -79,46 +80,12 @@ log_file_path:
 """
 
 RESULT_STATUS = True
-HASH_DICT = OrderedDict()
-
-
-def run_cli(module, cli):
-    """
-    Method to execute the cli command on the target node(s) and
-    returns the output.
-    :param module: The Ansible module to fetch input parameters.
-    :param cli: The complete cli string to be executed on the target node(s).
-    :return: Output/Error or None depending upon the response from cli.
-    """
-    cli = shlex.split(cli)
-    rc, out, err = module.run_command(cli)
-
-    if out:
-        return out.rstrip()
-    elif err:
-        return err.rstrip()
-    else:
-        return None
-
-
-def execute_commands(module, cmd):
-    """
-    Method to execute given commands and return the output.
-    :param module: The Ansible module to fetch input parameters.
-    :param cmd: Command to execute.
-    :return: Output of the commands.
-    """
-    global HASH_DICT
+HASH_DICT = StreamingLog()
 
-    out = run_cli(module, cmd)
 
-    # Store command prefixed with exec time as key and
-    # command output as value in the hash dictionary
-    exec_time = run_cli(module, 'date +%Y%m%d%T')
-    key = '{0} {1} {2}'.format(module.params['switch_name'], exec_time, cmd)
-    HASH_DICT[key] = out
-
-    return out
+EXECUTOR = CommandExecutor(HASH_DICT)
+run_cli = EXECUTOR.run_cli
+execute_commands = EXECUTOR.execute_commands
 
 
 def verify_ping(module):
@@ -136,11 +103,12 @@ def verify_ping(module):
 		ip2 = "10.0.5.{}".format(switch_name1[-2::])
 		ip1 = "10.0.5.{}".format(switch_name2[-2::])
 
-	cmd1 = "ping -c 5 -I {} {}".format(ip1, ip2)
+	target = PingTarget(ip2, ping_cmd(ip2, count=5, source=ip1))
 	cmd2 = "timeout 5 hping3 -c 5 --icmp --faster -t 1 {}".format(ip2)
 
-        out1 = execute_commands(module, cmd1)
-	if "100% packet loss" in out1:
+	PingSweep(EXECUTOR).sweep(module, [target])
+	record_ping(HASH_DICT, switch_name, [target])
+	if not target.reachable:
 		RESULT_STATUS = False
 		failure_summary += "ping from {} to ".format(ip1)
 		failure_summary += "{} is not working.\n".format(ip2)
@@ -169,23 +137,18 @@ def main():
     )
 
     global HASH_DICT, RESULT_STATUS
-    verify_ping(module)
-    # Create a log file
+
+    # Stream executed commands to the log file as they run
     log_file_path = module.params['log_dir_path']
     log_file_path += '/{}.log'.format(module.params['hash_name'])
-    log_file = open(log_file_path, 'a')
-    for key, value in HASH_DICT.iteritems():
-        log_file.write(key)
-        log_file.write('\n')
-        log_file.write(str(value))
-        log_file.write('\n')
-        log_file.write('\n')
-
-    log_file.close()
+    HASH_DICT.open(log_file_path, 'a')
+    verify_ping(module)
+    # Close the log file, appending the test result
+    log_file_path = HASH_DICT.close()
 
     # Exit the module and return the required JSON.
     module.exit_json(
-        hash_dict=HASH_DICT,
+        hash_dict=HASH_DICT.summary(),
         log_file_path=log_file_path,
         changed=False
     )
@@ -18,12 +18,12 @@
 # along with Ansible. If not, see <http://www.gnu.org/licenses/>.
 #
 
-import shlex
 import calendar
 
-from collections import OrderedDict
 import time
 from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.regtest_executor import CommandExecutor
+from ansible.module_utils.regtest_log import StreamingLog
 
 DOCUMENTATION = """
 ---
@@ -58,6 +58,12 @@ options:
         - The msg which is to be checked for in the log file.
       required: False
       type: str
+    log_offsets:
+      description:
+        - Log offsets of this switch as read from the result redis by the log_offsets module.
+      required: False
+      type: dict
+      default: {}
     hash_name:
       description:
         - Name of the hash in which to store the result in redis.
@@ -83,54 +89,21 @@ hash_dict:
   description: Dictionary containing key value pairs to store in hash.
   returned: always
   type: dict
+log_offsets:
+  description: Where each log file ended at this check, to store back with the log_offsets module.
+  returned: always
+  type: dict
 """
 
 RESULT_STATUS = True
-HASH_DICT = OrderedDict()
+HASH_DICT = StreamingLog()
 failure_summary = ''
+LOG_OFFSETS = {}
 
 
-def run_cli(module, cli):
-    """
-    Method to execute the cli command on the target node(s) and
-    returns the output.
-    :param module: The Ansible module to fetch input parameters.
-    :param cli: The complete cli string to be executed on the target node(s).
-    :return: Output/Error or None depending upon the response from cli.
-    """
-    cli = shlex.split(cli)
-    rc, out, err = module.run_command(cli)
-
-    if out:
-        return out.rstrip()
-    elif err:
-        return err.rstrip()
-    else:
-        return None
-
-
-def execute_commands(module, cmd):
-    """
-    Method to execute given commands and return the output.
-    :param module: The Ansible module to fetch input parameters.
-    :param cmd: Command to execute.
-    :return: Output of the commands.
-    """
-    global HASH_DICT
-
-    out = run_cli(module, cmd)
-
-    # Store command prefixed with exec time as key and
-    # command output as value in the hash dictionary
-    exec_time = run_cli(module, 'date +%Y%m%d%T')
-    key = '{0} {1} {2}'.format(module.params['switch_name'], exec_time, cmd)
-
-    if out:
-        HASH_DICT[key] = out[:512] if len(out.encode('utf-8')) > 512 else out
-    else:
-        HASH_DICT[key] = out
-
-    return out
+EXECUTOR = CommandExecutor(HASH_DICT, max_output_len=512)
+run_cli = EXECUTOR.run_cli
+execute_commands = EXECUTOR.execute_commands
 
 
 def verify_log_dumps(module):
@@ -138,45 +111,24 @@ def verify_log_dumps(module):
     Method to verify dumps in log files on invader.
     :param module: The Ansible module to fetch input parameters.
     """
-    global RESULT_STATUS, failure_summary
+    global RESULT_STATUS, LOG_OFFSETS, failure_summary
 
     switch_name = module.params['switch_name']
     start_time = module.params['start_time']
     log_file_names = module.params['log_file_names'].split(',')
     error_msg = module.params['error_msg']
 
-    # Check for errors in log files
-    for file_name in log_file_names:
-        with open(file_name, 'r') as f:
-            content = f.read()
-        log_file = content.split('\n\n')
-
-        # Getting the time stamp in log file's time stamp format
-        month = start_time[4:6]
-        month_abb = calendar.month_abbr[int(month)]
-        date = start_time[6:8]
-        if date[0] == '0':
-            date = ' {}'.format(date[1])
-        time = start_time[8::]
-        time_stamp = month_abb + ' ' + date + ' ' + time
-
-        core_dump = []
-        error_found = False
-
-        for line in log_file:
-            if time_stamp in line:
-                for i in range(log_file.index(line), len(log_file)):
-                    if error_msg in log_file[i]:
-                        core_dump.append(log_file[i])
-                        error_found = True
-                break
-
-            errors = '\n'.join(core_dump)
-            if error_found:
-                RESULT_STATUS = False
-                failure_summary += 'On switch {} '.format(switch_name)
-                failure_summary += 'runtime error found in {} file.\n'.format(file_name)
-                failure_summary += 'Errors:\n{}\n'.format(errors)
+    # Check for errors in log files, reading only lines logged since the
+    # start time or the previous check
+    registry = OffsetRegistry('test_ifconfig_state_sync',
+                              offsets=module.params['log_offsets'])
+    found, summary = scan_logs(switch_name, log_file_names, [error_msg],
+                               start_time, registry,
+                               exclude=('test_ifconfig_state_sync',))
+    if found:
+        RESULT_STATUS = False
+        failure_summary += summary
+    LOG_OFFSETS = registry.offsets
 
     # Get the GOES status info
     execute_commands(module, 'goes status')
@@ -314,6 +266,7 @@ def main():
             start_time=dict(required=False, type='str'),
             log_file_names=dict(required=False, type='str'),
             error_msg=dict(required=False, type='str'),
+            log_offsets=dict(required=False, type='dict', default={}),
             hash_name=dict(required=False, type='str'),
             log_dir_path=dict(required=False, type='str'),
         )
@@ -321,28 +274,24 @@ def main():
 
     global RESULT_STATUS, HASH_DICT
 
+    # Stream executed commands to the log file as they run
+    log_file_path = module.params['log_dir_path']
+    log_file_path += '/{}.log'.format(module.params['hash_name'])
+    HASH_DICT.open(log_file_path, 'a')
+
     verify_ifconfig_state(module)
 
     # Calculate the entire test result
     HASH_DICT['result.status'] = 'Passed' if RESULT_STATUS else 'Failed'
 
-    # Create a log file
-    log_file_path = module.params['log_dir_path']
-    log_file_path += '/{}.log'.format(module.params['hash_name'])
-    log_file = open(log_file_path, 'a')
-    for key, value in HASH_DICT.iteritems():
-        log_file.write(key)
-        log_file.write('\n')
-        log_file.write(str(value))
-        log_file.write('\n')
-        log_file.write('\n')
-
-    log_file.close()
+    # Close the log file, appending the test result
+    log_file_path = HASH_DICT.close()
 
     # Exit the module and return the required JSON.
     module.exit_json(
-        hash_dict=HASH_DICT,
-        log_file_path=log_file_path
+        hash_dict=HASH_DICT.summary(),
+        log_file_path=log_file_path,
+        log_offsets=LOG_OFFSETS
     )
 
 if __name__ == '__main__':
@@ -18,12 +18,13 @@
 # along with Ansible. If not, see <http://www.gnu.org/licenses/>.
 #
 
-import shlex
 import time
 
-from collections import OrderedDict
-
 from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.regtest_executor import CommandExecutor
+from ansible.module_utils.regtest_log import StreamingLog
+from ansible.module_utils.regtest_probe import (parse_probe, probe_cmd,
+                                                probe_interval, record_probes)
 
 DOCUMENTATION = """
 ---
@@ -48,6 +49,13 @@ options:
         - The no of times the interface is to be moved into a namespace.
       required: False
       type: str
+    probe_rate:
+      description:
+        - Pings per second sent to the destination switch while it takes
+          its interface down and up.
+      required: False
+      type: int
+      default: 10
     spine_list:
       description:
         - List of all spine switches.
@@ -88,50 +96,12 @@ hash_dict:
 """
 
 RESULT_STATUS = True
-HASH_DICT = OrderedDict()
-
-
-def run_cli(module, cli):
-    """
-    Method to execute the cli command on the target node(s) and
-    returns the output.
-    :param module: The Ansible module to fetch input parameters.
-    :param cli: The complete cli string to be executed on the target node(s).
-    :return: Output/Error or None depending upon the response from cli.
-    """
-    cli = shlex.split(cli)
-    rc, out, err = module.run_command(cli)
-
-    if out:
-        return out.rstrip()
-    elif err:
-        return err.rstrip()
-    else:
-        return None
-
-
-def execute_commands(module, cmd):
-    """
-    Method to execute given commands and return the output.
-    :param module: The Ansible module to fetch input parameters.
-    :param cmd: Command to execute.
-    :return: Output of the commands.
-    """
-    global HASH_DICT
+HASH_DICT = StreamingLog()
 
-    out = run_cli(module, cmd)
-
-    # Store command prefixed with exec time as key and
-    # command output as value in the hash dictionary
-    exec_time = run_cli(module, 'date +%Y%m%d%T')
-    key = '{0} {1} {2}'.format(module.params['switch_name'], exec_time, cmd)
-
-    if out:
-        HASH_DICT[key] = out[:512] if len(out.encode('utf-8')) > 512 else out
-    else:
-        HASH_DICT[key] = out
 
-    return out
+EXECUTOR = CommandExecutor(HASH_DICT, max_output_len=512)
+run_cli = EXECUTOR.run_cli
+execute_commands = EXECUTOR.execute_commands
 
 
 def verify_goes_status(module):
@@ -201,14 +171,20 @@ def move_interface(module):
         cmd = 'ip netns exec {} ip add add 10.1.0.{} peer 10.1.0.{}/31 dev xeth{}'.format(clr, a, b, eth)
         execute_commands(module, cmd)
 	if is_spine:
-		cmd = 'ip netns exec {} ping -c 100 10.1.0.{}'.format(clr, b)
-		ping = execute_commands(module, cmd)
-		if '0% packet loss' in ping:
+		# Probe the destination across its link flap
+		address = '10.1.0.{}'.format(b)
+		rate = module.params['probe_rate']
+		cmd = probe_cmd(address, rate, max_duration=100,
+				prefix='ip netns exec {} '.format(clr))
+		report = parse_probe(address, execute_commands(module, cmd),
+				     probe_interval(rate))
+		record_probes(HASH_DICT, switch_name, [report])
+		if report.transmitted and not report.lost:
 		    RESULT_STATUS = False
 		    failure_summary += 'On switch {} '.format(switch_name)
 		    failure_summary += 'ping replies are coming even after setting down '
 		    failure_summary += 'the interface on destination switch.\n'
-		elif '100% packet loss' in ping:
+		elif not report.received:
 		    failure_summary += 'From switch {} '.format(switch_name)
 		    failure_summary += 'the interface on destination switch is not pingable.\n'
 	else:
@@ -241,6 +217,7 @@ def main():
             switch_name=dict(required=False, type='str'),
             eth=dict(required=False, type='str'),
             frequency=dict(required=False, type='int', default=1),
+            probe_rate=dict(required=False, type='int', default=10),
             spine_list=dict(required=False, type='list', default=[]),
             leaf_list=dict(required=False, type='list', default=[]),
             hash_name=dict(required=False, type='str'),
@@ -250,27 +227,22 @@ def main():
 
     global RESULT_STATUS, HASH_DICT
 
+    # Stream executed commands to the log file as they run
+    log_file_path = module.params['log_dir_path']
+    log_file_path += '/{}.log'.format(module.params['hash_name'])
+    HASH_DICT.open(log_file_path, 'a')
+
     move_interface(module)
 
     # Calculate the entire test result
     HASH_DICT['result.status'] = 'Passed' if RESULT_STATUS else 'Failed'
 
-    # Create a log file
-    log_file_path = module.params['log_dir_path']
-    log_file_path += '/{}.log'.format(module.params['hash_name'])
-    log_file = open(log_file_path, 'a')
-    for key, value in HASH_DICT.iteritems():
-        log_file.write(key)
-        log_file.write('\n')
-        log_file.write(str(value))
-        log_file.write('\n')
-        log_file.write('\n')
-
-    log_file.close()
+    # Close the log file, appending the test result
+    log_file_path = HASH_DICT.close()
 
     # Exit the module and return the required JSON.
     module.exit_json(
-        hash_dict=HASH_DICT,
+        hash_dict=HASH_DICT.summary(),
         log_file_path=log_file_path
     )
 
@@ -18,11 +18,11 @@
 # along with Ansible. If not, see <http://www.gnu.org/licenses/>.
 #
 
-import shlex
-
-from collections import OrderedDict
-
 from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.regtest_executor import CommandExecutor
+from ansible.module_utils.regtest_log import StreamingLog
+from ansible.module_utils.regtest_ping import (PingSweep, PingTarget, ping_cmd,
+                                               record_ping)
 
 DOCUMENTATION = """
 ---
@@ -82,50 +82,14 @@ hash_dict:
 """
 
 RESULT_STATUS = True
-HASH_DICT = OrderedDict()
+HASH_DICT = StreamingLog()
 
 
-def run_cli(module, cli):
-    """
-    Method to execute the cli command on the target node(s) and
-    returns the output.
-    :param module: The Ansible module to fetch input parameters.
-    :param cli: The complete cli string to be executed on the target node(s).
-    :return: Output/Error or None depending upon the response from cli.
-    """
-    cli = shlex.split(cli)
-    rc, out, err = module.run_command(cli)
+EXECUTOR = CommandExecutor(HASH_DICT, max_output_len=512)
+run_cli = EXECUTOR.run_cli
+execute_commands = EXECUTOR.execute_commands
 
-    if out:
-        return out.rstrip()
-    elif err:
-        return err.rstrip()
-    else:
-        return None
-
-
-def execute_commands(module, cmd):
-    """
-    Method to execute given commands and return the output.
-    :param module: The Ansible module to fetch input parameters.
-    :param cmd: Command to execute.
-    :return: Output of the commands.
-    """
-    global HASH_DICT
 
-    out = run_cli(module, cmd)
-
-    # Store command prefixed with exec time as key and
-    # command output as value in the hash dictionary
-    exec_time = run_cli(module, 'date +%Y%m%d%T')
-    key = '{0} {1} {2}'.format(module.params['switch_name'], exec_time, cmd)
-
-    if out:
-        HASH_DICT[key] = out[:512] if len(out.encode('utf-8')) > 512 else out
-    else:
-        HASH_DICT[key] = out
-
-    return out
 import time
 
 def verify_traffic(module):
@@ -155,9 +119,12 @@ def verify_traffic(module):
         execute_commands(module, traffic_cmd)
 
         # Verify ping
-        ping_cmd = 'ping -c 10 {}'.format(neighbor_ip)
-        ping_out = execute_commands(module, ping_cmd)
-        if '0% packet loss' not in ping_out:
+        target = PingTarget(neighbor_ip, ping_cmd(neighbor_ip, count=10,
+                                                  interval=1),
+                            max_loss=0)
+        PingSweep(EXECUTOR).sweep(module, [target])
+        record_ping(HASH_DICT, switch_name, [target])
+        if not target.passed:
             RESULT_STATUS = False
             failure_summary += 'On switch {}, '.format(switch_name)
             failure_summary += 'packet loss is observed.\n'
@@ -174,9 +141,12 @@ def verify_traffic(module):
                 failure_summary += 'On switch {}, '.format(switch_name)
                 failure_summary += 'link status of xeth{} is not true.\n'.format(eth)
 
-        cmd = 'ping -s 2000 10.0.1.{} -c 5'.format(target_switch[-2:][0][-2:])
-        ping_out = execute_commands(module, cmd)
-        if '0% packet loss' not in ping_out:
+        ip = '10.0.1.{}'.format(target_switch[-2:][0][-2:])
+        target = PingTarget(ip, ping_cmd(ip, count=5, interval=1, size=2000),
+                            max_loss=0)
+        PingSweep(EXECUTOR).sweep(module, [target])
+        record_ping(HASH_DICT, switch_name, [target])
+        if not target.passed:
             RESULT_STATUS = False
             failure_summary += 'On switch {}, '.format(switch_name)
             failure_summary += 'packet loss is observed.\n'
@@ -216,27 +186,22 @@ def main():
 
     global RESULT_STATUS, HASH_DICT
 
+    # Stream executed commands to the log file as they run
+    log_file_path = module.params['log_dir_path']
+    log_file_path += '/{}.log'.format(module.params['hash_name'])
+    HASH_DICT.open(log_file_path, 'a')
+
     verify_traffic(module)
 
     # Calculate the entire test result
     HASH_DICT['result.status'] = 'Passed' if RESULT_STATUS else 'Failed'
 
-    # Create a log file
-    log_file_path = module.params['log_dir_path']
-    log_file_path += '/{}.log'.format(module.params['hash_name'])
-    log_file = open(log_file_path, 'a')
-    for key, value in HASH_DICT.iteritems():
-        log_file.write(key)
-        log_file.write('\n')
-        log_file.write(str(value))
-        log_file.write('\n')
-        log_file.write('\n')
-
-    log_file.close()
+    # Close the log file, appending the test result
+    log_file_path = HASH_DICT.close()
 
     # Exit the module and return the required JSON.
     module.exit_json(
-        hash_dict=HASH_DICT,
+        hash_dict=HASH_DICT.summary(),
         log_file_path=log_file_path
     )
 
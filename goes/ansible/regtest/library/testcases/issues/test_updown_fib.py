@@ -18,11 +18,10 @@
 # along with Ansible. If not, see <http://www.gnu.org/licenses/>.
 #
 
-import shlex
-
-from collections import OrderedDict
-
 from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.regtest_executor import CommandExecutor
+from ansible.module_utils.regtest_log import StreamingLog
+from ansible.module_utils.regtest_vnet import VnetSnapshot
 
 DOCUMENTATION = """
 ---
@@ -80,46 +79,12 @@ hash_dict:
 """
 
 RESULT_STATUS = True
-HASH_DICT = OrderedDict()
-
-
-def run_cli(module, cli):
-    """
-    Method to execute the cli command on the target node(s) and
-    returns the output.
-    :param module: The Ansible module to fetch input parameters.
-    :param cli: The complete cli string to be executed on the target node(s).
-    :return: Output/Error or None depending upon the response from cli.
-    """
-    cli = shlex.split(cli)
-    rc, out, err = module.run_command(cli)
+HASH_DICT = StreamingLog()
 
-    if out:
-        return out.rstrip()
-    elif err:
-        return err.rstrip()
-    else:
-        return None
-
-
-def execute_commands(module, cmd):
-    """
-    Method to execute given commands and return the output.
-    :param module: The Ansible module to fetch input parameters.
-    :param cmd: Command to execute.
-    :return: Output of the commands.
-    """
-    global HASH_DICT
 
-    out = run_cli(module, cmd)
-
-    # Store command prefixed with exec time as key and
-    # command output as value in the hash dictionary
-    exec_time = run_cli(module, 'date +%Y%m%d%T')
-    key = '{0} {1} {2}'.format(module.params['switch_name'], exec_time, cmd)
-
-    HASH_DICT[key] = out
-    return out
+EXECUTOR = CommandExecutor(HASH_DICT)
+run_cli = EXECUTOR.run_cli
+execute_commands = EXECUTOR.execute_commands
 
 
 def verify_fib(module):
@@ -147,9 +112,8 @@ def verify_fib(module):
                 failure_summary += 'On switch {} '.format(switch_name)
                 failure_summary += 'unable to move the interface xeth{} into docker\n'.format(eth)
 
-            cmd = 'goes vnet show ip fib'
-            out = execute_commands(module, cmd)
-            if ip not in out:
+            snapshot = VnetSnapshot(module, execute_commands)
+            if not snapshot.fib().find(ip):
                 RESULT_STATUS = False
                 failure_summary += 'On switch {} '.format(switch_name)
                 failure_summary += 'FIB entry is not showing up for interface {}\n'.format(eth)
@@ -163,9 +127,8 @@ def verify_fib(module):
                 failure_summary += 'Command- {}\n'.format(cmd)
                 failure_summary += 'Down output- {}\n'.format(out)
 
-            cmd = 'goes vnet show ip fib'
-            out = execute_commands(module, cmd)
-            if ip in out:
+            snapshot.refresh()
+            if snapshot.fib().find(ip):
                 RESULT_STATUS = False
                 failure_summary += 'On switch {} '.format(switch_name)
                 failure_summary += 'the interface is not moved out from container {}\n'.format(eth)
@@ -177,25 +140,18 @@ def verify_fib(module):
         execute_commands(module, cmd)
 	import time
 	time.sleep(10)
-        cmd = 'goes vnet show ip fib'
-        out = execute_commands(module, cmd)
-        if ip not in out:
+        snapshot = VnetSnapshot(module, execute_commands)
+        entries = snapshot.fib().find(ip)
+        if not entries:
             RESULT_STATUS = False
             failure_summary += 'On switch {} '.format(switch_name)
             failure_summary += 'FIB entry is not showing up for interface {}\n'.format(eth)
         else:
-            out = out.splitlines()
-            for line in out:
-                if ip in line:
-                    line = line.strip()
-                    t_id = line.split()[0]
-
-                    cmd = 'goes vnet show ip fib sum'
-                    out = execute_commands(module, cmd)
-                    if t_id not in out:
-                        RESULT_STATUS = False
-                        failure_summary += 'On switch {} '.format(switch_name)
-                        failure_summary += 'FIB summary is not appropriate for interface {}\n'.format(eth)
+            for entry in entries:
+                if entry.table not in snapshot.fib_summary():
+                    RESULT_STATUS = False
+                    failure_summary += 'On switch {} '.format(switch_name)
+                    failure_summary += 'FIB summary is not appropriate for interface {}\n'.format(eth)
 
         # Bring down the interface from the docker container
         cmd = '{} down {} xeth{}'.format(d_move, container_name, eth)
@@ -227,27 +183,22 @@ def main():
 
     global HASH_DICT, RESULT_STATUS
 
+    # Stream executed commands to the log file as they run
+    log_file_path = module.params['log_dir_path']
+    log_file_path += '/{}_'.format(module.params['hash_name']) + '.log'
+    HASH_DICT.open(log_file_path, 'w')
+
     verify_fib(module)
 
     # Calculate the entire test result
     HASH_DICT['result.status'] = 'Passed' if RESULT_STATUS else 'Failed'
 
-    # Create a log file
-    log_file_path = module.params['log_dir_path']
-    log_file_path += '/{}_'.format(module.params['hash_name']) + '.log'
-    log_file = open(log_file_path, 'w')
-    for key, value in HASH_DICT.iteritems():
-        log_file.write(key)
-        log_file.write('\n')
-        log_file.write(str(value))
-        log_file.write('\n')
-        log_file.write('\n')
-
-    log_file.close()
+    # Close the log file, appending the test result
+    log_file_path = HASH_DICT.close()
 
     # Exit the module and return the required JSON.
     module.exit_json(
-        hash_dict=HASH_DICT,
+        hash_dict=HASH_DICT.summary(),
         log_file_path=log_file_path
     )
 
@@ -0,0 +1,298 @@
+#!/usr/bin/python
+""" Measure packet loss and recovery across link flapping """
+
+#
+# This file is part of Ansible
+#
+# Ansible is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Ansible is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Ansible. If not, see <http://www.gnu.org/licenses/>.
+#
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.regtest_executor import CommandExecutor
+from ansible.module_utils.regtest_log import StreamingLog
+from ansible.module_utils.regtest_probe import (ProbeSet, probe_failures,
+                                                record_probes)
+
+DOCUMENTATION = """
+---
+module: link_flap_probe
+author: Platina Systems
+short_description: Module to measure packet loss across link flapping.
+description:
+    Module to run a continuous stream of timestamped pings to the neighbors
+    of a leaf switch while its links flap, and to measure the outages,
+    packets lost and recovery time of each link from it.
+options:
+    switch_name:
+      description:
+        - Name of the switch on which tests will be performed.
+      required: False
+      type: str
+    state:
+      description:
+        - start to start the probes, mark to note the end of the flapping,
+          stop to stop the probes and measure the outages.
+      required: False
+      type: str
+      choices: [ start, mark, stop ]
+      default: stop
+    spine_list:
+      description:
+        - List of all spine switches.
+      required: False
+      type: list
+      default: []
+    leaf_list:
+      description:
+        - List of all leaf switches.
+      required: False
+      type: list
+      default: []
+    f_ports:
+      description:
+        - List of fiber ports to leave out.
+      required: False
+      type: list
+      default: []
+    addresses:
+      description:
+        - Addresses to probe, instead of the neighbor interface addresses
+          of a leaf switch.
+      required: False
+      type: list
+    rate:
+      description:
+        - Probes per second to each address.
+      required: False
+      type: int
+      default: 100
+    max_duration:
+      description:
+        - Seconds after which the probes stop by themselves.
+      required: False
+      type: int
+      default: 3600
+    max_recovery_time:
+      description:
+        - Highest time in seconds, from the mark, for ping replies to come
+          back on every link. Not checked if not given.
+      required: False
+      type: float
+    hash_name:
+      description:
+        - Name of the hash in which to store the result in redis.
+      required: False
+      type: str
+    log_dir_path:
+      description:
+        - Path to log directory where logs will be stored.
+      required: False
+      type: str
+"""
+
+EXAMPLES = """
+- name: Start measuring packet loss
+  link_flap_probe:
+    switch_name: "{{ inventory_hostname }}"
+    state: start
+    spine_list: "{{ groups['spine'] }}"
+    leaf_list: "{{ groups['leaf'] }}"
+
+- name: Flap the links 500 times
+  shell: /tmp/./flap 1 500
+
+- name: Note the end of the flapping
+  link_flap_probe:
+    switch_name: "{{ inventory_hostname }}"
+    state: mark
+
+- name: Measure packet loss and recovery
+  link_flap_probe:
+    switch_name: "{{ inventory_hostname }}"
+    state: stop
+    max_recovery_time: 10
+    hash_name: "{{ hostvars['server_emulator']['hash_name'] }}"
+    log_dir_path: "{{ link_flap_log_dir }}"
+"""
+
+RETURN = """
+hash_dict:
+  description: Dictionary containing key value pairs to store in hash.
+  returned: state is stop
+  type: dict
+probes:
+  description: Probe commands by address, or per address the probes sent
+    and lost and every outage found.
+  returned: always
+  type: dict
+"""
+
+RESULT_STATUS = True
+HASH_DICT = StreamingLog()
+
+
+EXECUTOR = CommandExecutor(HASH_DICT)
+
+
+def get_addresses(module):
+    """
+    Method to get the addresses to probe: the addresses given, or on a
+    leaf the interface addresses of the spines at the other end of its
+    links, as pinged by verify_links.
+    :param module: The Ansible module to fetch input parameters.
+    :return: List of IP addresses.
+    """
+    if module.params['addresses']:
+        return module.params['addresses']
+
+    switch_name = module.params['switch_name']
+    leaf_list = module.params['leaf_list']
+    spine_list = module.params['spine_list']
+    f_ports = [int(port) for port in module.params['f_ports']]
+
+    if switch_name not in leaf_list or len(spine_list) < 2:
+        return []
+
+    index = leaf_list.index(switch_name)
+    addresses = []
+    for eth in range(1, 32, 2):
+        if eth in f_ports:
+            continue
+        spine = spine_list[(index + (eth > 16)) % 2]
+        addresses.append('10.0.{}.{}'.format(eth, spine[-2::]))
+
+    return addresses
+
+
+def describe(report, mark):
+    """
+    Method to summarize a probe stream for the log.
+    :param report: ProbeReport.
+    :param mark: Seconds since epoch recovery is measured from, or None.
+    :return: Summary string.
+    """
+    out = '{} probes sent, {} lost, {} outages'.format(
+        report.transmitted, report.lost, len(report.outages))
+    for outage in report.outages:
+        if outage.end is None:
+            out += '\n{} probes lost, no replies since'.format(outage.lost)
+        else:
+            out += '\n{} probes lost, {:.3f}s without replies'.format(
+                outage.lost, outage.duration)
+    if mark is not None:
+        recovery = report.recovery_time(mark)
+        if recovery is not None:
+            out += '\nreplies back {:.3f}s after the mark'.format(recovery)
+    return out
+
+
+def measure_probes(module, probe_set):
+    """
+    Method to stop the probes and verify that every link recovered.
+    :param module: The Ansible module to fetch input parameters.
+    :param probe_set: ProbeSet of the running probes.
+    :return: Dict of address to measured numbers.
+    """
+    global RESULT_STATUS, HASH_DICT
+    switch_name = module.params['switch_name']
+    mark = probe_set.last_mark()
+    probes = dict((address, probe['cmd']) for address, probe in
+                  probe_set.state.get('probes', {}).items())
+
+    reports = [report for report, out in probe_set.stop()]
+    for report in reports:
+        EXECUTOR.record(module, probes[report.address],
+                        describe(report, mark))
+
+    failure_summary = probe_failures(switch_name, reports, mark,
+                                     module.params['max_recovery_time'])
+    if failure_summary:
+        RESULT_STATUS = False
+
+    record_probes(HASH_DICT, switch_name, reports, mark)
+    HASH_DICT['result.detail'] = failure_summary
+
+    measured = {}
+    for report in reports:
+        measured[report.address] = {
+            'transmitted': report.transmitted,
+            'lost': report.lost,
+            'recovery_time': (report.recovery_time(mark)
+                              if mark is not None else None),
+            'outages': [dict(outage._asdict())
+                        for outage in report.outages],
+        }
+    return measured
+
+
+def main():
+    """ This section is for arguments parsing """
+    module = AnsibleModule(
+        argument_spec=dict(
+            switch_name=dict(required=False, type='str'),
+            state=dict(required=False, type='str', default='stop',
+                       choices=['start', 'mark', 'stop']),
+            spine_list=dict(required=False, type='list', default=[]),
+            leaf_list=dict(required=False, type='list', default=[]),
+            f_ports=dict(required=False, type='list', default=[]),
+            addresses=dict(required=False, type='list'),
+            rate=dict(required=False, type='int', default=100),
+            max_duration=dict(required=False, type='int', default=3600),
+            max_recovery_time=dict(required=False, type='float'),
+            hash_name=dict(required=False, type='str'),
+            log_dir_path=dict(required=False, type='str'),
+        )
+    )
+
+    global HASH_DICT, RESULT_STATUS
+
+    state = module.params['state']
+    probe_set = ProbeSet()
+
+    if state == 'start':
+        try:
+            probes = probe_set.start(get_addresses(module),
+                                     module.params['rate'],
+                                     module.params['max_duration'])
+        except (IOError, OSError) as e:
+            module.fail_json(msg='Failed to start the probes: {}'.format(e))
+        module.exit_json(changed=bool(probes), probes=probes)
+
+    if state == 'mark':
+        probe_set.mark('flap.end')
+        module.exit_json(probes={})
+
+    # Stream executed commands to the log file as they run
+    log_file_path = module.params['log_dir_path']
+    log_file_path += '/{}.log'.format(module.params['hash_name'])
+    HASH_DICT.open(log_file_path, 'a')
+
+    probes = measure_probes(module, probe_set)
+
+    # Calculate the entire test result
+    HASH_DICT['result.status'] = 'Passed' if RESULT_STATUS else 'Failed'
+
+    # Close the log file, appending the test result
+    log_file_path = HASH_DICT.close()
+
+    # Exit the module and return the required JSON.
+    module.exit_json(
+        hash_dict=HASH_DICT.summary(),
+        log_file_path=log_file_path,
+        probes=probes
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -18,11 +18,11 @@
 # along with Ansible. If not, see <http://www.gnu.org/licenses/>.
 #
 
-import shlex
-
-from collections import OrderedDict
 import time
 from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.regtest_executor import CommandExecutor
+from ansible.module_utils.regtest_log import StreamingLog
+from ansible.module_utils.regtest_ports import get_port_table
 
 DOCUMENTATION = """
 ---
@@ -65,93 +65,55 @@ hash_dict:
 """
 
 RESULT_STATUS = True
-HASH_DICT = OrderedDict()
-
-
-def run_cli(module, cli):
-    """
-    Method to execute the cli command on the target node(s) and
-    returns the output.
-    :param module: The Ansible module to fetch input parameters.
-    :param cli: The complete cli string to be executed on the target node(s).
-    :return: Output/Error or None depending upon the response from cli.
-    """
-    cli = shlex.split(cli)
-    rc, out, err = module.run_command(cli)
-
-    if out:
-        return out.rstrip()
-    elif err:
-        return err.rstrip()
-    else:
-        return None
+HASH_DICT = StreamingLog()
 
 
-def execute_commands(module, cmd):
-    """
-    Method to execute given commands and return the output.
-    :param module: The Ansible module to fetch input parameters.
-    :param cmd: Command to execute.
-    :return: Output of the commands.
-    """
-    global HASH_DICT
+EXECUTOR = CommandExecutor(
+    HASH_DICT,
+    skip=lambda module, cmd: (('service' in cmd and 'restart' in cmd) or
+                              module.params['dry_run_mode']))
+run_cli = EXECUTOR.run_cli
+execute_commands = EXECUTOR.execute_commands
 
-    if 'service' in cmd and 'restart' in cmd or module.params['dry_run_mode']:
-        out = None
-    else:
-        out = run_cli(module, cmd)
 
-    # Store command prefixed with exec time as key and
-    # command output as value in the hash dictionary
-    exec_time = run_cli(module, 'date +%Y%m%d%T')
-    key = '{0} {1} {2}'.format(module.params['switch_name'], exec_time, cmd)
-    HASH_DICT[key] = out
+def verify_link_status(module):
+    global RESULT_STATUS, HASH_DICT
+    failure_summary = ''
+    aname = module.params['switch_name']
+    stage = module.params['stage']
+    speed = module.params['speed']
+    f_ports = module.params['f_ports']
+    eth_list = [1,3,5,7,9,11,13,15,17,19,21,23,25,27,29,31]
+    for ele in f_ports:
+        try:
+            eth_list.remove(ele)
+        except Exception as e:
+            pass
+
+    # Read link/speed of all ports in one go
+    port_table = get_port_table(module, execute_commands, 'platina-mk1')
+
+    if module.params['sub']:
+        for eth in eth_list:
+            for subp in module.params['sub']:
+                port = 'xeth{}-{}'.format(eth, subp)
+                if speed and not port_table.check(port, 'speed', speed):
+                    RESULT_STATUS = False
+                    failure_summary += "link speed is not {} {} link flapping on invader{} for {}.\n".format(speed, stage, aname, port)
+
+                if not port_table.get(port).link:
+                    RESULT_STATUS = False
+                    failure_summary += "link status is not true {} link flapping on invader{} for {}.\n".format(stage, aname, port)
 
-    return out
+    else:
+        for eth in eth_list:
+            if not port_table.get('xeth{}'.format(eth)).link:
+                RESULT_STATUS = False
+                failure_summary += "xeth{} link status is not true {} link flapping on invader{}.\n".format(eth, stage, aname)
 
+    execute_commands(module, 'goes status')
 
-def verify_link_status(module):
-	global RESULT_STATUS, HASH_DICT
-	failure_summary = ''
-	aname = module.params['switch_name']
-	stage = module.params['stage']
-        speed = module.params['speed']
-        f_ports = module.params['f_ports']
-	eth_list = [1,3,5,7,9,11,13,15,17,19,21,23,25,27,29,31]
-        for ele in f_ports:
-	    try:
-        	eth_list.remove(ele)
-	    except Exception as e:
-		pass
-	if module.params['sub']:
-		for eth in eth_list:
-		    for subp in module.params['sub']:
-			if speed:
-				out = execute_commands(module, "goes hget platina-mk1 vnet.xeth{}-{}.speed".format(eth, subp))
-	                        out = out.splitlines()
-        	                for line in out:
-                	                if speed not in line:
-                        	                RESULT_STATUS = False
-                                	        failure_summary += "link speed is not {} {} link flapping on invader{} for {}.\n".format(speed, stage, aname, line)
-
-                	out = execute_commands(module, "goes hget platina-mk1 vnet.xeth{}-{}.link".format(eth, subp))
-			out = out.splitlines()
-			for line in out:
-	                	if "true" not in line:
-        	                	RESULT_STATUS = False
-                	        	failure_summary += "link status is not true {} link flapping on invader{} for {}.\n".format(stage, aname, line)
-
-	else:			
-		for eth in eth_list:
-	        	out = execute_commands(module, "goes hget platina-mk1 vnet.xeth{}.link".format(eth))
-			if "true" not in out:
-				RESULT_STATUS = False
-				failure_summary += "xeth{} link status is not true {} link flapping on invader{}.\n".format(eth, stage, aname)
-
-
-	execute_commands(module, 'goes status')
-
-	HASH_DICT['result.detail'] = failure_summary
+    HASH_DICT['result.detail'] = failure_summary
 
 
 def main():
@@ -172,6 +134,12 @@ def main():
     )
 
     global HASH_DICT, RESULT_STATUS
+
+    # Stream executed commands to the log file as they run
+    if not module.params['dry_run_mode']:
+        log_file_path = module.params['log_dir_path']
+        log_file_path += '/{}.log'.format(module.params['hash_name'])
+        HASH_DICT.open(log_file_path, 'a')
     if module.params['dry_run_mode']:
 	module.params['switch_name']
         cmds_list = []
@@ -191,22 +159,12 @@ def main():
         # Calculate the entire test result
         HASH_DICT['result.status'] = 'Passed' if RESULT_STATUS else 'Failed'
 
-        # Create a log file
-        log_file_path = module.params['log_dir_path']
-        log_file_path += '/{}.log'.format(module.params['hash_name'])
-        log_file = open(log_file_path, 'a')
-        for key, value in HASH_DICT.iteritems():
-            log_file.write(key)
-            log_file.write('\n')
-            log_file.write(str(value))
-            log_file.write('\n')
-            log_file.write('\n')
-
-        log_file.close()
+        # Close the log file, appending the test result
+        log_file_path = HASH_DICT.close()
 
         # Exit the module and return the required JSON.
         module.exit_json(
-            hash_dict=HASH_DICT,
+            hash_dict=HASH_DICT.summary(),
             log_file_path=log_file_path
         )
 if __name__ == '__main__':
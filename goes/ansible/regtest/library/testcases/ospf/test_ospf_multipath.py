@@ -18,10 +18,10 @@
 # along with Ansible. If not, see <http://www.gnu.org/licenses/>.
 #
 
-import shlex
-from collections import OrderedDict
-
 from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.regtest_executor import CommandExecutor
+from ansible.module_utils.regtest_log import StreamingLog
+from ansible.module_utils.regtest_vnet import FIB_CMD, FibTable
 
 DOCUMENTATION = """
 ---
@@ -94,49 +94,14 @@ hash_dict:
 """
 
 RESULT_STATUS = True
-HASH_DICT = OrderedDict()
-
-
-def run_cli(module, cli):
-    """
-    Method to execute the cli command on the target node(s) and
-    returns the output.
-    :param module: The Ansible module to fetch input parameters.
-    :param cli: The complete cli string to be executed on the target node(s).
-    :return: Output/Error or None depending upon the response from cli.
-    """
-    cli = shlex.split(cli)
-    rc, out, err = module.run_command(cli)
-
-    if out:
-        return out.rstrip()
-    elif err:
-        return err.rstrip()
-    else:
-        return None
-
-
-def execute_commands(module, cmd):
-    """
-    Method to execute given commands and return the output.
-    :param module: The Ansible module to fetch input parameters.
-    :param cmd: Command to execute.
-    :return: Output of the commands.
-    """
-    global HASH_DICT
-
-    if 'service' in cmd and 'restart' in cmd:
-        out = None
-    else:
-        out = run_cli(module, cmd)
+HASH_DICT = StreamingLog()
 
-    # Store command prefixed with exec time as key and
-    # command output as value in the hash dictionary
-    exec_time = run_cli(module, 'date +%Y%m%d%T')
-    key = '{0} {1} {2}'.format(module.params['switch_name'], exec_time, cmd)
-    HASH_DICT[key] = out
 
-    return out
+EXECUTOR = CommandExecutor(
+    HASH_DICT,
+    skip=lambda module, cmd: 'service' in cmd and 'restart' in cmd)
+run_cli = EXECUTOR.run_cli
+execute_commands = EXECUTOR.execute_commands
 
 
 def get_config(module):
@@ -196,23 +161,24 @@ def verify_fib(module):
         ip = '192.168.{}.1'.format(switch[-2::])
         routes.append(ip)
 
-    cmd = 'goes vnet show ip fib'
+    cmd = FIB_CMD
     out = execute_commands(module, cmd)
+    fib = FibTable.from_output(out)
 
     for route in routes:
-        if route not in out:
+        if not fib.find(route):
             RESULT_STATUS = False
             failure_summary += 'On Switch {} '.format(switch_name)
             failure_summary += 'fib entry for {} cannot be verified in the '.format(route)
             failure_summary += 'output of command {} {}\n'.format(cmd, stage)
 
     for eth in eth_list:
-        if interface and interface in eth and 'rewrite xeth{}'.format(eth) in out:
+        if interface and interface in eth and fib.via('xeth{}'.format(eth), 'rewrite'):
             RESULT_STATUS = False
             failure_summary += 'On Switch {} '.format(switch_name)
             failure_summary += 'fib entry for xeth{} is still there even {} '.format(interface, stage)
             failure_summary += 'in the output of command {}\n'.format(cmd)
-        elif interface not in eth and 'rewrite xeth{}'.format(eth) not in out:
+        elif interface not in eth and not fib.via('xeth{}'.format(eth), 'rewrite'):
             RESULT_STATUS = False
             failure_summary += 'On Switch {} '.format(switch_name)
             failure_summary += 'fib entry for xeth{} cannot be verified in the '.format(interface)
@@ -321,6 +287,11 @@ def main():
     )
 
     global HASH_DICT, RESULT_STATUS
+
+    # Stream executed commands to the log file as they run
+    log_file_path = module.params['log_dir_path']
+    log_file_path += '/{}.log'.format(module.params['hash_name'])
+    HASH_DICT.open(log_file_path, 'a')
     failure_summary = ''
     switch_name = module.params['switch_name']
     leaf_list = module.params['leaf_list']
@@ -344,22 +315,12 @@ def main():
     # Calculate the entire test result
     HASH_DICT['result.status'] = 'Passed' if RESULT_STATUS else 'Failed'
 
-    # Create a log file
-    log_file_path = module.params['log_dir_path']
-    log_file_path += '/{}.log'.format(module.params['hash_name'])
-    log_file = open(log_file_path, 'a')
-    for key, value in HASH_DICT.iteritems():
-        log_file.write(key)
-        log_file.write('\n')
-        log_file.write(str(value))
-        log_file.write('\n')
-        log_file.write('\n')
-
-    log_file.close()
+    # Close the log file, appending the test result
+    log_file_path = HASH_DICT.close()
 
     # Exit the module and return the required JSON.
     module.exit_json(
-        hash_dict=HASH_DICT,
+        hash_dict=HASH_DICT.summary(),
         log_file_path=log_file_path
     )
 
@@ -18,11 +18,10 @@
 # along with Ansible. If not, see <http://www.gnu.org/licenses/>.
 #
 
-import shlex
-
-from collections import OrderedDict
-
 from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.regtest_executor import CommandExecutor
+from ansible.module_utils.regtest_log import StreamingLog
+from ansible.module_utils.regtest_ports import get_port_table
 
 DOCUMENTATION = """
 ---
@@ -100,49 +99,15 @@ hash_dict:
 """
 
 RESULT_STATUS = True
-HASH_DICT = OrderedDict()
-
-
-def run_cli(module, cli):
-    """
-    Method to execute the cli command on the target node(s) and
-    returns the output.
-    :param module: The Ansible module to fetch input parameters.
-    :param cli: The complete cli string to be executed on the target node(s).
-    :return: Output/Error or None depending upon the response from cli.
-    """
-    cli = shlex.split(cli)
-    rc, out, err = module.run_command(cli)
-
-    if out:
-        return out.rstrip()
-    elif err:
-        return err.rstrip()
-    else:
-        return None
-
-
-def execute_commands(module, cmd):
-    """
-    Method to execute given commands and return the output.
-    :param module: The Ansible module to fetch input parameters.
-    :param cmd: Command to execute.
-    :return: Output of the commands.
-    """
-    global HASH_DICT
-
-    if ('service' in cmd and 'restart' in cmd) or module.params['dry_run_mode']:
-        out = None
-    else:
-        out = run_cli(module, cmd)
+HASH_DICT = StreamingLog()
 
-    # Store command prefixed with exec time as key and
-    # command output as value in the hash dictionary
-    exec_time = run_cli(module, 'date +%Y%m%d%T')
-    key = '{0} {1} {2}'.format(module.params['switch_name'], exec_time, cmd)
-    HASH_DICT[key] = out
 
-    return out
+EXECUTOR = CommandExecutor(
+    HASH_DICT,
+    skip=lambda module, cmd: (('service' in cmd and 'restart' in cmd) or
+                              module.params['dry_run_mode']))
+run_cli = EXECUTOR.run_cli
+execute_commands = EXECUTOR.execute_commands
 
 
 def verify_goes_status(module, switch_name):
@@ -211,203 +176,104 @@ def verify_port_links(module):
     # Verify networking service status before upgrade
     failure_summary += verify_networking_status(module, switch_name)
 
-    if not is_subports:
-        for ele in module.params['f_ports']:
-                try:
-                        eth_list.remove(str(ele))
-                except:
-                        pass
-        for eth in eth_list:
-            # Verify interface media is set to correct value
-            cmd = 'goes hget {} vnet.xeth{}.media'.format(platina_redis_channel, eth)
-            out = run_cli(module, cmd)
-            if media not in out:
-                RESULT_STATUS = False
-                failure_summary += 'On switch {} '.format(switch_name)
-                failure_summary += 'interface media is not set to copper '
-                failure_summary += 'for the interface xeth{}\n'.format(eth)
-
-            # Verify speed of interfaces are set to correct value
-            cmd = 'goes hget {} vnet.xeth{}.speed'.format(platina_redis_channel, eth)
-            out = run_cli(module, cmd)
-            if speed not in out:
-                RESULT_STATUS = False
-                failure_summary += 'On switch {} '.format(switch_name)
-                failure_summary += 'speed of the interface '
-                failure_summary += 'is not set to {} for '.format(speed)
-                failure_summary += 'the interface xeth{}\n'.format(eth)
-
-            # Verify fec of interfaces are set to correct value
-            cmd = 'goes hget {} vnet.xeth{}.fec'.format(platina_redis_channel, eth)
-            out = run_cli(module, cmd)
-            if fec not in out:
-                RESULT_STATUS = False
-                failure_summary += 'On switch {} '.format(switch_name)
-                failure_summary += 'fec is not set to {} for '.format(fec)
-                failure_summary += 'the interface xeth{}\n'.format(eth)
-
-            # Verify if port links are up
-            cmd = 'goes hget {} vnet.xeth{}.link'.format(platina_redis_channel, eth)
-            out = run_cli(module, cmd)
-            if 'true' not in out:
-                RESULT_STATUS = False
-                failure_summary += 'On switch {} '.format(switch_name)
-                failure_summary += 'port link is not up '
-                failure_summary += 'for the interface xeth{}\n'.format(eth)
-
-            # Verify autoneg of interfaces are set to correct value
-            cmd = 'ethtool xeth{}'.format(eth)
-            out = run_cli(module, cmd)
-            if 'Auto-negotiation: {}'.format(autoneg) not in out:
-                RESULT_STATUS = False
-                failure_summary += 'On switch {} '.format(switch_name)
-                failure_summary += 'autoneg is not set to {} for '.format(autoneg)
-                failure_summary += 'the interface xeth{}\n'.format(eth)
-
-        amedia = "fiber"
-        f_ports = module.params['f_ports']
-        for ele in f_ports: 
-		if ele%2 == 0:
-			continue
-		else:
-			cmd = "goes hget platina-mk1 qsfp.compliance"
-			out = execute_commands(module, cmd).splitlines()
-                	for line in out:
-                    		if ("xeth{}".format(ele) in line and "100GBASE-LR4" in line):
-                        		afec = "none"
-                        		break
-                    		elif ("xeth{}".format(ele) in line and "100G CWDM4" in line):
-                        		afec = "none"
-                        		break
-                    		elif ("xeth{}".format(ele) in line and "100GBASE-SR4" in line):
-                        		afec = "cl91"
-                        		break
-                    		else:
-                       			continue
-                        cmd1 = 'goes hget {} vnet.xeth{}.fec'.format(platina_redis_channel, ele)
-                        cmd2 = 'goes hget {} vnet.xeth{}.media'.format(platina_redis_channel, ele)
-                        cmd3 = 'goes hget {} vnet.xeth{}.link'.format(platina_redis_channel, ele)
-                        out1 = run_cli(module, cmd1)
-                        out2 = run_cli(module, cmd2)
-                        out3 = run_cli(module, cmd3)
-                        if afec not in out1:
-                                RESULT_STATUS = False
-                                failure_summary += 'On switch {} '.format(switch_name)
-                                failure_summary += 'fec of the interface {} '.format(ele)
-                                failure_summary += 'is not set to {}'.format(afec)
-                        if amedia not in out2:
-                                RESULT_STATUS = False
-                                failure_summary += 'On switch {} '.format(switch_name)
-                                failure_summary += 'media of the interface {} '.format(ele)
-                                failure_summary += 'is not set to {}'.format(amedia)
-                        if 'true' not in out3:
-                                RESULT_STATUS = False
-                                failure_summary += 'On switch {} '.format(switch_name)
-                                failure_summary += 'link of the interface {} '.format(ele)
-                                failure_summary += 'is not set to True.\n'
+    for ele in module.params['f_ports']:
+        try:
+            eth_list.remove(str(ele))
+        except:
+            pass
 
+    if not is_subports:
+        ports = ['xeth{}'.format(eth) for eth in eth_list]
     else:
-        for ele in module.params['f_ports']:
-		try:
-			eth_list.remove(str(ele))
-		except:
-			pass
         if not is_lane2_count2:
             subports = ['1', '2', '3', '4']
         else:
             subports = ['1', '2']
-            
-        for eth in eth_list:
-            for port in subports:
-                # Verify interface media is set to correct value
-                cmd = 'goes hget {} vnet.xeth{}-{}.media'.format(platina_redis_channel, eth, port)
-                out = run_cli(module, cmd)
-                if media not in out:
-                    RESULT_STATUS = False
-                    failure_summary += 'On switch {} '.format(switch_name)
-                    failure_summary += 'interface media is not set to copper '
-                    failure_summary += 'for the interface xeth{}-{}\n'.format(eth, port)
-
-                # Verify speed of interfaces are set to correct value
-                cmd = 'goes hget {} vnet.xeth{}-{}.speed'.format(platina_redis_channel, eth, port)
-                out = run_cli(module, cmd)
-                if speed not in out:
-                    RESULT_STATUS = False
-                    failure_summary += 'On switch {} '.format(switch_name)
-                    failure_summary += 'speed of the interface '
-                    failure_summary += 'is not set to {} for '.format(speed)
-                    failure_summary += 'the interface xeth{}-{}\n'.format(eth, port)
-
-                # Verify fec of interfaces are set to correct value
-                cmd = 'goes hget {} vnet.xeth{}-{}.fec'.format(platina_redis_channel, eth, port)
-                out = run_cli(module, cmd)
-                if fec not in out:
-                    RESULT_STATUS = False
-                    failure_summary += 'On switch {} '.format(switch_name)
-                    failure_summary += 'fec is not set to {} for '.format(fec)
-                    failure_summary += 'the interface xeth{}-{}\n'.format(eth, port)
-
-                # Verify if port links are up
-                cmd = 'goes hget {} vnet.xeth{}-{}.link'.format(platina_redis_channel, eth, port)
-                out = run_cli(module, cmd)
-                if 'true' not in out:
-                    RESULT_STATUS = False
-                    failure_summary += 'On switch {} '.format(switch_name)
-                    failure_summary += 'port link is not up '
-                    failure_summary += 'for the interface xeth{}-{}\n'.format(eth, port)
-
-                # Verify autoneg of interfaces are set to correct value
-                cmd = 'ethtool xeth{}-{}'.format(eth, port)
-                out = run_cli(module, cmd)
-                if 'Auto-negotiation: {}'.format(autoneg) not in out:
-                    RESULT_STATUS = False
-                    failure_summary += 'On switch {} '.format(switch_name)
-                    failure_summary += 'autoneg is not set to {} for '.format(autoneg)
-                    failure_summary += 'the interface xeth{}-{}\n'.format(eth, port)
-        
-        amedia = "fiber"
-	f_ports = module.params['f_ports']
-        for ele in f_ports:
-		if ele % 2 == 0:
-			continue
-		else:
-			cmd = "goes hget platina-mk1 qsfp.compliance"
-                        out = execute_commands(module, cmd).splitlines()
-                        for line in out:
-                                if ("xeth{}".format(ele) in line and "100GBASE-LR4" in line):
-                                        afec = "none"
-                                        break
-                                elif ("xeth{}".format(ele) in line and "100G CWDM4" in line):
-                                        afec = "none"
-                                        break
-                                elif ("xeth{}".format(ele) in line and "100GBASE-SR4" in line):
-                                        afec = "cl91"
-                                        break
-                                else:
-                                        continue
-		       	cmd1 = 'goes hget {} vnet.xeth{}.fec'.format(platina_redis_channel, ele)
-			cmd2 = 'goes hget {} vnet.xeth{}.media'.format(platina_redis_channel, ele)
-			cmd3 = 'goes hget {} vnet.xeth{}.link'.format(platina_redis_channel, ele)
-			out1 = run_cli(module, cmd1)
-			out2 = run_cli(module, cmd2)
-			out3 = run_cli(module, cmd3)
-			if afec not in out1:
-                    		RESULT_STATUS = False
-	                	failure_summary += 'On switch {} '.format(switch_name)
-                    		failure_summary += 'fec of the interface {} '.format(ele)
-                    		failure_summary += 'is not set to {}'.format(afec)
-			if amedia not in out2:
-                                RESULT_STATUS = False
-                                failure_summary += 'On switch {} '.format(switch_name)
-                                failure_summary += 'media of the interface {} '.format(ele)
-                                failure_summary += 'is not set to {}'.format(amedia)
-			if 'true' not in out3:
-                                RESULT_STATUS = False
-                                failure_summary += 'On switch {} '.format(switch_name)
-                                failure_summary += 'link of the interface {} '.format(ele)
-                                failure_summary += 'is not set to True.\n'
-
- 
+
+        ports = ['xeth{}-{}'.format(eth, port)
+                 for eth in eth_list for port in subports]
+
+    # Read media/speed/fec/link of all ports in one go
+    port_table = get_port_table(module, run_cli, platina_redis_channel)
+
+    for port in ports:
+        # Verify interface media is set to correct value
+        if not port_table.check(port, 'media', media):
+            RESULT_STATUS = False
+            failure_summary += 'On switch {} '.format(switch_name)
+            failure_summary += 'interface media is not set to copper '
+            failure_summary += 'for the interface {}\n'.format(port)
+
+        # Verify speed of interfaces are set to correct value
+        if not port_table.check(port, 'speed', speed):
+            RESULT_STATUS = False
+            failure_summary += 'On switch {} '.format(switch_name)
+            failure_summary += 'speed of the interface '
+            failure_summary += 'is not set to {} for '.format(speed)
+            failure_summary += 'the interface {}\n'.format(port)
+
+        # Verify fec of interfaces are set to correct value
+        if not port_table.check(port, 'fec', fec):
+            RESULT_STATUS = False
+            failure_summary += 'On switch {} '.format(switch_name)
+            failure_summary += 'fec is not set to {} for '.format(fec)
+            failure_summary += 'the interface {}\n'.format(port)
+
+        # Verify if port links are up
+        if not port_table.get(port).link:
+            RESULT_STATUS = False
+            failure_summary += 'On switch {} '.format(switch_name)
+            failure_summary += 'port link is not up '
+            failure_summary += 'for the interface {}\n'.format(port)
+
+        # Verify autoneg of interfaces are set to correct value
+        cmd = 'ethtool {}'.format(port)
+        out = run_cli(module, cmd)
+        if 'Auto-negotiation: {}'.format(autoneg) not in out:
+            RESULT_STATUS = False
+            failure_summary += 'On switch {} '.format(switch_name)
+            failure_summary += 'autoneg is not set to {} for '.format(autoneg)
+            failure_summary += 'the interface {}\n'.format(port)
+
+    amedia = "fiber"
+    f_ports = module.params['f_ports']
+    compliance = None
+    for ele in f_ports:
+        if ele % 2 == 0:
+            continue
+
+        if compliance is None:
+            cmd = "goes hget platina-mk1 qsfp.compliance"
+            compliance = execute_commands(module, cmd).splitlines()
+
+        for line in compliance:
+            if ("xeth{}".format(ele) in line and "100GBASE-LR4" in line):
+                afec = "none"
+                break
+            elif ("xeth{}".format(ele) in line and "100G CWDM4" in line):
+                afec = "none"
+                break
+            elif ("xeth{}".format(ele) in line and "100GBASE-SR4" in line):
+                afec = "cl91"
+                break
+
+        port = 'xeth{}'.format(ele)
+        if not port_table.check(port, 'fec', afec):
+            RESULT_STATUS = False
+            failure_summary += 'On switch {} '.format(switch_name)
+            failure_summary += 'fec of the interface {} '.format(ele)
+            failure_summary += 'is not set to {}'.format(afec)
+        if not port_table.check(port, 'media', amedia):
+            RESULT_STATUS = False
+            failure_summary += 'On switch {} '.format(switch_name)
+            failure_summary += 'media of the interface {} '.format(ele)
+            failure_summary += 'is not set to {}'.format(amedia)
+        if not port_table.get(port).link:
+            RESULT_STATUS = False
+            failure_summary += 'On switch {} '.format(switch_name)
+            failure_summary += 'link of the interface {} '.format(ele)
+            failure_summary += 'is not set to True.\n'
+
     HASH_DICT['result.detail'] = failure_summary
 
     # Get the GOES status info
@@ -436,6 +302,12 @@ def main():
 
     global HASH_DICT, RESULT_STATUS
 
+    # Stream executed commands to the log file as they run
+    if not module.params['dry_run_mode']:
+        log_file_path = module.params['log_dir_path']
+        log_file_path += '/{}.log'.format(module.params['hash_name'])
+        HASH_DICT.open(log_file_path, 'a')
+
     # Verify port link
     if module.params['dry_run_mode']:
         cmds_list = []
@@ -452,40 +324,30 @@ def main():
 	execute_commands(module, 'goes status')
 	execute_commands(module, 'service networking status')
 
-	if not is_subports:
-        	for eth in eth_list:
-			execute_commands(module, 'goes hget {} vnet.xeth{}.media'.format(platina_redis_channel, eth))
-			execute_commands(module, 'goes hget {} vnet.xeth{}.speed'.format(platina_redis_channel, eth))
-			execute_commands(module, 'goes hget {} vnet.xeth{}.fec'.format(platina_redis_channel, eth))
-			execute_commands(module, 'goes hget {} vnet.xeth{}.link'.format(platina_redis_channel, eth))
-			execute_commands(module, 'ethtool xeth{}'.format(eth))
-	else:
-		for ele in module.params['f_ports']:
-			try:
-				eth_list.remove(ele)
-			except:
-				pass
-		if not is_lane2_count2:
-		    subports = ['1', '2', '3', '4']
-		else:
-		    subports = ['1', '2']
-
-		for eth in eth_list:
-            		for port in subports:
-		                # Verify interface media is set to correct value
-                		execute_commands(module, 'goes hget {} vnet.xeth{}-{}.media'.format(platina_redis_channel, eth, port))
-				execute_commands(module, 'goes hget {} vnet.xeth{}-{}.speed'.format(platina_redis_channel, eth, port))
-				execute_commands(module, 'goes hget {} vnet.xeth{}-{}.tec'.format(platina_redis_channel, eth, port))
-				execute_commands(module, 'goes hget {} vnet.xeth{}-{}.link'.format(platina_redis_channel, eth, port))
-				execute_commands(module, 'ethtool xeth{}-{}'.format(eth, port))
-		afec = "cl91"
-		amedia = "fiber"
-		f_ports = module.params['f_ports']
-		for ele in f_ports:
-				execute_commands(module, 'goes hget {} vnet.xeth{}.fec'.format(platina_redis_channel, ele))
-				execute_commands(module, 'goes hget {} vnet.xeth{}.media'.format(platina_redis_channel, ele))
-				execute_commands(module, 'goes hget {} vnet.xeth{}.link'.format(platina_redis_channel, ele))
-		
+        for ele in module.params['f_ports']:
+            try:
+                eth_list.remove(str(ele))
+            except:
+                pass
+
+        if not is_subports:
+            ports = ['xeth{}'.format(eth) for eth in eth_list]
+        else:
+            if not is_lane2_count2:
+                subports = ['1', '2', '3', '4']
+            else:
+                subports = ['1', '2']
+
+            ports = ['xeth{}-{}'.format(eth, port)
+                     for eth in eth_list for port in subports]
+
+        execute_commands(module, 'goes hgetall {}'.format(platina_redis_channel))
+
+        for port in ports:
+            execute_commands(module, 'ethtool {}'.format(port))
+
+        if any(ele % 2 != 0 for ele in module.params['f_ports']):
+            execute_commands(module, 'goes hget platina-mk1 qsfp.compliance')
 
         for key, value in HASH_DICT.iteritems():
             cmds_list.append(key)
@@ -499,22 +361,12 @@ def main():
 	    # Calculate the entire test result
 	    HASH_DICT['result.status'] = 'Passed' if RESULT_STATUS else 'Failed'
 
-	    # Create a log file
-	    log_file_path = module.params['log_dir_path']
-	    log_file_path += '/{}.log'.format(module.params['hash_name'])
-	    log_file = open(log_file_path, 'a')
-	    for key, value in HASH_DICT.iteritems():
-		log_file.write(key)
-		log_file.write('\n')
-		log_file.write(str(value))
-		log_file.write('\n')
-		log_file.write('\n')
-
-	    log_file.close()
+	    # Close the log file, appending the test result
+	    log_file_path = HASH_DICT.close()
 
 	    # Exit the module and return the required JSON.
 	    module.exit_json(
-		hash_dict=HASH_DICT,
+		hash_dict=HASH_DICT.summary(),
 		log_file_path=log_file_path
 	    )
 
@@ -18,11 +18,13 @@
 # along with Ansible. If not, see <http://www.gnu.org/licenses/>.
 #
 
-import shlex
-
-from collections import OrderedDict
-
 from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.regtest_executor import CommandExecutor
+from ansible.module_utils.regtest_log import StreamingLog
+from ansible.module_utils.regtest_ports import get_port_table
+from ansible.module_utils.regtest_traffic import (
+    TrafficRunner, TrafficSession, apply_speed_threshold, iperf_client_cmd,
+    record_traffic, traffic_failures)
 
 DOCUMENTATION = """
 ---
@@ -48,6 +50,30 @@ options:
       required: False
       type: str
       default: ''
+    max_sessions:
+      description:
+        - Maximum number of iperf clients to run at the same time.
+      required: False
+      type: int
+      default: 8
+    stop_on_failure:
+      description:
+        - Flag to indicate if remaining iperf clients are skipped once one fails.
+      required: False
+      type: bool
+      default: False
+    min_speed_fraction:
+      description:
+        - Minimum iperf bandwidth as a fraction of the provisioned port speed, 0 to disable.
+      required: False
+      type: float
+      default: 0
+    platina_redis_channel:
+      description:
+        - Name of the platina redis channel.
+      required: False
+      type: str
+      default: 'platina-mk1'
     hash_name:
       description:
         - Name of the hash in which to store the result in redis.
@@ -76,49 +102,15 @@ hash_dict:
 """
 
 RESULT_STATUS = True
-HASH_DICT = OrderedDict()
-
-
-def run_cli(module, cli):
-    """
-    Method to execute the cli command on the target node(s) and
-    returns the output.
-    :param module: The Ansible module to fetch input parameters.
-    :param cli: The complete cli string to be executed on the target node(s).
-    :return: Output/Error or None depending upon the response from cli.
-    """
-    cli = shlex.split(cli)
-    rc, out, err = module.run_command(cli)
-
-    if out:
-        return out.rstrip()
-    elif err:
-        return err.rstrip()
-    else:
-        return None
-
-
-def execute_commands(module, cmd):
-    """
-    Method to execute given commands and return the output.
-    :param module: The Ansible module to fetch input parameters.
-    :param cmd: Command to execute.
-    :return: Output of the commands.
-    """
-    global HASH_DICT
-
-    if ('service' in cmd and 'restart' in cmd) or module.params['dry_run_mode']:
-        out = None
-    else:
-        out = run_cli(module, cmd)
+HASH_DICT = StreamingLog()
 
-    # Store command prefixed with exec time as key and
-    # command output as value in the hash dictionary
-    exec_time = run_cli(module, 'date +%Y%m%d%T')
-    key = '{0} {1} {2}'.format(module.params['switch_name'], exec_time, cmd)
-    HASH_DICT[key] = out
 
-    return out
+EXECUTOR = CommandExecutor(
+    HASH_DICT,
+    skip=lambda module, cmd: (('service' in cmd and 'restart' in cmd) or
+                              module.params['dry_run_mode']))
+run_cli = EXECUTOR.run_cli
+execute_commands = EXECUTOR.execute_commands
 
 
 def verify_traffic(module):
@@ -134,6 +126,7 @@ def verify_traffic(module):
     is_subports = False
     is_lane2_count2 = False
     eth_list = []
+    sessions = []
 
     for speed in speed_list:
         if speed == '100g':
@@ -158,30 +151,33 @@ def verify_traffic(module):
         else:
             subport = '1'
 
-        for eth in eth_list:
-            ind = eth_list.index(eth)
+        for ind, eth in enumerate(eth_list):
             last_octet = eth_ips_last_octet[ind]
             if is_subports:
                 for port in subport:
-                    cmd = 'iperf -c 10.{}.{}.{} -t 2 -P 1'.format(eth, port, last_octet)
-                    traffic_out = execute_commands(module, cmd)
-
-                    if ('Transfer' not in traffic_out and 'Bandwidth' not in traffic_out and
-                            'Bytes' not in traffic_out and 'bits/sec' not in traffic_out):
-                        RESULT_STATUS = False
-                        failure_summary += 'On switch {} '.format(switch_name)
-                        failure_summary += 'iperf traffic cannot be verified for '
-                        failure_summary += 'xeth{}-{} using command {}\n'.format(eth, port, cmd)
+                    sessions.append(TrafficSession(
+                        'xeth{}-{}'.format(eth, port),
+                        iperf_client_cmd('10.{}.{}.{}'.format(eth, port, last_octet))))
             else:
-                cmd = 'iperf -c 10.0.{}.{} -t 2 -P 1'.format(eth, last_octet)
-                traffic_out = execute_commands(module, cmd)
-
-                if ('Transfer' not in traffic_out and 'Bandwidth' not in traffic_out and
-                        'Bytes' not in traffic_out and 'bits/sec' not in traffic_out):
-                    RESULT_STATUS = False
-                    failure_summary += 'On switch {} '.format(switch_name)
-                    failure_summary += 'iperf traffic cannot be verified for '
-                    failure_summary += 'xeth{} using command {}\n'.format(eth, cmd)
+                sessions.append(TrafficSession(
+                    'xeth{}'.format(eth),
+                    iperf_client_cmd('10.0.{}.{}'.format(eth, last_octet))))
+
+    if module.params['min_speed_fraction']:
+        port_table = get_port_table(module, execute_commands,
+                                    module.params['platina_redis_channel'])
+        apply_speed_threshold(sessions, port_table,
+                              module.params['min_speed_fraction'])
+
+    # Run all iperf clients at once, loading every link together
+    runner = TrafficRunner(EXECUTOR, module.params['max_sessions'],
+                           module.params['stop_on_failure'])
+    runner.run(module, sessions)
+    record_traffic(HASH_DICT, switch_name, sessions)
+
+    failure_summary += traffic_failures(switch_name, sessions)
+    if failure_summary:
+        RESULT_STATUS = False
 
     HASH_DICT['result.detail'] = failure_summary
 
@@ -197,12 +193,23 @@ def main():
             eth_ips_last_octet=dict(required=False, type='str', default=''),
             dry_run_mode=dict(required=False, type='bool', default=False),
             speed=dict(required=False, type='str'),
+            max_sessions=dict(required=False, type='int', default=8),
+            stop_on_failure=dict(required=False, type='bool', default=False),
+            min_speed_fraction=dict(required=False, type='float', default=0),
+            platina_redis_channel=dict(required=False, type='str',
+                                       default='platina-mk1'),
             hash_name=dict(required=False, type='str'),
             log_dir_path=dict(required=False, type='str')
         )
     )
 
     global HASH_DICT, RESULT_STATUS
+
+    # Stream executed commands to the log file as they run
+    if not module.params['dry_run_mode']:
+        log_file_path = module.params['log_dir_path']
+        log_file_path += '/{}.log'.format(module.params['hash_name'])
+        HASH_DICT.open(log_file_path, 'a')
     if module.params['dry_run_mode']:
 	    cmds_list = []
 	    switch_name = module.params['switch_name']
@@ -257,22 +264,12 @@ def main():
 	    # Calculate the entire test result
 	    HASH_DICT['result.status'] = 'Passed' if RESULT_STATUS else 'Failed'
 
-	    # Create a log file
-	    log_file_path = module.params['log_dir_path']
-	    log_file_path += '/{}.log'.format(module.params['hash_name'])
-	    log_file = open(log_file_path, 'a')
-	    for key, value in HASH_DICT.iteritems():
-		log_file.write(key)
-		log_file.write('\n')
-		log_file.write(str(value))
-		log_file.write('\n')
-		log_file.write('\n')
-
-	    log_file.close()
+	    # Close the log file, appending the test result
+	    log_file_path = HASH_DICT.close()
 
 	    # Exit the module and return the required JSON.
 	    module.exit_json(
-		hash_dict=HASH_DICT,
+		hash_dict=HASH_DICT.summary(),
 		log_file_path=log_file_path
 	    )
 
@@ -18,11 +18,10 @@
 # along with Ansible.  If not, see <http://www.gnu.org/licenses/>.
 #
 
-import shlex
-
 from collections import OrderedDict
 
 from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.regtest_executor import CommandExecutor, get_exec_time
 
 DOCUMENTATION = """
 ---
@@ -97,23 +96,7 @@ def get_cli(module):
     return cli
 
 
-def run_cli(module, cli):
-    """
-    Method to execute the cli command on the target node(s) and
-    returns the output.
-    :param module: The Ansible module to fetch input parameters.
-    :param cli: The complete cli string to be executed on the target node(s).
-    :return: Output/Error or None depending upon the response from cli.
-    """
-    cli = shlex.split(cli)
-    rc, out, err = module.run_command(cli)
-
-    if out:
-        return out.rstrip()
-    elif err:
-        return err.rstrip()
-    else:
-        return None
+run_cli = CommandExecutor().run_cli
 
 
 def execute_and_verify(module, operation, param, set_value):
@@ -139,7 +122,7 @@ def execute_and_verify(module, operation, param, set_value):
 
     # Store command prefixed with exec time as key and
     # command output as value in the hash dictionary
-    exec_time = run_cli(module, 'date +%Y%m%d%T')
+    exec_time = get_exec_time()
     key = '{0} {1} {2}'.format(switch_name, exec_time, cmd)
     HASH_DICT[key] = out
 
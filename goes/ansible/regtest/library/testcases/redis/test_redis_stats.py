@@ -18,11 +18,14 @@
 # along with Ansible. If not, see <http://www.gnu.org/licenses/>.
 #
 
-import shlex
-
-from collections import OrderedDict
-
 from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.regtest_counters import take_counter_snapshot
+from ansible.module_utils.regtest_executor import CommandExecutor
+from ansible.module_utils.regtest_log import StreamingLog
+from ansible.module_utils.regtest_ports import get_port_table
+from ansible.module_utils.regtest_traffic import (
+    TrafficRunner, TrafficSession, apply_speed_threshold, iperf_client_cmd,
+    record_traffic, traffic_failures)
 
 DOCUMENTATION = """
 ---
@@ -49,6 +52,30 @@ options:
       required: False
       type: str
       default: ''
+    max_sessions:
+      description:
+        - Maximum number of iperf clients to run at the same time.
+      required: False
+      type: int
+      default: 8
+    min_speed_fraction:
+      description:
+        - Minimum iperf bandwidth as a fraction of the provisioned port speed, 0 to disable.
+      required: False
+      type: float
+      default: 0
+    counter_tolerance:
+      description:
+        - Packets a redis counter may differ from the kernel counters read around it.
+      required: False
+      type: int
+      default: 0
+    platina_redis_channel:
+      description:
+        - Name of the platina redis channel.
+      required: False
+      type: str
+      default: 'platina-mk1'
     hash_name:
       description:
         - Name of the hash in which to store the result in redis.
@@ -77,71 +104,38 @@ hash_dict:
 """
 
 RESULT_STATUS = True
-HASH_DICT = OrderedDict()
-
-
-def run_cli(module, cli):
-    """
-    Method to execute the cli command on the target node(s) and
-    returns the output.
-    :param module: The Ansible module to fetch input parameters.
-    :param cli: The complete cli string to be executed on the target node(s).
-    :return: Output/Error or None depending upon the response from cli.
-    """
-    cli = shlex.split(cli)
-    rc, out, err = module.run_command(cli)
-
-    if out:
-        return out.rstrip()
-    elif err:
-        return err.rstrip()
-    else:
-        return None
-
-
-def execute_commands(module, cmd):
-    """
-    Method to execute given commands and return the output.
-    :param module: The Ansible module to fetch input parameters.
-    :param cmd: Command to execute.
-    :return: Output of the commands.
-    """
-    global HASH_DICT
-
-    out = run_cli(module, cmd)
+HASH_DICT = StreamingLog()
 
-    # Store command prefixed with exec time as key and
-    # command output as value in the hash dictionary
-    exec_time = run_cli(module, 'date +%Y%m%d%T')
-    key = '{0} {1} {2}'.format(module.params['switch_name'], exec_time, cmd)
-    HASH_DICT[key] = out
 
-    return out
+EXECUTOR = CommandExecutor(HASH_DICT)
+run_cli = EXECUTOR.run_cli
+execute_commands = EXECUTOR.execute_commands
 
 
-def test_traffic(module, eth, third_octet, port):
+def test_traffic(module, sessions):
     """
-    Method to test iperf traffic at client.
+    Method to test iperf traffic at client, all sessions at once.
     :param module: The Ansible module to fetch input parameters.
-    :param eth: Interface number.
-    :param third_octet: Third octet of iperf client ip address.
-    :param port: Port number on which iperf server is running.
+    :param sessions: List of TrafficSession, one per interface.
     :return: Failure summary if any.
     """
-    global RESULT_STATUS
+    global RESULT_STATUS, HASH_DICT
     failure_summary = ''
     switch_name = module.params['switch_name']
 
-    cmd = 'iperf -c 10.0.{}.{} -t 2 -p {} -P 1'.format(
-        eth, third_octet, port)
-    traffic_out = execute_commands(module, cmd)
+    if module.params['min_speed_fraction']:
+        port_table = get_port_table(module, execute_commands,
+                                    module.params['platina_redis_channel'])
+        apply_speed_threshold(sessions, port_table,
+                              module.params['min_speed_fraction'])
+
+    runner = TrafficRunner(EXECUTOR, module.params['max_sessions'])
+    runner.run(module, sessions)
+    record_traffic(HASH_DICT, switch_name, sessions)
 
-    if ('Transfer' not in traffic_out and 'Bandwidth' not in traffic_out and
-            'Bytes' not in traffic_out and 'bits/sec' not in traffic_out):
+    failure_summary += traffic_failures(switch_name, sessions)
+    if failure_summary:
         RESULT_STATUS = False
-        failure_summary += 'On switch {} '.format(switch_name)
-        failure_summary += 'iperf traffic cannot be verified for '
-        failure_summary += 'xeth{} using command {}\n'.format(eth, cmd)
 
     return failure_summary
 
@@ -163,66 +157,37 @@ def verify_redis_stats(module):
     spine0_third_octet = spine0_eth1_ip.split('.')[3]
     spine1_third_octet = spine1_eth1_ip.split('.')[3]
 
-    port = 5000
-    for eth in spine0_eth_list:
-        port += 1
-        failure_summary += test_traffic(module, eth, spine0_third_octet, port)
-
-    port = 5000
-    for eth in spine1_eth_list:
-        port += 1
-        failure_summary += test_traffic(module, eth, spine1_third_octet, port)
-
-    # Get RX & TX packets stats from redis & compare it with front panel stats
-    for eth in spine0_eth_list + spine1_eth_list:
-        redis_rx_count, redis_tx_count = 0, 0
-        front_rx_count, front_tx_count = 0, 0
-
-        cmd = 'goes vnet show ha xeth{}'.format(eth)
-        ha_out = execute_commands(module, cmd)
-
-        if ha_out:
-            ha_out = ha_out.lower()
-            for line in ha_out:
-                line = line.strip()
-                if 'port rx packets' in line:
-                    line = line.split('port rx packets')
-                    redis_rx_count = line[1].strip()
-                    redis_rx_count = int(redis_rx_count)
-
-                if 'port tx packets' in line:
-                    line = line.split('port tx packets')
-                    redis_tx_count = line[1].strip()
-                    redis_tx_count = int(redis_tx_count)
-
-            config_out = execute_commands(module, 'ifconfig xeth{}'.format(
-                eth))
-
-            if config_out:
-                config_out = config_out.lower()
-                for line in config_out:
-                    line = line.strip()
-                    if 'rx packets' in line:
-                        details = line.split('rx packets:')[1]
-                        front_rx_count = details.split()[0]
-                        front_rx_count = int(front_rx_count)
-
-                    if 'tx packets' in line:
-                        details = line.split('tx packets:')[1]
-                        front_tx_count = details.split()[0]
-                        front_tx_count = int(front_tx_count)
-
-            if (redis_rx_count != front_rx_count or
-                    redis_tx_count != front_tx_count):
-                RESULT_STATUS = False
-                failure_summary += 'On switch {} '.format(switch_name)
-                failure_summary += 'rx/tx packets counts on front panel stats '
-                failure_summary += 'are not matching with redis stats\n'
-        else:
-            RESULT_STATUS = False
-            failure_summary += 'On switch {} '.format(switch_name)
-            failure_summary += 'rx and tx packets count cannot be verified '
-            failure_summary += 'since output of command {} is None'.format(cmd)
+    # Each iperf server listens on its own port, 5001 onwards per spine
+    sessions = []
+    for eth_list, third_octet in ((spine0_eth_list, spine0_third_octet),
+                                  (spine1_eth_list, spine1_third_octet)):
+        for port, eth in enumerate(eth_list, 5001):
+            sessions.append(TrafficSession(
+                'xeth{}'.format(eth),
+                iperf_client_cmd('10.0.{}.{}'.format(eth, third_octet),
+                                 port=port)))
+
+    failure_summary += test_traffic(module, sessions)
+
+    # Get RX & TX packets stats of all ports from redis and the kernel in
+    # one pass & compare them
+    ports = ['xeth{}'.format(eth) for eth in spine0_eth_list + spine1_eth_list]
+    snapshot = take_counter_snapshot(module, execute_commands)
+
+    for port in snapshot.missing(ports):
+        RESULT_STATUS = False
+        failure_summary += 'On switch {} '.format(switch_name)
+        failure_summary += 'rx and tx packets count cannot be verified '
+        failure_summary += 'since {} counters could not be read\n'.format(port)
+
+    for mismatch in snapshot.compare(ports, module.params['counter_tolerance']):
+        RESULT_STATUS = False
+        failure_summary += 'On switch {} '.format(switch_name)
+        failure_summary += '{} {} count {} in redis stats '.format(
+            mismatch.port, mismatch.counter, mismatch.vnet)
+        failure_summary += 'is not matching with front panel stats '
+        failure_summary += '{}-{}\n'.format(mismatch.kernel_low,
+                                            mismatch.kernel_high)
 
     HASH_DICT['result.detail'] = failure_summary
 
@@ -237,6 +202,11 @@ def main():
             switch_name=dict(required=False, type='str'),
             spine0_eth1_ip=dict(required=False, type='str', default=''),
             spine1_eth1_ip=dict(required=False, type='str', default=''),
+            max_sessions=dict(required=False, type='int', default=8),
+            min_speed_fraction=dict(required=False, type='float', default=0),
+            counter_tolerance=dict(required=False, type='int', default=0),
+            platina_redis_channel=dict(required=False, type='str',
+                                       default='platina-mk1'),
             hash_name=dict(required=False, type='str'),
             log_dir_path=dict(required=False, type='str'),
         )
@@ -244,27 +214,22 @@ def main():
 
     global HASH_DICT, RESULT_STATUS
 
+    # Stream executed commands to the log file as they run
+    log_file_path = module.params['log_dir_path']
+    log_file_path += '/{}.log'.format(module.params['hash_name'])
+    HASH_DICT.open(log_file_path, 'a')
+
     verify_redis_stats(module)
 
     # Calculate the entire test result
     HASH_DICT['result.status'] = 'Passed' if RESULT_STATUS else 'Failed'
 
-    # Create a log file
-    log_file_path = module.params['log_dir_path']
-    log_file_path += '/{}.log'.format(module.params['hash_name'])
-    log_file = open(log_file_path, 'a')
-    for key, value in HASH_DICT.iteritems():
-        log_file.write(key)
-        log_file.write('\n')
-        log_file.write(str(value))
-        log_file.write('\n')
-        log_file.write('\n')
-
-    log_file.close()
+    # Close the log file, appending the test result
+    log_file_path = HASH_DICT.close()
 
     # Exit the module and return the required JSON.
     module.exit_json(
-        hash_dict=HASH_DICT,
+        hash_dict=HASH_DICT.summary(),
         log_file_path=log_file_path
     )
 
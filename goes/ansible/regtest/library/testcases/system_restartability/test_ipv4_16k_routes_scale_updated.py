@@ -18,15 +18,12 @@
 # along with Ansible. If not, see <http://www.gnu.org/licenses/>.
 #
 
-import mmap
-
 import time
 
-import shlex
-
-from collections import OrderedDict
-
 from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.regtest_executor import CommandExecutor
+from ansible.module_utils.regtest_log import StreamingLog
+from ansible.module_utils.regtest_routes import RouteTable, scale_routes
 
 DOCUMENTATION = """
 ---
@@ -87,46 +84,12 @@ hash_dict:
 """
 
 RESULT_STATUS = True
-HASH_DICT = OrderedDict()
-
-
-def run_cli(module, cli):
-    """
-    Method to execute the cli command on the target node(s) and
-    returns the output.
-    :param module: The Ansible module to fetch input parameters.
-    :param cli: The complete cli string to be executed on the target node(s).
-    :return: Output/Error or None depending upon the response from cli.
-    """
-    cli = shlex.split(cli)
-    rc, out, err = module.run_command(cli)
-
-    if out:
-        return out.rstrip()
-    elif err:
-        return err.rstrip()
-    else:
-        return None
-
-
-def execute_commands(module, cmd):
-    """
-    Method to execute given commands and return the output.
-    :param module: The Ansible module to fetch input parameters.
-    :param cmd: Command to execute.
-    :return: Output of the commands.
-    """
-    global HASH_DICT
+HASH_DICT = StreamingLog()
 
-    out = run_cli(module, cmd)
 
-    # Store command prefixed with exec time as key and
-    # command output as value in the hash dictionary
-    exec_time = run_cli(module, 'date +%Y%m%d%T')
-    key = '{0} {1} {2}'.format(module.params['switch_name'], exec_time, cmd)
-    HASH_DICT[key] = out
-
-    return out
+EXECUTOR = CommandExecutor(HASH_DICT)
+run_cli = EXECUTOR.run_cli
+execute_commands = EXECUTOR.execute_commands
 
 
 def verify_ipv4_routes_scale(module):
@@ -140,7 +103,6 @@ def verify_ipv4_routes_scale(module):
     leaf_list = module.params['leaf_list']
     package_name = module.params['package_name']
     failure_summary = ''
-    total_routes, routes_count = 0, 0
 
     is_spine = True if switch_name in spine_list else False
 
@@ -166,33 +128,26 @@ def verify_ipv4_routes_scale(module):
         failure_summary += 'On switch {} '.format(switch_name)
         failure_summary += 'GOES status is NOT OK\n'
     else:
-        linux_routes = open('/var/log/linux_routes.txt')
-        frr_routes = open('/var/log/{}_routes.txt'.format(package_name))
-        lrs = mmap.mmap(linux_routes.fileno(), 0, access=mmap.ACCESS_READ)
-        frs = mmap.mmap(frr_routes.fileno(), 0, access=mmap.ACCESS_READ)
-
-        for i in range(1, 100):
-            if total_routes < 16000:
-                for j in range(1, 256):
-                    if total_routes < 16000 and routes_count < 1000:
-                        route = '{}.{}.{}.{}'.format(octet, octet, i, j)
-                        if lrs.find(route) != -1 or frs.find(route) != -1:
-                            pass
-                        else:
-                            RESULT_STATUS = False
-                            failure_summary += 'On switch {} '.format(switch_name)
-                            failure_summary += '{} route is not present\n'.format(route)
-
-                        routes_count += 1
-                        total_routes += 1
-                    else:
-                        routes_count = 0
-                        break
-            else:
-                break
-
-        linux_routes.close()
-        frr_routes.close()
+        routes = RouteTable.from_files(
+            '/var/log/linux_routes.txt',
+            '/var/log/{}_routes.txt'.format(package_name))
+        scope = '{0}.{0}.0.0/16'.format(octet)
+        missing, extra = routes.diff(scale_routes(octet), scope=scope)
+
+        for route in missing:
+            failure_summary += 'On switch {} '.format(switch_name)
+            failure_summary += '{} route is not present\n'.format(route)
+
+        for route in extra:
+            failure_summary += 'On switch {} '.format(switch_name)
+            failure_summary += 'unexpected route {} is present\n'.format(route)
+
+        if missing or extra:
+            RESULT_STATUS = False
+
+        HASH_DICT['result.routes.present'] = len(routes.within(scope))
+        HASH_DICT['result.routes.missing'] = len(missing)
+        HASH_DICT['result.routes.extra'] = len(extra)
 
         cmd = 'wc -l /var/log/arp_entries.txt'
     
@@ -220,27 +175,22 @@ def main():
 
     global HASH_DICT, RESULT_STATUS
 
+    # Stream executed commands to the log file as they run
+    log_file_path = module.params['log_dir_path']
+    log_file_path += '/{}.log'.format(module.params['hash_name'])
+    HASH_DICT.open(log_file_path, 'a')
+
     verify_ipv4_routes_scale(module)
 
     # Calculate the entire test result
     HASH_DICT['result.status'] = 'Passed' if RESULT_STATUS else 'Failed'
 
-    # Create a log file
-    log_file_path = module.params['log_dir_path']
-    log_file_path += '/{}.log'.format(module.params['hash_name'])
-    log_file = open(log_file_path, 'a')
-    for key, value in HASH_DICT.iteritems():
-        log_file.write(key)
-        log_file.write('\n')
-        log_file.write(str(value))
-        log_file.write('\n')
-        log_file.write('\n')
-
-    log_file.close()
+    # Close the log file, appending the test result
+    log_file_path = HASH_DICT.close()
 
     # Exit the module and return the required JSON.
     module.exit_json(
-        hash_dict=HASH_DICT,
+        hash_dict=HASH_DICT.summary(),
         log_file_path=log_file_path
     )
 
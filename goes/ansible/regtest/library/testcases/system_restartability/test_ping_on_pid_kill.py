@@ -18,13 +18,10 @@
 # along with Ansible. If not, see <http://www.gnu.org/licenses/>.
 #
 
-import shlex
-
-import time
-
-from collections import OrderedDict
-
 from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.regtest_executor import CommandExecutor
+from ansible.module_utils.regtest_log import StreamingLog
+from ansible.module_utils.regtest_wait import wait_until
 
 DOCUMENTATION = """
 ---
@@ -91,49 +88,16 @@ hash_dict:
 """
 
 RESULT_STATUS = True
-HASH_DICT = OrderedDict()
-
-
-def run_cli(module, cli):
-    """
-    Method to execute the cli command on the target node(s) and
-    returns the output.
-    :param module: The Ansible module to fetch input parameters.
-    :param cli: The complete cli string to be executed on the target node(s).
-    :return: Output/Error or None depending upon the response from cli.
-    """
-    cli = shlex.split(cli)
-    rc, out, err = module.run_command(cli)
-
-    if out:
-        return out.rstrip()
-    elif err:
-        return err.rstrip()
-    else:
-        return None
-
-
-def execute_commands(module, cmd):
-    """
-    Method to execute given commands and return the output.
-    :param module: The Ansible module to fetch input parameters.
-    :param cmd: Command to execute.
-    :return: Output of the commands.
-    """
-    global HASH_DICT
+HASH_DICT = StreamingLog()
 
-    if 'dummy' in cmd or 'restart' in cmd or module.params['dry_run_mode']:
-        out = None
-    else:
-        out = run_cli(module, cmd)
 
-    # Store command prefixed with exec time as key and
-    # command output as value in the hash dictionary
-    exec_time = run_cli(module, 'date +%Y%m%d%T')
-    key = '{0} {1} {2}'.format(module.params['switch_name'], exec_time, cmd)
-    HASH_DICT[key] = out
+EXECUTOR = CommandExecutor(
+    HASH_DICT,
+    skip=lambda module, cmd: ('dummy' in cmd or 'restart' in cmd or
+                              module.params['dry_run_mode']))
+run_cli = EXECUTOR.run_cli
+execute_commands = EXECUTOR.execute_commands
 
-    return out
 
 def verify_bgp_loopback(module):
     global RESULT_STATUS, HASH_DICT
@@ -250,29 +214,26 @@ def verify_ping_on_pid_kill(module):
     pid = execute_commands(module, 'pidof vnet-platina-mk1')
     execute_commands(module, 'kill -9 {}'.format(pid))
 
-    # Wait for 10 seconds for the pid to come up
-    time.sleep(25)
-
-    # get pid of vnet
-    execute_commands(module, 'pidof vnet-platina-mk1')
+    # Wait (25 secs max) for the pid to come up
+    wait_until(lambda: execute_commands(module, 'pidof vnet-platina-mk1'), 25,
+               hash_dict=HASH_DICT,
+               key='{}.vnet.restart.time'.format(switch_name))
 
-    # Get all bgp routes
-    retry = retries - 1
+    # Get all bgp routes, polling with backoff. Route and ping changes are
+    # not published by goes, so there is no redis event to wake up on
     found_list = [False, False]
-    while (retry):
+
+    def converged():
         if not found_list[0]:
-            if verify_bgp_loopback(module)[0]:
-                found_list[0] = True
+            found_list[0] = verify_bgp_loopback(module)[0]
 
         if not found_list[1]:
-            if verify_ping(module)[0]:
-                found_list[1] = True
+            found_list[1] = verify_ping(module)[0]
+
+        return all(found_list)
 
-        if all(found_list):
-            break
-        else:
-            time.sleep(delay)
-            retry -= 1
+    wait_until(converged, delay * (retries - 1), hash_dict=HASH_DICT,
+               key='{}.convergence.time'.format(switch_name))
 
     # Restart Goes and get the GOES status info
     execute_commands(module, 'goes restart')
@@ -309,6 +270,12 @@ def main():
     )
 
     global HASH_DICT, RESULT_STATUS
+
+    # Stream executed commands to the log file as they run
+    if not module.params['dry_run_mode']:
+        log_file_path = module.params['log_dir_path']
+        log_file_path += '/{}.log'.format(module.params['hash_name'])
+        HASH_DICT.open(log_file_path, 'a')
     if module.params['dry_run_mode']:
         package_name = module.params['package_name']
         cmds_list = []
@@ -333,7 +300,6 @@ def main():
         execute_commands(module, 'goes status')
         pid = execute_commands(module, 'pidof vnet-platina-mk1')
         execute_commands(module, 'kill -9 {}'.format(pid))
-        time.sleep(10)
         execute_commands(module, 'pidof vnet-platina-mk1')
         execute_commands(module, 'goes status')
         for key, value in HASH_DICT.iteritems():
@@ -349,22 +315,12 @@ def main():
         # Calculate the entire test result
         HASH_DICT['result.status'] = 'Passed' if RESULT_STATUS else 'Failed'
 
-        # Create a log file
-        log_file_path = module.params['log_dir_path']
-        log_file_path += '/{}.log'.format(module.params['hash_name'])
-        log_file = open(log_file_path, 'a')
-        for key, value in HASH_DICT.iteritems():
-            log_file.write(key)
-            log_file.write('\n')
-            log_file.write(str(value))
-            log_file.write('\n')
-            log_file.write('\n')
-
-        log_file.close()
+        # Close the log file, appending the test result
+        log_file_path = HASH_DICT.close()
 
         # Exit the module and return the required JSON.
         module.exit_json(
-            hash_dict=HASH_DICT,
+            hash_dict=HASH_DICT.summary(),
             log_file_path=log_file_path
         )
 
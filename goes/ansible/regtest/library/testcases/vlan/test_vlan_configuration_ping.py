@@ -18,12 +18,12 @@
 # along with Ansible. If not, see <http://www.gnu.org/licenses/>.
 #
 
-import shlex
 import time
 
-from collections import OrderedDict
-
 from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.regtest_executor import CommandExecutor
+from ansible.module_utils.regtest_log import StreamingLog
+from ansible.module_utils.regtest_ping import PingSweep, PingTarget, ping_cmd
 
 DOCUMENTATION = """
 ---
@@ -121,46 +121,12 @@ hash_dict:
 """
 
 RESULT_STATUS = True
-HASH_DICT = OrderedDict()
-
-
-def run_cli(module, cli):
-    """
-    Method to execute the cli command on the target node(s) and
-    returns the output.
-    :param module: The Ansible module to fetch input parameters.
-    :param cli: The complete cli string to be executed on the target node(s).
-    :return: Output/Error or None depending upon the response from cli.
-    """
-    cli = shlex.split(cli)
-    rc, out, err = module.run_command(cli)
-
-    if out:
-        return out.rstrip()
-    elif err:
-        return err.rstrip()
-    else:
-        return None
-
-
-def execute_commands(module, cmd):
-    """
-    Method to execute given commands and return the output.
-    :param module: The Ansible module to fetch input parameters.
-    :param cmd: Command to execute.
-    :return: Output of the commands.
-    """
-    global HASH_DICT
+HASH_DICT = StreamingLog()
 
-    out = run_cli(module, cmd)
 
-    # Store command prefixed with exec time as key and
-    # command output as value in the hash dictionary
-    exec_time = run_cli(module, 'date +%Y%m%d%T')
-    key = '{0} {1} {2}'.format(module.params['switch_name'], exec_time, cmd)
-    HASH_DICT[key] = out
-
-    return out
+EXECUTOR = CommandExecutor(HASH_DICT)
+run_cli = EXECUTOR.run_cli
+execute_commands = EXECUTOR.execute_commands
 
 
 def get_cli(module):
@@ -208,13 +174,16 @@ def verify_vlan_configurations(module):
         if is_ping_switch:
             time.sleep(5)
             if not arping:
-                # Initiate ping for tagged packets
+                # Initiate ping for tagged packets, on all vlans at once
+                targets = []
                 for switch in switch_list:
                     if switch != ping_switch:
                         last_octet = switch[-2::]
                         for eth in eth_list:
-                            cmd = get_cli(module) + "ping -c 5 192.168.{}.{}".format(eth, last_octet)
-                            execute_commands(module, cmd)
+                            ip = '192.168.{}.{}'.format(eth, last_octet)
+                            targets.append(PingTarget(ip, ping_cmd(
+                                ip, count=5, prefix=get_cli(module))))
+                PingSweep(EXECUTOR).sweep(module, targets)
             else:
                 # Initiate arping for tagged packets
                 for i in range(len(eth_list)):
@@ -282,14 +251,17 @@ def verify_vlan_configurations(module):
         if is_ping_switch:
             # Initiate ping for untagged packets
             if not arping:
+                targets = []
                 for switch in switch_list:
                     if switch != ping_switch:
                         last_octet = switch[-2::]
                         for i in range(len(eth_list)):
-                            cmd = "ping -c 10 -I 172.16.{}.{} 172.16.{}.{}".format(eth_ping_switch[i],
-                                                                                   ping_switch[-2::],
-                                                                                   eth_list[i], last_octet)
-                            execute_commands(module, cmd)
+                            source = '172.16.{}.{}'.format(eth_ping_switch[i],
+                                                           ping_switch[-2::])
+                            ip = '172.16.{}.{}'.format(eth_list[i], last_octet)
+                            targets.append(PingTarget(ip, ping_cmd(
+                                ip, count=10, source=source)))
+                PingSweep(EXECUTOR).sweep(module, targets)
             else:
                 for i in range(len(eth_list)):
                     cmd = "arping -c 5 -I xeth{} 10.0.{}.{}".format(eth_list[i], eth_list[i], eth_ip[i])
@@ -357,27 +329,22 @@ def main():
 
     global HASH_DICT, RESULT_STATUS
 
+    # Stream executed commands to the log file as they run
+    log_file_path = module.params['log_dir_path']
+    log_file_path += '/{}.log'.format(module.params['hash_name'])
+    HASH_DICT.open(log_file_path, 'a')
+
     verify_vlan_configurations(module)
 
     # Calculate the entire test result
     HASH_DICT['result.status'] = 'Passed' if RESULT_STATUS else 'Failed'
 
-    # Create a log file
-    log_file_path = module.params['log_dir_path']
-    log_file_path += '/{}.log'.format(module.params['hash_name'])
-    log_file = open(log_file_path, 'a')
-    for key, value in HASH_DICT.iteritems():
-        log_file.write(key)
-        log_file.write('\n')
-        log_file.write(str(value))
-        log_file.write('\n')
-        log_file.write('\n')
-
-    log_file.close()
+    # Close the log file, appending the test result
+    log_file_path = HASH_DICT.close()
 
     # Exit the module and return the required JSON.
     module.exit_json(
-        hash_dict=HASH_DICT,
+        hash_dict=HASH_DICT.summary(),
         log_file_path=log_file_path
     )
 
@@ -0,0 +1,165 @@
+""" Bulk snapshot and comparison of vnet and kernel interface counters """
+
+#
+# This file is part of Ansible
+#
+# Ansible is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Ansible is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Ansible. If not, see <http://www.gnu.org/licenses/>.
+#
+
+from collections import OrderedDict, namedtuple
+
+from ansible.module_utils.regtest_vnet import (HW_INTERFACES_CMD,
+                                               parse_hw_interfaces)
+
+PROC_NET_DEV = '/proc/net/dev'
+
+# Separates the outputs of the snapshot command
+SNAPSHOT_SEPARATOR = '--- counter snapshot ---'
+
+# Column names of /proc/net/dev, receive then transmit
+_PROC_NET_DEV_FIELDS = (
+    'rx_bytes', 'rx_packets', 'rx_errors', 'rx_dropped', 'rx_fifo',
+    'rx_frame', 'rx_compressed', 'rx_multicast',
+    'tx_bytes', 'tx_packets', 'tx_errors', 'tx_dropped', 'tx_fifo',
+    'tx_colls', 'tx_carrier', 'tx_compressed')
+
+# Kernel counter to the matching vnet hardware interface counter
+COUNTER_MAP = OrderedDict([
+    ('rx_packets', 'port rx packets'),
+    ('tx_packets', 'port tx packets'),
+])
+
+CounterMismatch = namedtuple('CounterMismatch',
+                             'port counter vnet kernel_low kernel_high')
+
+
+def parse_proc_net_dev(out):
+    """
+    Method to parse the contents of /proc/net/dev.
+    :param out: Contents of /proc/net/dev.
+    :return: OrderedDict of interface name to dict of counter to int.
+    """
+    counters = OrderedDict()
+
+    for line in (out or '').splitlines():
+        name, sep, values = line.partition(':')
+        values = values.split()
+        if not sep or len(values) != len(_PROC_NET_DEV_FIELDS):
+            continue
+        try:
+            counters[name.strip()] = dict(
+                zip(_PROC_NET_DEV_FIELDS, [int(v) for v in values]))
+        except ValueError:
+            continue
+
+    return counters
+
+
+def snapshot_cmd():
+    """
+    Method to build the one command taking a counter snapshot: kernel
+    counters, vnet counters, kernel counters again, back to back in a
+    single shell.
+    :return: Command string.
+    """
+    cat = 'cat {}'.format(PROC_NET_DEV)
+    sep = "echo '{}'".format(SNAPSHOT_SEPARATOR)
+    return 'sh -c "{}"'.format(
+        '; '.join((cat, sep, HW_INTERFACES_CMD, sep, cat)))
+
+
+class CounterSnapshot(object):
+    """
+    Counters of all ports, read from vnet and from the kernel in one pass.
+
+    The kernel counters are read right before and right after the vnet
+    counters, so a vnet counter taken while traffic is still flowing must
+    lie between the two kernel readings.
+    """
+
+    def __init__(self, kernel_before, vnet, kernel_after):
+        """
+        :param kernel_before: parse_proc_net_dev() result read before vnet.
+        :param vnet: parse_hw_interfaces() result.
+        :param kernel_after: parse_proc_net_dev() result read after vnet.
+        """
+        self.kernel_before = kernel_before
+        self.vnet = vnet
+        self.kernel_after = kernel_after
+
+    @classmethod
+    def from_output(cls, out):
+        """
+        Method to parse the output of snapshot_cmd().
+        :param out: Output of the snapshot command.
+        :return: CounterSnapshot instance.
+        """
+        parts = (out or '').split(SNAPSHOT_SEPARATOR)
+        parts += [''] * (3 - len(parts))
+        return cls(parse_proc_net_dev(parts[0]),
+                   parse_hw_interfaces(parts[1]),
+                   parse_proc_net_dev(parts[2]))
+
+    def missing(self, ports):
+        """
+        Method to get the ports not present in both counter sources.
+        :param ports: Iterable of interface names.
+        :return: List of interface names.
+        """
+        return [port for port in ports
+                if port not in self.vnet or port not in self.kernel_before or
+                port not in self.kernel_after]
+
+    def compare(self, ports, tolerance=0, counter_map=COUNTER_MAP):
+        """
+        Method to compare the vnet counters of ports with the kernel ones.
+        A vnet counter matches if it lies between the two kernel readings,
+        widened by the tolerance on each side.
+        :param ports: Iterable of interface names, e.g. 'xeth1'.
+        :param tolerance: Packets allowed to be in flight between the
+            readings.
+        :param counter_map: Dict of kernel counter to vnet counter.
+        :return: List of CounterMismatch, ports missing from either
+            source are not included; see missing().
+        """
+        mismatches = []
+
+        for port in ports:
+            if port in self.missing([port]):
+                continue
+            before = self.kernel_before[port]
+            after = self.kernel_after[port]
+            vnet = self.vnet[port]
+
+            for kernel_counter, vnet_counter in counter_map.items():
+                low = min(before[kernel_counter], after[kernel_counter])
+                high = max(before[kernel_counter], after[kernel_counter])
+                value = vnet.counter(vnet_counter)
+                if not low - tolerance <= value <= high + tolerance:
+                    mismatches.append(CounterMismatch(
+                        port, kernel_counter, value, low, high))
+
+        return mismatches
+
+
+def take_counter_snapshot(module, run):
+    """
+    Method to read the counters of all ports from vnet and the kernel with
+    a single command.
+    :param module: The Ansible module to fetch input parameters.
+    :param run: Function(module, cmd) used to execute the command, e.g. the
+        module's execute_commands.
+    :return: CounterSnapshot instance.
+    """
+    return CounterSnapshot.from_output(run(module, snapshot_cmd()))
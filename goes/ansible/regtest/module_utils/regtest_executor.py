@@ -0,0 +1,274 @@
+""" Shared command executor for regression test modules """
+
+#
+# This file is part of Ansible
+#
+# Ansible is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Ansible is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Ansible. If not, see <http://www.gnu.org/licenses/>.
+#
+
+import atexit
+import os
+import shlex
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+
+try:
+    from shlex import quote
+except ImportError:
+    from pipes import quote
+
+KEY_FORMAT = '{switch_name} {exec_time} {cmd}'
+EXEC_TIME_FORMAT = '%Y%m%d%H:%M:%S'
+
+_SESSION = None
+
+
+def get_exec_time():
+    """
+    Method to get the current time in the format used for hash keys.
+    Same output as `date +%Y%m%d%T`, without forking a process.
+    :return: Current local time string.
+    """
+    return time.strftime(EXEC_TIME_FORMAT)
+
+
+class ShellSession(object):
+    """
+    A long-lived /bin/sh process which runs commands one at a time.
+    Commands are written to the shell's stdin and their output is read
+    back up to a per-session marker line, so the module pays for one
+    fork of the (small) shell per command instead of one fork of the
+    (large) python interpreter plus a `date` process.
+    """
+
+    def __init__(self, shell='/bin/sh'):
+        self._shell = shell
+        self._marker = '__regtest_{0}__'.format(uuid.uuid4().hex)
+        self._lock = threading.Lock()
+        self._proc = None
+
+        fd, self._err_path = tempfile.mkstemp(prefix='regtest_',
+                                              suffix='.err')
+        os.close(fd)
+
+    def _start(self):
+        devnull = open(os.devnull, 'wb')
+        self._proc = subprocess.Popen([self._shell],
+                                      stdin=subprocess.PIPE,
+                                      stdout=subprocess.PIPE,
+                                      stderr=devnull,
+                                      close_fds=True)
+        devnull.close()
+
+    def _alive(self):
+        return self._proc is not None and self._proc.poll() is None
+
+    def run(self, args):
+        """
+        Method to run a command in the session.
+        :param args: Argument list of the command, as for module.run_command.
+        :return: Tuple of (rc, out, err), or None if the session broke
+            while running the command.
+        """
+        line = '{0} </dev/null 2>{1}; printf "\\n{2} %d\\n" $?\n'.format(
+            ' '.join(quote(arg) for arg in args), quote(self._err_path),
+            self._marker)
+
+        with self._lock:
+            if not self._alive():
+                self._start()
+
+            try:
+                self._proc.stdin.write(line.encode('utf-8'))
+                self._proc.stdin.flush()
+            except (IOError, OSError):
+                self._proc = None
+                return None
+
+            lines = []
+            marker = self._marker.encode('utf-8')
+            while True:
+                data = self._proc.stdout.readline()
+                if not data:
+                    # Shell exited (e.g. command was `exit`), start afresh
+                    # on the next call
+                    self._proc = None
+                    return None
+                if data.startswith(marker):
+                    rc = int(data[len(marker):].strip() or 1)
+                    break
+                lines.append(data)
+
+            # Drop the newline emitted ahead of the marker
+            out = b''.join(lines)[:-1]
+            with open(self._err_path, 'rb') as err_file:
+                err = err_file.read()
+
+        return rc, _to_text(out), _to_text(err)
+
+    def close(self):
+        """
+        Method to terminate the shell and remove the session's temp file.
+        """
+        with self._lock:
+            if self._alive():
+                try:
+                    self._proc.stdin.close()
+                    self._proc.wait()
+                except (IOError, OSError):
+                    pass
+            self._proc = None
+
+            if os.path.exists(self._err_path):
+                os.remove(self._err_path)
+
+
+def _to_text(data):
+    if isinstance(data, str):
+        return data
+    return data.decode('utf-8', 'replace')
+
+
+def get_session():
+    """
+    Method to get the shell session shared by everything in this module run.
+    :return: ShellSession instance.
+    """
+    global _SESSION
+
+    if _SESSION is None:
+        _SESSION = ShellSession()
+        atexit.register(_SESSION.close)
+
+    return _SESSION
+
+
+def split_command(cli):
+    """
+    Method to split a cli string into an argument list, with the same
+    argument handling as module.run_command.
+    :param cli: The complete cli string to be executed on the target node(s).
+    :return: List of arguments.
+    """
+    return [os.path.expanduser(os.path.expandvars(arg))
+            for arg in shlex.split(cli)]
+
+
+def run_command(module, cli):
+    """
+    Method to run a cli string through the shared session.
+    Falls back to module.run_command if the session cannot be used.
+    :param module: The Ansible module to fetch input parameters.
+    :param cli: The complete cli string to be executed on the target node(s).
+    :return: Tuple of (rc, out, err).
+    """
+    args = split_command(cli)
+
+    result = None
+    try:
+        result = get_session().run(args)
+    except (IOError, OSError):
+        pass
+
+    if result is None:
+        result = module.run_command(args)
+
+    return result
+
+
+class CommandExecutor(object):
+    """
+    Drop-in replacement for the run_cli()/execute_commands() pair that
+    every test module used to carry.
+
+    Usage in a module:
+
+        HASH_DICT = OrderedDict()
+        EXECUTOR = CommandExecutor(HASH_DICT)
+        run_cli = EXECUTOR.run_cli
+        execute_commands = EXECUTOR.execute_commands
+    """
+
+    def __init__(self, hash_dict=None, skip=None, key_format=KEY_FORMAT,
+                 max_output_len=None):
+        """
+        :param hash_dict: Dict in which executed commands are recorded,
+            keyed by switch name, exec time and command. None to not record.
+        :param skip: Optional callable(module, cmd) returning True for
+            commands which must be recorded but not run (dry run,
+            service restarts etc.).
+        :param key_format: Format of the hash key, may use switch_name,
+            exec_time and cmd.
+        :param max_output_len: If set, outputs longer than this many bytes
+            are truncated before being recorded.
+        """
+        self.hash_dict = hash_dict
+        self.skip = skip
+        self.key_format = key_format
+        self.max_output_len = max_output_len
+
+    def run_cli(self, module, cli):
+        """
+        Method to execute the cli command on the target node(s) and
+        returns the output.
+        :param module: The Ansible module to fetch input parameters.
+        :param cli: The complete cli string to be executed on the target node(s).
+        :return: Output/Error or None depending upon the response from cli.
+        """
+        rc, out, err = run_command(module, cli)
+
+        if out:
+            return out.rstrip()
+        elif err:
+            return err.rstrip()
+        else:
+            return None
+
+    def execute_commands(self, module, cmd):
+        """
+        Method to execute given commands and return the output.
+        :param module: The Ansible module to fetch input parameters.
+        :param cmd: Command to execute.
+        :return: Output of the commands.
+        """
+        if self.skip is not None and self.skip(module, cmd):
+            out = None
+        else:
+            out = self.run_cli(module, cmd)
+
+        if self.hash_dict is not None:
+            self.record(module, cmd, out)
+
+        return out
+
+    def record(self, module, cmd, out):
+        """
+        Method to store command prefixed with exec time as key and
+        command output as value in the hash dictionary.
+        :param module: The Ansible module to fetch input parameters.
+        :param cmd: Command which was executed.
+        :param out: Output of the command.
+        """
+        key = self.key_format.format(
+            switch_name=module.params.get('switch_name'),
+            exec_time=get_exec_time(), cmd=cmd)
+
+        if (out and self.max_output_len and
+                len(out.encode('utf-8')) > self.max_output_len):
+            out = out[:self.max_output_len]
+
+        self.hash_dict[key] = out
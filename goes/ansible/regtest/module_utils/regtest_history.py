@@ -0,0 +1,257 @@
+""" Run history of regression results and performance trend checks """
+
+#
+# This file is part of Ansible
+#
+# Ansible is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Ansible is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Ansible. If not, see <http://www.gnu.org/licenses/>.
+#
+
+import re
+import sqlite3
+import time
+
+from collections import namedtuple
+
+from ansible.module_utils.regtest_executor import EXEC_TIME_FORMAT
+
+# Hash names are '<test name>_<date +%Y%m%d%T>'
+_HASH_NAME_RE = re.compile(r'^(?P<test>.+)_(?P<time>\d{10}:\d\d:\d\d)$')
+
+# Result hash fields which are never metrics
+_NON_METRIC_FIELDS = ('start.time', 'end.time', 'result.status',
+                      'result.detail', 'result.raw', 'result.raw.gz')
+
+# Metrics for which a larger value is an improvement; for all others
+# (durations, convergence times, loss, retransmits) larger is worse
+HIGHER_IS_BETTER = ('bits_per_second', 'routes.present')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    testbed TEXT,
+    build TEXT,
+    goes_version TEXT,
+    goes_build_id TEXT,
+    created REAL
+);
+CREATE TABLE IF NOT EXISTS results (
+    run_id INTEGER,
+    test TEXT,
+    hash_name TEXT,
+    status TEXT,
+    PRIMARY KEY (run_id, test)
+);
+CREATE TABLE IF NOT EXISTS metrics (
+    run_id INTEGER,
+    test TEXT,
+    metric TEXT,
+    value REAL,
+    PRIMARY KEY (run_id, test, metric)
+);
+CREATE INDEX IF NOT EXISTS metrics_by_test ON metrics (test, metric, run_id);
+"""
+
+Regression = namedtuple('Regression',
+                        'test metric value baseline change')
+
+
+def split_summary_line(line):
+    """
+    Method to split a regression summary report line.
+    :param line: Line '<hash name>: <status>' of the summary report.
+    :return: Tuple of (test name, hash name, status), or None if the line
+        is not a test result.
+    """
+    hash_name, sep, status = line.strip().rpartition(': ')
+    if not sep:
+        return None
+
+    match = _HASH_NAME_RE.match(hash_name)
+    test = match.group('test') if match else hash_name
+    return test, hash_name, status
+
+
+def parse_exec_time(value):
+    """
+    Method to convert a start.time/end.time value to seconds since epoch.
+    :param value: Time string in `date +%Y%m%d%T` format.
+    :return: Seconds, or None if the value cannot be parsed.
+    """
+    try:
+        return time.mktime(time.strptime(value.strip(), EXEC_TIME_FORMAT))
+    except (AttributeError, ValueError):
+        return None
+
+
+def metrics_from_hash(fields):
+    """
+    Method to extract the numeric metrics of one test result hash: the
+    test duration, from start.time and end.time, plus every other field
+    with a numeric value (convergence times, iperf throughput, route
+    counts ...).
+    :param fields: Dict of hash field to value.
+    :return: Dict of metric name to float value.
+    """
+    metrics = {}
+
+    start = parse_exec_time(fields.get('start.time'))
+    end = parse_exec_time(fields.get('end.time'))
+    if start is not None and end is not None:
+        metrics['duration'] = end - start
+
+    for field, value in fields.items():
+        if field in _NON_METRIC_FIELDS:
+            continue
+        try:
+            metrics[field] = float(value)
+        except (TypeError, ValueError):
+            continue
+
+    return metrics
+
+
+def is_higher_better(metric):
+    """
+    Method to tell the direction of a metric.
+    :param metric: Metric name.
+    :return: True if larger values are improvements.
+    """
+    return metric.endswith(HIGHER_IS_BETTER)
+
+
+def _median(values):
+    values = sorted(values)
+    middle = len(values) // 2
+    if len(values) % 2:
+        return values[middle]
+    return (values[middle - 1] + values[middle]) / 2.0
+
+
+class RunHistory(object):
+    """
+    SQLite store of the results and metrics of every regression run, per
+    testbed, GOES version and build.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: Path of the SQLite database file, created if missing.
+        """
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def add_run(self, testbed, build=None, goes_version=None,
+                goes_build_id=None):
+        """
+        Method to start a new run.
+        :param testbed: Name of the testbed the regression ran on.
+        :param build: Build number of the regression job.
+        :param goes_version: GOES version details.
+        :param goes_build_id: GOES build id details.
+        :return: Id of the new run.
+        """
+        cursor = self.conn.execute(
+            'INSERT INTO runs (testbed, build, goes_version, goes_build_id, '
+            'created) VALUES (?, ?, ?, ?, ?)',
+            (testbed, build, goes_version, goes_build_id, time.time()))
+        return cursor.lastrowid
+
+    def add_result(self, run_id, test, hash_name, status, metrics=None):
+        """
+        Method to store the result of one test of a run.
+        :param run_id: Id of the run.
+        :param test: Name of the test.
+        :param hash_name: Name of the result hash in redis.
+        :param status: Test status, e.g. 'Passed'.
+        :param metrics: Optional dict of metric name to value.
+        """
+        self.conn.execute(
+            'INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)',
+            (run_id, test, hash_name, status))
+        self.conn.executemany(
+            'INSERT OR REPLACE INTO metrics VALUES (?, ?, ?, ?)',
+            [(run_id, test, metric, value)
+             for metric, value in (metrics or {}).items()])
+
+    def commit(self):
+        self.conn.commit()
+
+    def previous_values(self, run_id, test, metric, last_n=5):
+        """
+        Method to get the values of a metric in the runs before a run,
+        on the same testbed.
+        :param run_id: Id of the run to look back from.
+        :param test: Name of the test.
+        :param metric: Metric name.
+        :param last_n: Maximum number of runs to look back.
+        :return: List of values, most recent first.
+        """
+        rows = self.conn.execute(
+            'SELECT m.value FROM metrics m JOIN runs r ON m.run_id = r.run_id '
+            'WHERE m.test = ? AND m.metric = ? AND m.run_id < ? AND '
+            'r.testbed = (SELECT testbed FROM runs WHERE run_id = ?) '
+            'ORDER BY m.run_id DESC LIMIT ?',
+            (test, metric, run_id, run_id, last_n))
+        return [row[0] for row in rows]
+
+    def regressions(self, run_id, last_n=5, threshold=0.2):
+        """
+        Method to find the metrics of a run which got worse than the median
+        of the previous runs by more than the threshold.
+        :param run_id: Id of the run to check.
+        :param last_n: Number of previous runs making up the baseline.
+        :param threshold: Allowed relative change, e.g. 0.2 for 20%.
+            Metrics with a zero baseline regress when they rise above 0.
+        :return: List of Regression tuples, sorted by test and metric.
+        """
+        regressed = []
+        rows = self.conn.execute(
+            'SELECT test, metric, value FROM metrics WHERE run_id = ? '
+            'ORDER BY test, metric', (run_id,)).fetchall()
+
+        for test, metric, value in rows:
+            previous = self.previous_values(run_id, test, metric, last_n)
+            if not previous:
+                continue
+
+            baseline = _median(previous)
+            if not baseline:
+                # No relative change from a zero baseline, e.g. loss or
+                # retransmits: any increase of a lower is better metric
+                # is a regression
+                if value > 0 and not is_higher_better(metric):
+                    regressed.append(Regression(test, metric, value, baseline,
+                                                float('inf')))
+                continue
+
+            change = (value - baseline) / abs(baseline)
+            if is_higher_better(metric):
+                worse = change < -threshold
+            else:
+                worse = change > threshold
+
+            if worse:
+                regressed.append(Regression(test, metric, value, baseline,
+                                            change))
+
+        return regressed
@@ -0,0 +1,120 @@
+""" Streaming log of executed commands for regression test modules """
+
+#
+# This file is part of Ansible
+#
+# Ansible is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Ansible is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Ansible. If not, see <http://www.gnu.org/licenses/>.
+#
+
+import gzip
+import io
+
+from collections import OrderedDict
+
+
+def is_record_key(key):
+    """
+    Method to tell command records from result data.
+    Command records are keyed '<switch> <exec time> <cmd>' and so contain
+    spaces; result data keys ('result.status', 'x.convergence.time',
+    'retries' ...) never do.
+    :param key: Hash dictionary key.
+    :return: True if key is a command record.
+    """
+    return ' ' in key
+
+
+def format_record(key, value):
+    """
+    Method to format one log file entry.
+    :param key: Hash dictionary key.
+    :param value: Value for the key.
+    :return: Log entry string.
+    """
+    return u'{0}\n{1}\n\n'.format(key, value)
+
+
+class StreamingLog(OrderedDict):
+    """
+    Drop-in replacement for the HASH_DICT OrderedDict of a test module.
+
+    Until open() is called it behaves exactly like an OrderedDict. Once
+    opened, every command record is written to the log file as it is
+    stored and only its key is kept in memory (so dry run command listings
+    still work); result data stays in the dict and is written at close().
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.log_file = None
+        self.log_file_path = None
+        OrderedDict.__init__(self, *args, **kwargs)
+
+    def open(self, log_file_path, mode='w', compress=False):
+        """
+        Method to start streaming records to the log file.
+        Records stored before the call are written out first.
+        :param log_file_path: Path of the log file.
+        :param mode: 'w' to truncate, 'a' to append to an existing log.
+        :param compress: Write the log gzip compressed, with a .gz suffix.
+        :return: Path of the log file.
+        """
+        if compress:
+            log_file_path += '.gz'
+            self.log_file = io.TextIOWrapper(
+                gzip.open(log_file_path, mode + 'b'), encoding='utf-8')
+        else:
+            self.log_file = io.open(log_file_path, mode, encoding='utf-8')
+        self.log_file_path = log_file_path
+
+        for key, value in list(self.items()):
+            if is_record_key(key):
+                self.__setitem__(key, value)
+
+        return log_file_path
+
+    def __setitem__(self, key, value):
+        if self.log_file is not None and is_record_key(key):
+            self.log_file.write(format_record(key, _to_text(value)))
+            self.log_file.flush()
+            value = None
+        OrderedDict.__setitem__(self, key, value)
+
+    def summary(self):
+        """
+        Method to get the result data, without command records.
+        :return: OrderedDict of result keys and values.
+        """
+        return OrderedDict((key, value) for key, value in self.items()
+                           if not is_record_key(key))
+
+    def close(self):
+        """
+        Method to append the result data to the log file and close it.
+        :return: Path of the log file.
+        """
+        if self.log_file is not None:
+            for key, value in self.summary().items():
+                self.log_file.write(format_record(key, _to_text(value)))
+            self.log_file.close()
+            self.log_file = None
+
+        return self.log_file_path
+
+
+def _to_text(value):
+    if isinstance(value, bytes):
+        return value.decode('utf-8', 'replace')
+    if isinstance(value, type(u'')):
+        return value
+    return u'{0}'.format(value)
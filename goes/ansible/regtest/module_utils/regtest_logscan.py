@@ -0,0 +1,313 @@
+""" Streaming, incremental scanner of switch log files """
+
+#
+# This file is part of Ansible
+#
+# Ansible is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Ansible is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Ansible. If not, see <http://www.gnu.org/licenses/>.
+#
+
+import calendar
+import json
+import os
+import re
+import time
+
+from collections import namedtuple
+
+from ansible.module_utils.regtest_executor import EXEC_TIME_FORMAT
+
+# Timestamp at the start of a syslog line, either traditional
+#   May  3 12:34:56 invader1 kernel: ...
+# or rsyslog high precision
+#   2018-05-03T12:34:56.123456+00:00 invader1 kernel: ...
+_SYSLOG_TIME_RE = re.compile(
+    r'^(?:(?P<mon>[A-Z][a-z]{2})\s+(?P<day>\d{1,2})\s+'
+    r'(?P<hms>\d\d:\d\d:\d\d)|(?P<iso>\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d))')
+
+_MONTHS = dict((abbr, index) for index, abbr in enumerate(calendar.month_abbr)
+               if abbr)
+
+# Lines written while the scan itself runs must not match
+EXCLUDE = ('check_core_dump',)
+
+# Below this many bytes, the binary search reads the rest linearly
+_SEARCH_BLOCK = 64 * 1024
+
+LogMatch = namedtuple('LogMatch', 'offset line')
+
+ScanResult = namedtuple('ScanResult', 'path matches start end inode rotated')
+
+
+def parse_exec_time(start_time):
+    """
+    Method to convert a start time recorded by the playbooks to seconds.
+    :param start_time: Time string in `date +%Y%m%d%T` format.
+    :return: Seconds since epoch, or None if it cannot be parsed.
+    """
+    try:
+        return time.mktime(time.strptime(start_time.strip(),
+                                         EXEC_TIME_FORMAT))
+    except (AttributeError, ValueError):
+        return None
+
+
+def parse_log_time(line, year):
+    """
+    Method to get the timestamp of a syslog line.
+    :param line: Log line.
+    :param year: Year to assume for timestamps that have none.
+    :return: Seconds since epoch, or None for lines without a timestamp.
+    """
+    match = _SYSLOG_TIME_RE.match(line)
+    if not match:
+        return None
+
+    try:
+        if match.group('iso'):
+            parsed = time.strptime(match.group('iso'), '%Y-%m-%dT%H:%M:%S')
+        else:
+            parsed = time.strptime('{0} {1} {2} {3}'.format(
+                year, _MONTHS[match.group('mon')], match.group('day'),
+                match.group('hms')), '%Y %m %d %H:%M:%S')
+    except (KeyError, ValueError):
+        return None
+
+    return time.mktime(parsed)
+
+
+def _next_time(log, year, limit=_SEARCH_BLOCK):
+    """
+    Method to read lines from the current position up to the first one
+    with a timestamp.
+    :return: Timestamp, or None if none is found within limit bytes.
+    """
+    read = 0
+    while read < limit:
+        line = log.readline()
+        if not line:
+            return None
+        read += len(line)
+        stamp = parse_log_time(_to_text(line), year)
+        if stamp is not None:
+            return stamp
+    return None
+
+
+def find_start(log, start, year, size):
+    """
+    Method to binary search a log file for the first line logged at or
+    after a time. Log lines are assumed to be in time order.
+    :param log: Log file opened in binary mode.
+    :param start: Seconds since epoch.
+    :param year: Year of the log timestamps.
+    :param size: Size of the file.
+    :return: Byte offset of a line start at or before the first line
+        logged at start.
+    """
+    low, high = 0, size
+
+    while high - low > _SEARCH_BLOCK:
+        middle = (low + high) // 2
+        log.seek(middle)
+        log.readline()
+        stamp = _next_time(log, year)
+        if stamp is not None and stamp < start:
+            low = middle
+        else:
+            high = middle
+
+    if low:
+        log.seek(low)
+        log.readline()
+        low = log.tell()
+
+    return low
+
+
+class OffsetRegistry(object):
+    """
+    Where each watched log file ended at the last scan, with the file's
+    inode so that rotation is detected. Kept in a JSON file, or passed in
+    and out of the module when the registry lives in the result redis
+    (see regtest_redis.LogOffsetStore).
+
+    Offsets are kept per consumer, under `<consumer>:<log path>`, so that
+    one module scanning a log does not skip lines for another one.
+    """
+
+    def __init__(self, consumer, path=None, offsets=None):
+        """
+        :param consumer: Name of the module scanning the logs.
+        :param path: Path of the JSON file, None to keep offsets in memory.
+        :param offsets: Optional dict of offset key to offset entry, as
+            returned in the offsets attribute of an earlier registry.
+        """
+        self.consumer = consumer
+        self.path = path
+        self.offsets = dict(offsets or {})
+        if path and os.path.exists(path):
+            try:
+                with open(path) as registry:
+                    self.offsets = json.load(registry)
+            except (IOError, ValueError):
+                self.offsets = {}
+
+    def key(self, log_path):
+        return '{0}:{1}'.format(self.consumer, log_path)
+
+    def get(self, log_path):
+        """
+        Method to get the position of the last scan of a log file by this
+        consumer.
+        :param log_path: Path of the log file.
+        :return: Tuple of (inode, offset), or (None, None) if never scanned.
+        """
+        entry = self.offsets.get(self.key(log_path)) or {}
+        return entry.get('inode'), entry.get('offset')
+
+    def set(self, log_path, inode, offset):
+        self.offsets[self.key(log_path)] = {'inode': inode, 'offset': offset,
+                                            'time': time.time()}
+
+    def save(self):
+        if self.path:
+            with open(self.path, 'w') as registry:
+                json.dump(self.offsets, registry)
+
+
+class LogScanner(object):
+    """
+    Scans log files for any of a set of error patterns in one pass.
+
+    Only the part of a file logged since the start time is read: the
+    start is found by a binary search on the line timestamps, or taken
+    from the offset where the previous scan of the file ended, whichever
+    is later. Lines are streamed, never held in memory all at once.
+    """
+
+    def __init__(self, patterns, exclude=EXCLUDE, registry=None):
+        """
+        :param patterns: Iterable of strings; a line matches if it contains
+            any of them.
+        :param exclude: Iterable of strings; lines containing any of them
+            never match.
+        :param registry: Optional OffsetRegistry for incremental scans.
+        """
+        patterns = [p for p in patterns if p]
+        self.pattern = None
+        if patterns:
+            self.pattern = re.compile('|'.join(re.escape(p) for p in patterns))
+        self.exclude = list(exclude)
+        self.registry = registry
+
+    def matches(self, line):
+        if self.pattern is None or not self.pattern.search(line):
+            return False
+        return not any(word in line for word in self.exclude)
+
+    def scan(self, path, start=None):
+        """
+        Method to scan one log file.
+        :param path: Path of the log file.
+        :param start: Optional seconds since epoch; lines logged earlier
+            are skipped.
+        :return: ScanResult. Raises IOError if the file cannot be read.
+        """
+        stat = os.stat(path)
+        size = stat.st_size
+        year = time.localtime(start).tm_year if start else None
+
+        inode, offset = (None, None)
+        if self.registry is not None:
+            inode, offset = self.registry.get(path)
+
+        # A new inode or a shrunk file means the log was rotated
+        rotated = offset is not None and (inode != stat.st_ino or
+                                          offset > size)
+        if rotated or offset is None:
+            offset = 0
+
+        matches = []
+        with open(path, 'rb') as log:
+            if start is not None:
+                offset = max(offset, find_start(log, start, year, size))
+            log.seek(offset)
+            position = offset
+            in_range = start is None
+
+            for line in iter(log.readline, b''):
+                line_offset = position
+                position += len(line)
+                if not line.endswith(b'\n'):
+                    # Partially written line, leave it for the next scan
+                    position = line_offset
+                    break
+
+                text = _to_text(line).rstrip('\n')
+                if not in_range:
+                    stamp = parse_log_time(text, year)
+                    if stamp is None or stamp < start:
+                        continue
+                    in_range = True
+
+                if self.matches(text):
+                    matches.append(LogMatch(line_offset, text))
+
+        if self.registry is not None:
+            self.registry.set(path, stat.st_ino, position)
+
+        return ScanResult(path, matches, offset, position, stat.st_ino,
+                          rotated)
+
+
+def scan_logs(switch_name, file_names, patterns, start_time=None,
+              registry=None, exclude=EXCLUDE):
+    """
+    Method to scan log files of a switch for error messages logged since
+    a test started.
+    :param switch_name: Name of the switch, for the failure summary.
+    :param file_names: List of log file paths.
+    :param patterns: List of error messages to look for.
+    :param start_time: Optional start time in `date +%Y%m%d%T` format.
+    :param registry: Optional OffsetRegistry for incremental scans.
+    :param exclude: Strings of lines which never match.
+    :return: Tuple of (True if errors were found, failure summary).
+    """
+    failure_summary = ''
+    found = False
+    start = parse_exec_time(start_time) if start_time else None
+    scanner = LogScanner(patterns, exclude, registry)
+
+    for file_name in file_names:
+        try:
+            result = scanner.scan(file_name, start)
+        except (IOError, OSError):
+            failure_summary += "Unable to open {} file\n".format(file_name)
+            continue
+
+        if result.matches:
+            found = True
+            errors = '\n'.join(match.line for match in result.matches)
+            failure_summary += 'On switch {} '.format(switch_name)
+            failure_summary += 'runtime error found in {} file.\n'.format(
+                file_name)
+            failure_summary += 'Errors:\n{}\n'.format(errors)
+
+    return found, failure_summary
+
+
+def _to_text(data):
+    if isinstance(data, bytes):
+        return data.decode('utf-8', 'replace')
+    return data
@@ -0,0 +1,282 @@
+""" Concurrent ping sweep and ping report parser for test modules """
+
+#
+# This file is part of Ansible
+#
+# Ansible is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Ansible is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Ansible. If not, see <http://www.gnu.org/licenses/>.
+#
+
+import re
+import subprocess
+import threading
+
+from ansible.module_utils.regtest_executor import split_command
+
+# 3 packets transmitted, 3 received, 0% packet loss, time 402ms
+# 3 packets transmitted, 3 packets received, 0% packet loss (busybox)
+_SUMMARY_RE = re.compile(
+    r'(?P<transmitted>\d+) packets transmitted, '
+    r'(?P<received>\d+) (?:packets )?received')
+
+_LOSS_RE = re.compile(r'(?P<loss>\d+(?:\.\d+)?)% packet loss')
+
+# rtt min/avg/max/mdev = 0.041/0.052/0.062/0.008 ms
+# round-trip min/avg/max = 0.041/0.052/0.062 ms (busybox)
+_RTT_RE = re.compile(
+    r'min/avg/max(?:/mdev)? = (?P<min>\d+(?:\.\d+)?)/(?P<avg>\d+(?:\.\d+)?)/'
+    r'(?P<max>\d+(?:\.\d+)?)(?:/(?P<mdev>\d+(?:\.\d+)?))? ms')
+
+# 64 bytes from 10.0.1.31: icmp_seq=1 ttl=64 time=0.041 ms
+_REPLY_RE = re.compile(r'icmp_[rs]eq=\d+ .*time=(?P<time>\d+(?:\.\d+)?) ms')
+
+
+class PingReport(object):
+    """
+    Summary of one ping run.
+    """
+
+    def __init__(self, transmitted, received, loss, rtt_min=None,
+                 rtt_avg=None, rtt_max=None, jitter=None, rtts=None):
+        """
+        :param transmitted: Echo requests sent.
+        :param received: Echo replies received.
+        :param loss: Packet loss in percent.
+        :param rtt_min: Minimum round trip time in milliseconds.
+        :param rtt_avg: Average round trip time in milliseconds.
+        :param rtt_max: Maximum round trip time in milliseconds.
+        :param jitter: Mean difference of consecutive round trip times in
+            milliseconds, or the mdev of ping if replies were not listed.
+        :param rtts: List of round trip times of the replies.
+        """
+        self.transmitted = transmitted
+        self.received = received
+        self.loss = loss
+        self.rtt_min = rtt_min
+        self.rtt_avg = rtt_avg
+        self.rtt_max = rtt_max
+        self.jitter = jitter
+        self.rtts = rtts or []
+
+    def __repr__(self):
+        return 'PingReport({0}/{1} received, {2}% loss)'.format(
+            self.received, self.transmitted, self.loss)
+
+
+def parse_ping(out):
+    """
+    Method to parse the output of ping.
+    :param out: Output of ping.
+    :return: PingReport, or None if the output holds no statistics.
+    """
+    out = out or ''
+    summary = _SUMMARY_RE.search(out)
+    if not summary:
+        return None
+
+    transmitted = int(summary.group('transmitted'))
+    received = int(summary.group('received'))
+
+    loss = _LOSS_RE.search(out)
+    if loss:
+        loss = float(loss.group('loss'))
+    elif transmitted:
+        loss = 100.0 * (transmitted - received) / transmitted
+    else:
+        loss = 100.0
+
+    rtts = [float(match.group('time')) for match in _REPLY_RE.finditer(out)]
+
+    rtt_min = rtt_avg = rtt_max = jitter = None
+    rtt = _RTT_RE.search(out)
+    if rtt:
+        rtt_min = float(rtt.group('min'))
+        rtt_avg = float(rtt.group('avg'))
+        rtt_max = float(rtt.group('max'))
+        if rtt.group('mdev') is not None:
+            jitter = float(rtt.group('mdev'))
+
+    if len(rtts) > 1:
+        jitter = sum(abs(b - a) for a, b in zip(rtts, rtts[1:]))
+        jitter /= len(rtts) - 1
+
+    return PingReport(transmitted, received, loss, rtt_min, rtt_avg, rtt_max,
+                      jitter, rtts)
+
+
+def ping_cmd(address, count=3, interval=0.2, wait=1, source=None, size=None,
+             prefix=''):
+    """
+    Method to build a ping command line.
+    :param address: IP address to ping.
+    :param count: Number of echo requests.
+    :param interval: Seconds between echo requests; 0.2 is the smallest
+        interval ping allows for non-root users.
+    :param wait: Seconds to wait for the last reply.
+    :param source: Optional source address or interface, ping -I.
+    :param size: Optional payload size in bytes, ping -s.
+    :param prefix: Optional command prefix, e.g. 'docker exec -i R1 '.
+    :return: Command string.
+    """
+    cmd = '{}ping -c {} -i {} -W {}'.format(prefix, count, interval, wait)
+    if source:
+        cmd += ' -I {}'.format(source)
+    if size:
+        cmd += ' -s {}'.format(size)
+    return '{} {}'.format(cmd, address)
+
+
+class PingTarget(object):
+    """
+    One address to ping and the outcome.
+    """
+
+    def __init__(self, address, cmd=None, max_loss=None):
+        """
+        :param address: IP address to ping.
+        :param cmd: Optional ping command line, ping_cmd(address) if None.
+        :param max_loss: Highest packet loss in percent to pass; None to
+            pass as soon as one reply is received.
+        """
+        self.address = address
+        self.cmd = cmd or ping_cmd(address)
+        self.max_loss = max_loss
+        self.out = None
+        self.report = None
+
+    @property
+    def reachable(self):
+        """ True if at least one echo reply was received """
+        return self.report is not None and self.report.received > 0
+
+    @property
+    def passed(self):
+        """ True if the address replied with low enough packet loss """
+        if not self.reachable:
+            return False
+        return self.max_loss is None or self.report.loss <= self.max_loss
+
+
+class PingSweep(object):
+    """
+    Pings many addresses concurrently, at most max_sessions at a time, so
+    a sweep over all links takes about as long as pinging one of them.
+
+    Each ping is its own process; the shared shell session of
+    regtest_executor runs one command at a time and cannot be used here.
+    """
+
+    def __init__(self, executor=None, max_sessions=32):
+        """
+        :param executor: Optional CommandExecutor in which each command and
+            its output are recorded, in target order, after the sweep.
+        :param max_sessions: Maximum number of concurrent pings.
+        """
+        self.executor = executor
+        self.max_sessions = max(1, max_sessions)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _run(cmd):
+        try:
+            proc = subprocess.Popen(split_command(cmd),
+                                    stdout=subprocess.PIPE,
+                                    stderr=subprocess.STDOUT,
+                                    close_fds=True)
+        except OSError as err:
+            return str(err)
+
+        out = proc.communicate()[0]
+        return out.decode('utf-8', 'replace').rstrip()
+
+    def sweep(self, module, targets):
+        """
+        Method to ping all targets and parse their reports.
+        :param module: The Ansible module to fetch input parameters.
+        :param targets: List of PingTarget.
+        :return: The same list, with out and report filled in.
+        """
+        pending = list(targets)
+
+        def worker():
+            while True:
+                with self._lock:
+                    if not pending:
+                        return
+                    target = pending.pop(0)
+
+                target.out = self._run(target.cmd)
+                target.report = parse_ping(target.out)
+
+        threads = [threading.Thread(target=worker)
+                   for _ in range(min(self.max_sessions, len(pending)))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        if self.executor is not None:
+            for target in targets:
+                self.executor.record(module, target.cmd, target.out)
+
+        return targets
+
+
+def ping_failures(switch_name, targets):
+    """
+    Method to describe the targets which did not pass.
+    :param switch_name: Name of the switch the pings ran on.
+    :param targets: List of PingTarget, after PingSweep.sweep().
+    :return: Failure summary, empty if all targets passed.
+    """
+    failure_summary = ''
+
+    for target in targets:
+        if target.passed:
+            continue
+
+        failure_summary += 'On switch {} '.format(switch_name)
+        if not target.reachable:
+            failure_summary += 'unable to ping interface ip {}\n'.format(
+                target.address)
+        else:
+            failure_summary += 'packet loss of {:.0f}% to {} '.format(
+                target.report.loss, target.address)
+            failure_summary += 'is above {:.0f}%\n'.format(target.max_loss)
+        failure_summary += 'Ping Out:\n{}\n'.format(target.out)
+
+    return failure_summary
+
+
+def record_ping(hash_dict, switch_name, targets):
+    """
+    Method to store the measured numbers of each target in the hash
+    dictionary, as result.ping.<switch>.<address>.<metric> keys, so they
+    are kept in the result hash in redis for comparison across builds.
+    :param hash_dict: Hash dictionary of the test module.
+    :param switch_name: Name of the switch the pings ran on.
+    :param targets: List of PingTarget, after PingSweep.sweep().
+    """
+    for target in targets:
+        report = target.report
+        if report is None:
+            continue
+
+        prefix = 'result.ping.{}.{}.'.format(switch_name, target.address)
+        hash_dict[prefix + 'loss_percent'] = '{:.2f}'.format(report.loss)
+        for metric, value in (('rtt_min_ms', report.rtt_min),
+                              ('rtt_avg_ms', report.rtt_avg),
+                              ('rtt_max_ms', report.rtt_max),
+                              ('jitter_ms', report.jitter)):
+            if value is not None:
+                hash_dict[prefix + metric] = '{:.3f}'.format(value)
@@ -0,0 +1,175 @@
+""" Snapshot of per-port state from the goes redis hash """
+
+#
+# This file is part of Ansible
+#
+# Ansible is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Ansible is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Ansible. If not, see <http://www.gnu.org/licenses/>.
+#
+
+import re
+
+from collections import OrderedDict
+
+VNET_PREFIX = 'vnet.'
+
+_FIELD_RE = re.compile(r'^(\S+): ?(.*)$')
+
+
+def parse_hgetall(out):
+    """
+    Method to parse the output of `goes hgetall` into a dict.
+    Each line is 'field: value'; lines which do not start a new field
+    are continuation lines of a multi-line value.
+    :param out: Output of the hgetall command.
+    :return: OrderedDict of field to value.
+    """
+    fields = OrderedDict()
+    field = None
+
+    for line in (out or '').splitlines():
+        match = _FIELD_RE.match(line)
+        if match:
+            field = match.group(1)
+            fields[field] = match.group(2)
+        elif field is not None:
+            fields[field] += '\n' + line
+
+    return fields
+
+
+class PortState(object):
+    """
+    State of a single vnet interface, e.g. xeth1 or xeth1-2.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.fields = {}
+
+    def get(self, attr, default=None):
+        """
+        Method to get a raw attribute value of this port.
+        :param attr: Attribute name, e.g. 'speed'.
+        :param default: Value to return if the attribute is not present.
+        :return: Attribute value string.
+        """
+        return self.fields.get(attr, default)
+
+    @property
+    def link(self):
+        """ True if link is up, False if down, None if unknown """
+        value = self.fields.get('link')
+        if value is None:
+            return None
+        return value.strip().lower() == 'true'
+
+    @property
+    def speed(self):
+        return self.fields.get('speed')
+
+    @property
+    def media(self):
+        return self.fields.get('media')
+
+    @property
+    def fec(self):
+        return self.fields.get('fec')
+
+    def __repr__(self):
+        return 'PortState({0!r}, {1!r})'.format(self.name, self.fields)
+
+
+class PortTable(object):
+    """
+    Per-port view of every vnet.<port>.<attr> field in the goes redis hash.
+    """
+
+    def __init__(self, fields):
+        """
+        :param fields: Dict of redis hash field to value, as returned by
+            parse_hgetall().
+        """
+        self.ports = OrderedDict()
+
+        for field, value in fields.items():
+            if not field.startswith(VNET_PREFIX):
+                continue
+            name, sep, attr = field[len(VNET_PREFIX):].rpartition('.')
+            if not sep or not name:
+                continue
+            if name not in self.ports:
+                self.ports[name] = PortState(name)
+            self.ports[name].fields[attr] = value
+
+    @classmethod
+    def from_hgetall(cls, out):
+        """
+        Method to build the table from `goes hgetall` output.
+        :param out: Output of the hgetall command.
+        :return: PortTable instance.
+        """
+        return cls(parse_hgetall(out))
+
+    def __contains__(self, name):
+        return name in self.ports
+
+    def __getitem__(self, name):
+        return self.ports[name]
+
+    def __len__(self):
+        return len(self.ports)
+
+    def names(self):
+        return list(self.ports.keys())
+
+    def get(self, name):
+        """
+        Method to get the state of a port.
+        :param name: Interface name, e.g. 'xeth1' or 'xeth1-2'.
+        :return: PortState, or an empty PortState if the port is unknown.
+        """
+        return self.ports.get(name) or PortState(name)
+
+    def check(self, name, attr, expected):
+        """
+        Method to check that a port attribute contains the expected value.
+        Matching is by substring, as with the per-field `goes hget` checks.
+        :param name: Interface name.
+        :param attr: Attribute name, e.g. 'speed'.
+        :param expected: Expected value.
+        :return: True if the attribute matches.
+        """
+        value = self.get(name).get(attr)
+        return value is not None and expected in value
+
+    def links_down(self, names):
+        """
+        Method to get the ports whose link is not up.
+        :param names: Iterable of interface names to check.
+        :return: List of interface names whose link is down or unknown.
+        """
+        return [name for name in names if not self.get(name).link]
+
+
+def get_port_table(module, run, channel):
+    """
+    Method to read the state of all ports with a single `goes hgetall`.
+    :param module: The Ansible module to fetch input parameters.
+    :param run: Function(module, cmd) used to execute the command, e.g. the
+        module's execute_commands or run_cli.
+    :param channel: Platina redis channel, e.g. 'platina-mk1'.
+    :return: PortTable instance.
+    """
+    return PortTable.from_hgetall(
+        run(module, 'goes hgetall {}'.format(channel)))
@@ -0,0 +1,401 @@
+""" Continuous probe streams measuring outages across link flaps """
+
+#
+# This file is part of Ansible
+#
+# Ansible is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Ansible is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Ansible. If not, see <http://www.gnu.org/licenses/>.
+#
+
+import json
+import math
+import os
+import re
+import signal
+import subprocess
+import time
+
+from collections import namedtuple
+
+from ansible.module_utils.regtest_executor import split_command
+
+# Where the probes of a switch keep their output between module runs
+PROBE_DIR = '/tmp/regtest_probe'
+PROBE_STATE = 'probes.json'
+
+# [1525350896.123456] 64 bytes from 10.0.1.31: icmp_seq=7 ttl=64 time=0.041 ms
+_REPLY_RE = re.compile(
+    r'^\[(?P<stamp>\d+(?:\.\d+)?)\] \d+ bytes from .*icmp_[rs]eq=(?P<seq>\d+)'
+    r' .*time=(?P<rtt>\d+(?:\.\d+)?) ms')
+
+_TRANSMITTED_RE = re.compile(r'(?P<transmitted>\d+) packets transmitted')
+
+_SEQ_RANGE = 1 << 16
+
+# Seconds a probe may wait for its reply, ping -W
+REPLY_WAIT = 1
+
+Reply = namedtuple('Reply', 'seq stamp rtt')
+
+# One run of lost probes: start and end are the receive times of the
+# replies on either side of it, duration is the time without replies
+# beyond the probe interval, end is None while the outage lasts
+Outage = namedtuple('Outage', 'start end duration lost')
+
+
+def probe_cmd(address, rate=100, max_duration=3600, prefix=''):
+    """
+    Method to build the command of a probe stream: timestamped ICMP
+    echo requests at a fixed rate until interrupted.
+    :param address: IP address to probe.
+    :param rate: Probes per second; above 5 per second ping needs root.
+    :param max_duration: Seconds after which the probe stops by itself.
+    :param prefix: Optional command prefix, e.g. 'ip netns exec red '.
+    :return: Command string.
+    """
+    return '{}ping -D -i {} -W 1 -w {} {}'.format(
+        prefix, probe_interval(rate), int(max_duration), address)
+
+
+def probe_interval(rate):
+    """
+    Method to convert a probe rate into the interval between probes.
+    :param rate: Probes per second.
+    :return: Seconds, rounded to the millisecond ping supports.
+    """
+    return max(round(1.0 / max(rate, 1), 3), 0.001)
+
+
+class ProbeReport(object):
+    """
+    Replies of one probe stream and the outages found in it.
+    """
+
+    def __init__(self, address, interval, transmitted, replies, stopped=None):
+        """
+        :param address: Probed IP address.
+        :param interval: Seconds between probes.
+        :param transmitted: Number of probes sent.
+        :param replies: List of Reply, in sequence order.
+        :param stopped: Optional seconds since epoch the probe was stopped.
+        """
+        self.address = address
+        self.interval = interval
+        self.transmitted = transmitted
+        self.replies = replies
+        self.stopped = stopped
+        self.in_flight = self._find_in_flight()
+        self.outages = self._find_outages()
+
+    @property
+    def received(self):
+        return len(self.replies)
+
+    @property
+    def lost(self):
+        return max(self.transmitted - self.received - self.in_flight, 0)
+
+    def _find_in_flight(self):
+        """
+        Probes sent after the last reply whose replies may still have been
+        on the way when the probe was stopped: those sent less than
+        REPLY_WAIT before the stop, or without a stop time, the probes of
+        the last REPLY_WAIT seconds.
+        """
+        if not self.replies:
+            return 0
+
+        trailing = self.transmitted - self.replies[-1].seq
+        if trailing <= 0:
+            return 0
+
+        if self.stopped is not None:
+            silent = self.stopped - self.replies[-1].stamp
+            if silent > self.interval + REPLY_WAIT:
+                return min(trailing, int(math.ceil(REPLY_WAIT /
+                                                   self.interval)))
+            return trailing
+
+        return min(trailing, int(math.ceil(REPLY_WAIT / self.interval)))
+
+    def _find_outages(self):
+        outages = []
+
+        for before, after in zip(self.replies, self.replies[1:]):
+            lost = after.seq - before.seq - 1
+            if lost > 0:
+                duration = max(after.stamp - before.stamp - self.interval, 0)
+                outages.append(Outage(before.stamp, after.stamp, duration,
+                                      lost))
+
+        # Probes lost after the last reply, beyond those still in flight:
+        # the outage still lasts
+        if self.replies:
+            lost = self.transmitted - self.replies[-1].seq - self.in_flight
+            if lost > 0:
+                outages.append(Outage(self.replies[-1].stamp, None, None,
+                                      lost))
+
+        return outages
+
+    @property
+    def recovered(self):
+        """ True if replies came back after the last outage """
+        return bool(self.replies) and all(outage.end is not None
+                                          for outage in self.outages)
+
+    def recovery_time(self, mark):
+        """
+        Method to get how long it took for replies to come back after a
+        point in time, e.g. the end of the flapping.
+        :param mark: Seconds since epoch.
+        :return: Seconds from mark to the end of the outage lasting at
+            mark, 0 if there was none, None if the replies never came back.
+        """
+        for outage in self.outages:
+            if outage.start <= mark and (outage.end is None or
+                                         outage.end > mark):
+                if outage.end is None:
+                    return None
+                return outage.end - mark
+        return 0.0 if self.replies else None
+
+
+def parse_probe(address, out, interval, stopped=None):
+    """
+    Method to parse the output of a probe stream.
+    :param address: Probed IP address.
+    :param out: Output of probe_cmd().
+    :param interval: Seconds between probes.
+    :param stopped: Optional seconds since epoch the probe was stopped.
+    :return: ProbeReport.
+    """
+    replies = {}
+    transmitted = 0
+    wraps = last_seq = 0
+
+    for line in (out or '').splitlines():
+        match = _REPLY_RE.match(line.strip())
+        if match:
+            # icmp_seq is 16 bit and wraps in long streams
+            seq = int(match.group('seq'))
+            if seq < last_seq - _SEQ_RANGE // 2:
+                wraps += 1
+            last_seq = seq
+            seq += wraps * _SEQ_RANGE
+            replies[seq] = Reply(seq, float(match.group('stamp')),
+                                 float(match.group('rtt')))
+            continue
+
+        match = _TRANSMITTED_RE.search(line)
+        if match:
+            transmitted = int(match.group('transmitted'))
+
+    replies = [replies[seq] for seq in sorted(replies)]
+    if replies:
+        transmitted = max(transmitted, replies[-1].seq)
+
+    return ProbeReport(address, interval, transmitted, replies, stopped)
+
+
+class ProbeSet(object):
+    """
+    Probe streams running in the background on a switch, across several
+    module runs: started before the links are flapped and stopped, then
+    analyzed, after. Their pids and output files are kept in a state file.
+    """
+
+    def __init__(self, probe_dir=PROBE_DIR):
+        self.probe_dir = probe_dir
+        self.state_path = os.path.join(probe_dir, PROBE_STATE)
+        self.state = {'probes': {}, 'marks': []}
+        if os.path.exists(self.state_path):
+            try:
+                with open(self.state_path) as f:
+                    self.state = json.load(f)
+            except (IOError, ValueError):
+                pass
+
+    def save(self):
+        with open(self.state_path, 'w') as f:
+            json.dump(self.state, f)
+
+    def start(self, addresses, rate=100, max_duration=3600, prefix=''):
+        """
+        Method to start one probe stream per address, stopping any left
+        over from an earlier run first.
+        :param addresses: List of IP addresses.
+        :param rate: Probes per second.
+        :param max_duration: Seconds after which the probes stop by
+            themselves.
+        :param prefix: Optional command prefix.
+        :return: Dict of address to probe command.
+        """
+        self.stop()
+        if not os.path.isdir(self.probe_dir):
+            os.makedirs(self.probe_dir)
+
+        self.state = {'probes': {}, 'marks': [], 'started': time.time()}
+        for address in addresses:
+            cmd = probe_cmd(address, rate, max_duration, prefix)
+            out_path = os.path.join(self.probe_dir, address + '.out')
+            with open(out_path, 'wb') as out:
+                proc = subprocess.Popen(split_command(cmd), stdout=out,
+                                        stderr=subprocess.STDOUT,
+                                        close_fds=True,
+                                        preexec_fn=os.setsid)
+            self.state['probes'][address] = {
+                'pid': proc.pid, 'cmd': cmd, 'out': out_path,
+                'interval': probe_interval(rate)}
+
+        self.save()
+        return dict((address, probe['cmd'])
+                    for address, probe in self.state['probes'].items())
+
+    def mark(self, name):
+        """
+        Method to note a point in time of the test, e.g. the end of the
+        flapping, to measure recovery times from.
+        :param name: Name of the mark.
+        :return: Seconds since epoch.
+        """
+        now = time.time()
+        self.state.setdefault('marks', []).append([name, now])
+        self.save()
+        return now
+
+    def stop(self, timeout=5):
+        """
+        Method to interrupt the probe streams and parse their outputs.
+        :param timeout: Seconds to wait for each probe to print its
+            statistics and exit.
+        :return: List of (ProbeReport, output) tuples.
+        """
+        reports = []
+
+        for address, probe in sorted(self.state.get('probes', {}).items()):
+            stopped = time.time()
+            _interrupt(probe['pid'], timeout)
+            try:
+                with open(probe['out']) as f:
+                    out = f.read()
+                os.remove(probe['out'])
+            except (IOError, OSError):
+                out = ''
+            reports.append((parse_probe(address, out, probe['interval'],
+                                        stopped), out))
+
+        self.state['probes'] = {}
+        if os.path.isdir(self.probe_dir):
+            self.save()
+        return reports
+
+    def last_mark(self):
+        marks = self.state.get('marks') or []
+        return marks[-1][1] if marks else None
+
+
+def _alive(pid):
+    try:
+        # Reap the probe if it was started by this process
+        os.waitpid(pid, os.WNOHANG)
+    except OSError:
+        pass
+    try:
+        os.kill(pid, 0)
+    except OSError:
+        return False
+    return True
+
+
+def _interrupt(pid, timeout):
+    try:
+        os.kill(pid, signal.SIGINT)
+    except OSError:
+        return
+
+    deadline = time.time() + timeout
+    while _alive(pid) and time.time() < deadline:
+        time.sleep(0.1)
+
+    if _alive(pid):
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except OSError:
+            pass
+
+
+def probe_failures(switch_name, reports, mark=None, max_recovery_time=None):
+    """
+    Method to describe the probe streams which did not recover.
+    :param switch_name: Name of the switch the probes ran on.
+    :param reports: List of ProbeReport.
+    :param mark: Optional seconds since epoch recovery is measured from.
+    :param max_recovery_time: Optional highest recovery time in seconds.
+    :return: Failure summary, empty if all streams recovered in time.
+    """
+    failure_summary = ''
+
+    for report in reports:
+        if not report.recovered:
+            failure_summary += 'On switch {} '.format(switch_name)
+            failure_summary += 'no ping replies from {} '.format(
+                report.address)
+            failure_summary += 'since {} of {} probes were lost\n'.format(
+                report.outages[-1].lost if report.outages else
+                report.transmitted, report.transmitted)
+            continue
+
+        if mark is None or max_recovery_time is None:
+            continue
+        recovery = report.recovery_time(mark)
+        if recovery is not None and recovery > max_recovery_time:
+            failure_summary += 'On switch {} '.format(switch_name)
+            failure_summary += 'ping replies from {} came back '.format(
+                report.address)
+            failure_summary += '{:.3f}s after link flapping, '.format(recovery)
+            failure_summary += 'more than {}s\n'.format(max_recovery_time)
+
+    return failure_summary
+
+
+def record_probes(hash_dict, switch_name, reports, mark=None):
+    """
+    Method to store the outage numbers of each probe stream in the hash
+    dictionary, as result.probe.<switch>.<address>.<metric> keys, so they
+    are kept in the result hash in redis for comparison across builds.
+    :param hash_dict: Hash dictionary of the test module.
+    :param switch_name: Name of the switch the probes ran on.
+    :param reports: List of ProbeReport.
+    :param mark: Optional seconds since epoch recovery is measured from.
+    """
+    for report in reports:
+        prefix = 'result.probe.{}.{}.'.format(switch_name, report.address)
+        durations = [outage.duration for outage in report.outages
+                     if outage.duration is not None]
+
+        hash_dict[prefix + 'outages'] = len(report.outages)
+        hash_dict[prefix + 'packets_lost'] = report.lost
+        if durations:
+            hash_dict[prefix + 'outage_max_ms'] = '{:.1f}'.format(
+                max(durations) * 1000)
+            hash_dict[prefix + 'outage_avg_ms'] = '{:.1f}'.format(
+                sum(durations) * 1000 / len(durations))
+            hash_dict[prefix + 'outage_total_ms'] = '{:.1f}'.format(
+                sum(durations) * 1000)
+
+        if mark is not None:
+            recovery = report.recovery_time(mark)
+            if recovery is not None:
+                hash_dict[prefix + 'recovery_ms'] = '{:.1f}'.format(
+                    recovery * 1000)
@@ -0,0 +1,323 @@
+""" Minimal redis client and result store for the regression redis db """
+
+#
+# This file is part of Ansible
+#
+# Ansible is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Ansible is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Ansible. If not, see <http://www.gnu.org/licenses/>.
+#
+
+import json
+import socket
+import zlib
+
+RESULT_HOST = '127.0.0.1'
+RESULT_PORT = 9090
+
+# Fields which accumulate across switches/plays instead of being overwritten
+APPEND_FIELDS = ('result.detail', 'result.raw', 'result.raw.gz')
+STATUS_FIELD = 'result.status'
+
+# Hash holding the log offset registry of one switch
+LOG_OFFSETS_HASH = 'log.offsets.{switch_name}'
+
+# Applies all field updates of one test result atomically, in one round trip.
+# ARGV holds (op, field, value) triples; op is 'set', 'append' or 'status'.
+STORE_SCRIPT = """
+for i = 1, #ARGV, 3 do
+    local op, field, value = ARGV[i], ARGV[i + 1], ARGV[i + 2]
+    if op ~= 'set' then
+        local old = redis.call('HGET', KEYS[1], field) or ''
+        value = old .. value
+        if op == 'status' then
+            if string.find(value, 'Failed', 1, true) then
+                value = 'Failed'
+            else
+                value = 'Passed'
+            end
+        end
+    end
+    redis.call('HSET', KEYS[1], field, value)
+end
+return #ARGV / 3
+"""
+
+
+class RedisError(Exception):
+    """ Error reply from the redis server """
+    pass
+
+
+def to_bytes(value):
+    """
+    Method to encode a command argument for the wire.
+    :param value: Argument, bytes, text or number.
+    :return: Bytes.
+    """
+    if isinstance(value, bytes):
+        return value
+    if not isinstance(value, type(u'')):
+        value = u'{0}'.format(value)
+    return value.encode('utf-8')
+
+
+class RedisClient(object):
+    """
+    Speaks the redis protocol directly over one TCP connection, so arbitrary
+    (binary, multi-megabyte, quote-laden) values never go through a shell
+    command line and many commands can share one round trip.
+    """
+
+    def __init__(self, host=RESULT_HOST, port=RESULT_PORT, timeout=60):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self._sock = None
+        self._file = None
+
+    def connect(self):
+        if self._sock is None:
+            self._sock = socket.create_connection((self.host, self.port),
+                                                  self.timeout)
+            self._file = self._sock.makefile('rb')
+        return self
+
+    def close(self):
+        if self._sock is not None:
+            self._file.close()
+            self._sock.close()
+        self._sock = None
+        self._file = None
+
+    def __enter__(self):
+        return self.connect()
+
+    def __exit__(self, *args):
+        self.close()
+
+    @staticmethod
+    def encode(args):
+        """
+        Method to encode one command in the redis protocol.
+        :param args: Command name and arguments.
+        :return: Bytes.
+        """
+        out = [to_bytes('*{0}\r\n'.format(len(args)))]
+        for arg in args:
+            arg = to_bytes(arg)
+            out.append(to_bytes('${0}\r\n'.format(len(arg))))
+            out.append(arg)
+            out.append(b'\r\n')
+        return b''.join(out)
+
+    def _read_reply(self):
+        line = self._file.readline()
+        if not line:
+            raise RedisError('connection closed by server')
+
+        kind, rest = line[:1], line[1:-2]
+        if kind == b'+':
+            return rest
+        elif kind == b'-':
+            return RedisError(rest.decode('utf-8', 'replace'))
+        elif kind == b':':
+            return int(rest)
+        elif kind == b'$':
+            length = int(rest)
+            if length < 0:
+                return None
+            data = self._file.read(length + 2)
+            return data[:-2]
+        elif kind == b'*':
+            length = int(rest)
+            if length < 0:
+                return None
+            return [self._read_reply() for _ in range(length)]
+
+        raise RedisError('unexpected reply {0!r}'.format(line))
+
+    def pipeline(self, commands):
+        """
+        Method to send several commands in one write and read all replies.
+        :param commands: List of commands, each a list of arguments.
+        :return: List of replies; error replies are RedisError instances.
+        """
+        self.connect()
+        self._sock.sendall(b''.join(self.encode(cmd) for cmd in commands))
+        return [self._read_reply() for _ in commands]
+
+    def execute(self, *args):
+        """
+        Method to run a single command.
+        :param args: Command name and arguments.
+        :return: Reply of the command.
+        """
+        reply = self.pipeline([args])[0]
+        if isinstance(reply, RedisError):
+            raise reply
+        return reply
+
+
+def gzip_compress(data):
+    """
+    Method to gzip data. Gzip members can be concatenated, so compressed
+    chunks appended to the same field still decompress as one stream.
+    :param data: Bytes or text.
+    :return: Gzip compressed bytes.
+    """
+    compressor = zlib.compressobj(9, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(to_bytes(data)) + compressor.flush()
+
+
+def gzip_decompress(data):
+    """
+    Method to decompress (possibly multi-member) gzip data.
+    :param data: Gzip compressed bytes.
+    :return: Decompressed bytes.
+    """
+    out = []
+    while data:
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        out.append(decompressor.decompress(data))
+        data = decompressor.unused_data
+    return b''.join(out)
+
+
+class ResultStore(object):
+    """
+    Stores test results in the regression result hash.
+    """
+
+    def __init__(self, client=None):
+        self.client = client or RedisClient()
+
+    @staticmethod
+    def build_ops(hash_dict, raw=None, compress_raw=False):
+        """
+        Method to turn a test result into the (op, field, value) triples
+        understood by STORE_SCRIPT. Only result.* and *.time keys are stored.
+        :param hash_dict: Dict of key value pairs returned by a test module.
+        :param raw: Optional full log content for result.raw.
+        :param compress_raw: Store raw gzip compressed in result.raw.gz.
+        :return: Flat list of op, field, value.
+        """
+        ops = []
+
+        if raw is not None:
+            if compress_raw:
+                ops.extend(['append', 'result.raw.gz', gzip_compress(raw)])
+            else:
+                ops.extend(['append', 'result.raw', u'\n' + raw])
+
+        for key, value in (hash_dict or {}).items():
+            value = u'' if value is None else value
+            if key == STATUS_FIELD:
+                ops.extend(['status', key, value])
+            elif key in APPEND_FIELDS:
+                ops.extend(['append', key, u'\n{0}'.format(value)])
+            elif key.startswith('result.') or '.time' in key:
+                ops.extend(['set', key, value])
+
+        return ops
+
+    def store(self, hash_name, hash_dict, raw=None, compress_raw=False):
+        """
+        Method to store a test result with a single atomic script call.
+        :param hash_name: Name of the hash.
+        :param hash_dict: Dict of key value pairs returned by a test module.
+        :param raw: Optional full log content for result.raw.
+        :param compress_raw: Store raw gzip compressed in result.raw.gz.
+        :return: Number of fields written.
+        """
+        ops = self.build_ops(hash_dict, raw, compress_raw)
+        if not ops:
+            return 0
+
+        with self.client:
+            return self.client.execute('EVAL', STORE_SCRIPT, 1, hash_name,
+                                       *ops)
+
+    def load(self, hash_names):
+        """
+        Method to read several result hashes in one round trip.
+        :param hash_names: List of hash names.
+        :return: List of dicts of field to value, one per hash, in order.
+        """
+        if not hash_names:
+            return []
+
+        with self.client:
+            replies = self.client.pipeline(
+                [('HGETALL', hash_name) for hash_name in hash_names])
+
+        results = []
+        for reply in replies:
+            if isinstance(reply, RedisError):
+                raise reply
+            reply = reply or []
+            results.append(dict(
+                (reply[i].decode('utf-8', 'replace'),
+                 reply[i + 1].decode('utf-8', 'replace'))
+                for i in range(0, len(reply), 2)))
+        return results
+
+
+class LogOffsetStore(object):
+    """
+    Per-switch registry, in the result redis, of where each watched log
+    file ended at the last check. One hash per switch, one JSON encoded
+    field per consumer and log file, e.g. check_core_dump:/var/log/syslog.
+    """
+
+    def __init__(self, client=None):
+        self.client = client or RedisClient()
+
+    def load(self, switch_name):
+        """
+        Method to read the offsets of a switch.
+        :param switch_name: Name of the switch.
+        :return: Dict of offset key to offset entry.
+        """
+        with self.client:
+            reply = self.client.execute(
+                'HGETALL', LOG_OFFSETS_HASH.format(switch_name=switch_name))
+
+        offsets = {}
+        reply = reply or []
+        for i in range(0, len(reply), 2):
+            try:
+                offsets[reply[i].decode('utf-8', 'replace')] = json.loads(
+                    reply[i + 1].decode('utf-8', 'replace'))
+            except ValueError:
+                continue
+        return offsets
+
+    def store(self, switch_name, offsets):
+        """
+        Method to record the offsets of a switch.
+        :param switch_name: Name of the switch.
+        :param offsets: Dict of offset key to offset entry.
+        :return: Number of log files recorded.
+        """
+        if not offsets:
+            return 0
+
+        args = []
+        for path, entry in offsets.items():
+            args.extend([path, json.dumps(entry, sort_keys=True)])
+
+        with self.client:
+            self.client.execute(
+                'HMSET', LOG_OFFSETS_HASH.format(switch_name=switch_name),
+                *args)
+        return len(offsets)
@@ -0,0 +1,209 @@
+""" Route table index for verifying large ipv4 route dumps """
+
+#
+# This file is part of Ansible
+#
+# Ansible is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Ansible is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Ansible. If not, see <http://www.gnu.org/licenses/>.
+#
+
+import re
+import socket
+import struct
+
+# Route type keywords which may precede the prefix in `ip route show`
+_LINUX_TYPES = ('unicast', 'local', 'broadcast', 'multicast', 'anycast',
+                'blackhole', 'unreachable', 'prohibit', 'throw', 'nat')
+
+# Matches the destination of one route line of either
+#   `ip route show`           1.1.1.1 via 10.0.1.31 dev xeth1
+#   `vtysh -c 'show ip route'` K>* 1.1.1.1/32 via 10.0.1.31, xeth1
+#   `birdc show route`        1.1.1.1/32 via 10.0.1.31 on xeth1 [static1 ..]
+# Nexthop continuation lines start with whitespace and are skipped.
+_ROUTE_RE = re.compile(
+    r'^(?:[A-Za-z][>*]*\s+|(?:' + '|'.join(_LINUX_TYPES) + r')\s+)?'
+    r'(default|\d{1,3}(?:\.\d{1,3}){3}(?:/\d{1,2})?)(?=[\s,]|$)')
+
+
+def parse_prefix(prefix):
+    """
+    Method to convert a prefix string into its integer form.
+    A bare address is a host route, 'default' is 0.0.0.0/0. Host bits
+    are masked off, so '10.0.1.5/24' and '10.0.1.0/24' are the same route.
+    :param prefix: Prefix string, e.g. '1.1.1.1', '10.0.1.0/24'.
+    :return: Tuple of (network as int, prefix length).
+    """
+    if prefix == 'default':
+        return 0, 0
+
+    address, _, length = prefix.partition('/')
+    length = int(length) if length else 32
+    if not 0 <= length <= 32:
+        raise ValueError('invalid prefix length in {0}'.format(prefix))
+
+    network = struct.unpack('!I', socket.inet_aton(address))[0]
+    mask = (0xffffffff << (32 - length)) & 0xffffffff
+    return network & mask, length
+
+
+def format_prefix(route):
+    """
+    Method to convert an integer route back into a prefix string.
+    Host routes are written without the /32, as in the test summaries.
+    :param route: Tuple of (network as int, prefix length).
+    :return: Prefix string.
+    """
+    network, length = route
+    address = socket.inet_ntoa(struct.pack('!I', network))
+    return address if length == 32 else '{0}/{1}'.format(address, length)
+
+
+def parse_routes(text):
+    """
+    Method to extract the destination prefixes from a route dump.
+    :param text: Output of `ip route show` or a routing daemon's
+        `show ip route`.
+    :return: Generator of (network as int, prefix length) tuples.
+    """
+    for line in text.splitlines():
+        match = _ROUTE_RE.match(line)
+        if match:
+            try:
+                yield parse_prefix(match.group(1))
+            except (ValueError, socket.error):
+                continue
+
+
+class RouteTable(object):
+    """
+    Set of ipv4 routes indexed by prefix length.
+
+    Membership is an exact (network, length) lookup, so '1.1.1.1' never
+    matches '1.1.1.10' as a substring search would, and longest prefix
+    match takes at most 33 set lookups whatever the size of the table.
+    """
+
+    def __init__(self, routes=()):
+        self.by_length = {}
+        for route in routes:
+            self.add(route)
+
+    @classmethod
+    def from_files(cls, *paths):
+        """
+        Method to build one table from several route dump files.
+        :param paths: Paths of the route dump files.
+        :return: RouteTable instance.
+        """
+        table = cls()
+        for path in paths:
+            with open(path) as dump:
+                for route in parse_routes(dump.read()):
+                    table.add(route)
+        return table
+
+    def add(self, route):
+        """
+        Method to add a route to the table.
+        :param route: Prefix string or (network, length) tuple.
+        """
+        if not isinstance(route, tuple):
+            route = parse_prefix(route)
+        network, length = route
+        self.by_length.setdefault(length, set()).add(network)
+
+    def __contains__(self, route):
+        if not isinstance(route, tuple):
+            route = parse_prefix(route)
+        network, length = route
+        return network in self.by_length.get(length, ())
+
+    def __iter__(self):
+        for length in sorted(self.by_length):
+            for network in sorted(self.by_length[length]):
+                yield network, length
+
+    def __len__(self):
+        return sum(len(networks) for networks in self.by_length.values())
+
+    def lookup(self, address):
+        """
+        Method to find the longest prefix covering an address.
+        :param address: Address string, e.g. '1.1.1.10'.
+        :return: (network, length) tuple of the matching route, or None.
+        """
+        network = parse_prefix(address)[0]
+        for length in sorted(self.by_length, reverse=True):
+            mask = (0xffffffff << (32 - length)) & 0xffffffff
+            if network & mask in self.by_length[length]:
+                return network & mask, length
+        return None
+
+    def within(self, scope):
+        """
+        Method to get the routes of the table inside a prefix.
+        :param scope: Prefix string, e.g. '1.1.0.0/16'.
+        :return: RouteTable of the routes as long as or longer than scope
+            and covered by it.
+        """
+        scope_network, scope_length = parse_prefix(scope)
+        scope_mask = (0xffffffff << (32 - scope_length)) & 0xffffffff
+        return RouteTable((network, length) for network, length in self
+                          if length >= scope_length and
+                          network & scope_mask == scope_network)
+
+    def diff(self, expected, scope=None):
+        """
+        Method to compare the table against the expected routes.
+        :param expected: Iterable of prefix strings or (network, length)
+            tuples that must be present.
+        :param scope: Optional prefix string; only routes inside it count
+            as extra, so connected and default routes are not reported.
+        :return: Tuple of (missing, extra) sorted lists of prefix strings.
+        """
+        expected = RouteTable(expected)
+
+        missing = [route for route in expected if route not in self]
+        extra = [route for route in self if route not in expected]
+
+        if scope is not None:
+            extra = list(RouteTable(extra).within(scope))
+
+        return ([format_prefix(route) for route in missing],
+                [format_prefix(route) for route in extra])
+
+
+def scale_routes(octet, total=16000, block=1000):
+    """
+    Method to generate the host routes configured by the static 16k routes
+    interfaces files: '<octet>.<octet>.<i>.<j>', i and j counting from 1,
+    where the count restarts at every block of routes with the next i.
+    :param octet: First and second octet of the routes.
+    :param total: Number of routes to generate.
+    :param block: Number of routes per block.
+    :return: List of host route strings, in file order.
+    """
+    routes = []
+    count = 0
+
+    for i in range(1, 256):
+        for j in range(1, 256):
+            if len(routes) >= total:
+                return routes
+            if count >= block:
+                count = 0
+                break
+            routes.append('{0}.{0}.{1}.{2}'.format(octet, i, j))
+            count += 1
+
+    return routes
@@ -0,0 +1,406 @@
+""" Concurrent iperf traffic runner and report parser for test modules """
+
+#
+# This file is part of Ansible
+#
+# Ansible is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Ansible is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Ansible. If not, see <http://www.gnu.org/licenses/>.
+#
+
+import json
+import re
+import subprocess
+import threading
+
+from ansible.module_utils.regtest_executor import split_command
+
+# iperf reports rates in powers of 1000 and amounts in powers of 1024
+_RATE_UNITS = {'': 1, 'K': 1e3, 'M': 1e6, 'G': 1e9, 'T': 1e12}
+_SIZE_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3,
+               'T': 1024 ** 4}
+
+# [  3]  0.0- 2.0 sec  2.19 GBytes  9.41 Gbits/sec   0.017 ms    0/  893 (0%)
+_REPORT_RE = re.compile(
+    r'^\[\s*(?P<id>\w+)\]\s+(?P<start>\d+(?:\.\d+)?)\s*-\s*'
+    r'(?P<end>\d+(?:\.\d+)?)\s+sec\s+'
+    r'(?P<size>\d+(?:\.\d+)?)\s+(?P<size_unit>[KMGT]?)Bytes\s+'
+    r'(?P<rate>\d+(?:\.\d+)?)\s+(?P<rate_unit>[KMGT]?)bits/sec'
+    r'(?P<rest>.*)$')
+
+# UDP datagram statistics following the bandwidth: jitter, lost/total
+_UDP_RE = re.compile(
+    r'(?P<jitter>\d+(?:\.\d+)?)\s+ms\s+(?P<lost>\d+)\s*/\s*(?P<total>\d+)')
+
+# TCP statistics of `iperf -e` following the bandwidth: Write/Err Rtry
+_RETRY_RE = re.compile(r'^\s*\d+/\d+\s+(?P<retransmits>\d+)\b')
+
+# Port speed as in vnet.xethN.speed, e.g. '100g', '25g', '1000' (Mbit/s)
+_SPEED_RE = re.compile(r'^(?P<value>\d+(?:\.\d+)?)\s*(?P<unit>[kmgt]?)',
+                       re.IGNORECASE)
+
+
+class IperfReport(object):
+    """
+    Summary of one iperf client run.
+    """
+
+    def __init__(self, transfer, bits_per_second, duration, jitter=None,
+                 lost=None, total=None, retransmits=None, intervals=None):
+        """
+        :param transfer: Bytes transferred.
+        :param bits_per_second: Average bandwidth.
+        :param duration: Length of the run in seconds.
+        :param jitter: UDP jitter in milliseconds, None for TCP.
+        :param lost: UDP datagrams lost, None for TCP.
+        :param total: UDP datagrams sent, None for TCP.
+        :param retransmits: TCP retransmits, None if not reported.
+        :param intervals: List of (start, end, bits_per_second) samples.
+        """
+        self.transfer = transfer
+        self.bits_per_second = bits_per_second
+        self.duration = duration
+        self.jitter = jitter
+        self.lost = lost
+        self.total = total
+        self.retransmits = retransmits
+        self.intervals = intervals or []
+
+    @property
+    def loss(self):
+        """ UDP datagram loss in percent, None for TCP """
+        if not self.total:
+            return None
+        return 100.0 * self.lost / self.total
+
+    def __repr__(self):
+        return 'IperfReport({0:.0f} bits/sec, {1} bytes, {2}s)'.format(
+            self.bits_per_second, self.transfer, self.duration)
+
+
+def parse_iperf(out):
+    """
+    Method to parse the report of an iperf or iperf3 (-J) client.
+    :param out: Output of the iperf client.
+    :return: IperfReport, or None if the output holds no report.
+    """
+    out = (out or '').strip()
+    if out.startswith('{'):
+        return parse_iperf3_json(out)
+    return parse_iperf2(out)
+
+
+def parse_iperf2(out):
+    """
+    Method to parse the text report of an iperf client.
+    The summary is the report spanning the whole run, the [SUM] line
+    when several parallel streams were used; shorter spans of the same
+    stream (iperf -i) are the interval samples.
+    :param out: Output of the iperf client.
+    :return: IperfReport, or None if the output holds no report.
+    """
+    summary, summary_key = None, None
+    samples = []
+
+    for line in (out or '').splitlines():
+        match = _REPORT_RE.match(line.strip())
+        if not match:
+            continue
+
+        start, end = float(match.group('start')), float(match.group('end'))
+        bits_per_second = (float(match.group('rate')) *
+                           _RATE_UNITS[match.group('rate_unit')])
+        samples.append((match.group('id'), start, end, bits_per_second))
+        if start != 0:
+            continue
+
+        report = IperfReport(
+            transfer=int(float(match.group('size')) *
+                         _SIZE_UNITS[match.group('size_unit')]),
+            bits_per_second=bits_per_second,
+            duration=end)
+
+        udp = _UDP_RE.search(match.group('rest'))
+        if udp:
+            report.jitter = float(udp.group('jitter'))
+            report.lost = int(udp.group('lost'))
+            report.total = int(udp.group('total'))
+
+        retry = _RETRY_RE.match(match.group('rest'))
+        if retry:
+            report.retransmits = int(retry.group('retransmits'))
+
+        # Prefer the longest span, then [SUM] over single streams; later
+        # lines for the same span (the server report of a UDP run) carry
+        # the loss figures and supersede the client line
+        key = (end, match.group('id') == 'SUM')
+        if summary is None or key >= summary_key:
+            summary, summary_key = report, key
+
+    if summary is not None:
+        stream = 'SUM' if summary_key[1] else None
+        summary.intervals = [
+            (start, end, bits_per_second)
+            for sid, start, end, bits_per_second in samples
+            if (stream is None or sid == stream) and
+            not (start == 0 and end == summary.duration)]
+
+    return summary
+
+
+def parse_iperf3_json(out):
+    """
+    Method to parse the JSON report of an iperf3 -J client.
+    For TCP the received side gives the bandwidth and the sent side the
+    retransmits; for UDP the sum holds jitter and loss.
+    :param out: Output of the iperf3 client.
+    :return: IperfReport, or None if the output holds no report.
+    """
+    try:
+        data = json.loads(out)
+        end = data['end']
+    except (ValueError, KeyError, TypeError):
+        return None
+
+    if 'sum_sent' in end:
+        sent = end['sum_sent']
+        received = end.get('sum_received') or sent
+        report = IperfReport(
+            transfer=int(received['bytes']),
+            bits_per_second=float(received['bits_per_second']),
+            duration=float(received['end']) - float(received['start']),
+            retransmits=sent.get('retransmits'))
+    elif 'sum' in end:
+        total = end['sum']
+        report = IperfReport(
+            transfer=int(total['bytes']),
+            bits_per_second=float(total['bits_per_second']),
+            duration=float(total['end']) - float(total['start']),
+            jitter=total.get('jitter_ms'),
+            lost=total.get('lost_packets'),
+            total=total.get('packets'))
+    else:
+        return None
+
+    report.intervals = [
+        (float(interval['sum']['start']), float(interval['sum']['end']),
+         float(interval['sum']['bits_per_second']))
+        for interval in data.get('intervals', []) if 'sum' in interval]
+
+    return report
+
+
+def parse_speed(speed):
+    """
+    Method to convert a port speed into bits per second.
+    :param speed: Speed as in vnet.xethN.speed, e.g. '100g'; a bare number
+        is in Mbit/s, as reported by ethtool.
+    :return: Bits per second, or None for 'auto' or unknown values.
+    """
+    match = _SPEED_RE.match((speed or '').strip())
+    if not match:
+        return None
+
+    unit = match.group('unit').upper()
+    return float(match.group('value')) * (_RATE_UNITS[unit] if unit else 1e6)
+
+
+def iperf_client_cmd(server, duration=2, port=None, parallel=1,
+                     program='iperf'):
+    """
+    Method to build an iperf client command line.
+    :param server: IP address of the iperf server.
+    :param duration: Length of the run in seconds.
+    :param port: Server port, None for the iperf default.
+    :param parallel: Number of parallel client streams.
+    :param program: 'iperf' or 'iperf3'; iperf3 reports in JSON.
+    :return: Command string.
+    """
+    cmd = '{} -c {} -t {}'.format(program, server, duration)
+    if port is not None:
+        cmd += ' -p {}'.format(port)
+    cmd += ' -P {}'.format(parallel)
+    if program == 'iperf3':
+        cmd += ' -J'
+    return cmd
+
+
+class TrafficSession(object):
+    """
+    One iperf client run towards one port and its outcome.
+    """
+
+    def __init__(self, name, cmd, min_bits_per_second=None):
+        """
+        :param name: Name of the port under test, e.g. 'xeth1-2'.
+        :param cmd: iperf client command line.
+        :param min_bits_per_second: Optional minimum bandwidth to pass.
+        """
+        self.name = name
+        self.cmd = cmd
+        self.min_bits_per_second = min_bits_per_second
+        self.out = None
+        self.report = None
+        self.skipped = False
+
+    @property
+    def passed(self):
+        """ True if the run produced a report with enough traffic """
+        if self.report is None or self.report.bits_per_second <= 0:
+            return False
+        return (self.min_bits_per_second is None or
+                self.report.bits_per_second >= self.min_bits_per_second)
+
+
+class TrafficRunner(object):
+    """
+    Runs iperf client sessions concurrently, at most max_sessions at a
+    time, so every link under test carries traffic at once instead of one
+    port after the other.
+
+    Each client is its own process; the shared shell session of
+    regtest_executor runs one command at a time and cannot be used here.
+    """
+
+    def __init__(self, executor=None, max_sessions=8, stop_on_failure=False):
+        """
+        :param executor: Optional CommandExecutor in which each command and
+            its output are recorded as the session completes.
+        :param max_sessions: Maximum number of concurrent clients.
+        :param stop_on_failure: Do not start further sessions once one has
+            failed; those are marked skipped.
+        """
+        self.executor = executor
+        self.max_sessions = max(1, max_sessions)
+        self.stop_on_failure = stop_on_failure
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _run(cmd):
+        try:
+            proc = subprocess.Popen(split_command(cmd),
+                                    stdout=subprocess.PIPE,
+                                    stderr=subprocess.STDOUT,
+                                    close_fds=True)
+        except OSError as err:
+            return str(err)
+
+        out = proc.communicate()[0]
+        return out.decode('utf-8', 'replace').rstrip()
+
+    def run(self, module, sessions):
+        """
+        Method to run all sessions and parse their reports.
+        :param module: The Ansible module to fetch input parameters.
+        :param sessions: List of TrafficSession.
+        :return: The same list, with out and report filled in.
+        """
+        pending = list(sessions)
+        failed = threading.Event()
+
+        def worker():
+            while True:
+                with self._lock:
+                    if not pending:
+                        return
+                    session = pending.pop(0)
+                    if failed.is_set():
+                        session.skipped = True
+                        continue
+
+                session.out = self._run(session.cmd)
+                session.report = parse_iperf(session.out)
+
+                with self._lock:
+                    if self.executor is not None:
+                        self.executor.record(module, session.cmd, session.out)
+                    if not session.passed and self.stop_on_failure:
+                        failed.set()
+
+        threads = [threading.Thread(target=worker)
+                   for _ in range(min(self.max_sessions, len(pending)))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        return sessions
+
+
+def apply_speed_threshold(sessions, port_table, fraction):
+    """
+    Method to require each session to reach a fraction of the provisioned
+    speed of its port.
+    :param sessions: List of TrafficSession, named after their ports.
+    :param port_table: PortTable holding vnet.<port>.speed.
+    :param fraction: Minimum fraction of the port speed, e.g. 0.5.
+    """
+    for session in sessions:
+        speed = parse_speed(port_table.get(session.name).speed)
+        if speed and fraction:
+            session.min_bits_per_second = speed * fraction
+
+
+def traffic_failures(switch_name, sessions):
+    """
+    Method to describe the sessions which did not pass.
+    :param switch_name: Name of the switch the clients ran on.
+    :param sessions: List of TrafficSession, after TrafficRunner.run().
+    :return: Failure summary, empty if all sessions passed.
+    """
+    failure_summary = ''
+
+    for session in sessions:
+        if session.passed:
+            continue
+
+        failure_summary += 'On switch {} '.format(switch_name)
+        if session.skipped:
+            failure_summary += 'iperf traffic not run for {} '.format(
+                session.name)
+            failure_summary += 'since an earlier session failed\n'
+        elif session.report is None or session.report.bits_per_second <= 0:
+            failure_summary += 'iperf traffic cannot be verified for '
+            failure_summary += '{} using command {}\n'.format(session.name,
+                                                              session.cmd)
+        else:
+            failure_summary += 'iperf traffic on {} is {:.0f} bits/sec, '.format(
+                session.name, session.report.bits_per_second)
+            failure_summary += 'below the minimum of {:.0f} bits/sec\n'.format(
+                session.min_bits_per_second)
+
+    return failure_summary
+
+
+def record_traffic(hash_dict, switch_name, sessions):
+    """
+    Method to store the measured numbers of each session in the hash
+    dictionary, as result.traffic.<switch>.<port>.<metric> keys, so they
+    are kept in the result hash in redis for comparison across builds.
+    :param hash_dict: Hash dictionary of the test module.
+    :param switch_name: Name of the switch the clients ran on.
+    :param sessions: List of TrafficSession, after TrafficRunner.run().
+    """
+    for session in sessions:
+        report = session.report
+        if report is None:
+            continue
+
+        prefix = 'result.traffic.{}.{}.'.format(switch_name, session.name)
+        hash_dict[prefix + 'bits_per_second'] = '{:.0f}'.format(
+            report.bits_per_second)
+        if report.retransmits is not None:
+            hash_dict[prefix + 'retransmits'] = report.retransmits
+        if report.jitter is not None:
+            hash_dict[prefix + 'jitter_ms'] = report.jitter
+        if report.loss is not None:
+            hash_dict[prefix + 'loss_percent'] = '{:.2f}'.format(report.loss)
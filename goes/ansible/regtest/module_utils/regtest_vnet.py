@@ -0,0 +1,447 @@
+""" Parsers and snapshot cache for `goes vnet show` outputs """
+
+#
+# This file is part of Ansible
+#
+# Ansible is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Ansible is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Ansible. If not, see <http://www.gnu.org/licenses/>.
+#
+
+import re
+import socket
+
+from collections import OrderedDict
+
+from ansible.module_utils.regtest_routes import parse_prefix
+
+FIB_CMD = 'goes vnet show ip fib'
+FIB_SUMMARY_CMD = 'goes vnet show ip fib sum'
+HW_INTERFACES_CMD = 'goes vnet show ha'
+TCAM_CMD = 'goes vnet show fe1 tcam'
+
+_IPV4 = r'\d{1,3}(?:\.\d{1,3}){3}'
+
+# First line of a fib route:
+#      default                  10.15.0.4/32      11: rewrite xeth1 IP4: ...
+_FIB_ROUTE_RE = re.compile(
+    r'^\s*(?P<table>\S+)\s+(?P<prefix>' + _IPV4 + r'/\d{1,2})(?:\s+(?P<adj>.*))?$')
+
+# Adjacency of a route, on its first line or a next hop continuation line:
+#   11: rewrite xeth1 IP4: 02:46:8a:00:02:a3 -> 02:46:8a:00:01:97
+_ADJ_RE = re.compile(r'^\s*(?P<index>\d+):\s+(?P<kind>\S+)(?:\s+(?P<intf>\S+))?')
+
+# Row of `show ip fib sum`:        default       1523
+_FIB_SUMMARY_RE = re.compile(r'^\s*(?P<table>\S+)\s+(?P<routes>\d+)\s*$')
+
+_ADJ_USAGE_RE = re.compile(r'Adjacencies:\s+heap\s+(\d+)\s+used,\s+(\d+)\s+free')
+
+# Counter columns at the end of a `show hardware-interfaces` row:
+#   xeth1   platina-mk1   ...   up   port rx packets   1234   1.23e+01
+_HW_COUNTER_RE = re.compile(
+    r'(?:^|\s{2,})(?P<counter>\S+(?: \S+)*)\s+(?P<count>\d+)\s+'
+    r'(?P<rate>[-+.\deE]+|NaN|[-+]?Inf)\s*$')
+
+_TCAM_ADDRESS_RE = re.compile(r'(?<![\d.])(' + _IPV4 + r')(?:/(\d{1,2}))?(?![\d.])')
+
+_PIPE_RE = re.compile(r'\bpipe\s*(\d+)', re.IGNORECASE)
+
+
+class Adjacency(object):
+    """
+    One next hop adjacency of a fib route.
+    """
+
+    def __init__(self, index, kind, interface=None, text=''):
+        self.index = index
+        self.kind = kind
+        self.interface = interface
+        self.text = text
+
+    def __repr__(self):
+        return 'Adjacency({0!r}, {1!r}, {2!r})'.format(self.index, self.kind,
+                                                     self.interface)
+
+
+class FibEntry(object):
+    """
+    One route of `goes vnet show ip fib`, with all its next hops.
+    """
+
+    def __init__(self, table, prefix):
+        self.table = table
+        self.prefix = prefix
+        self.route = parse_prefix(prefix)
+        self.adjacencies = []
+        self.lines = []
+
+    @property
+    def address(self):
+        return self.prefix.partition('/')[0]
+
+    @property
+    def interfaces(self):
+        return [adj.interface for adj in self.adjacencies if adj.interface]
+
+    @property
+    def kinds(self):
+        return [adj.kind for adj in self.adjacencies]
+
+    @property
+    def is_drop(self):
+        """ True if any next hop of the route drops the traffic """
+        return any('drop' in kind.lower() for kind in self.kinds)
+
+    @property
+    def text(self):
+        return '\n'.join(self.lines)
+
+    def __repr__(self):
+        return 'FibEntry({0!r}, {1!r}, {2!r})'.format(self.table, self.prefix,
+                                                    self.adjacencies)
+
+
+def parse_fib(out):
+    """
+    Method to parse the output of `goes vnet show ip fib`.
+    Continuation lines (more next hops, adjacency counters) are attached
+    to the route above them.
+    :param out: Output of the fib command.
+    :return: List of FibEntry, in output order.
+    """
+    entries = []
+    entry = None
+
+    for line in (out or '').splitlines():
+        match = _FIB_ROUTE_RE.match(line)
+        if match:
+            try:
+                entry = FibEntry(match.group('table'), match.group('prefix'))
+            except (ValueError, socket.error):
+                entry = None
+                continue
+            entries.append(entry)
+            adj_text = match.group('adj') or ''
+        elif entry is not None and line.strip():
+            adj_text = line
+        else:
+            continue
+
+        entry.lines.append(line.strip())
+        adj = _ADJ_RE.match(adj_text)
+        if adj:
+            entry.adjacencies.append(Adjacency(
+                int(adj.group('index')), adj.group('kind'),
+                adj.group('intf'), adj_text.strip()))
+        elif adj_text.strip().startswith('unreachable'):
+            entry.adjacencies.append(Adjacency(None, 'unreachable', None,
+                                               adj_text.strip()))
+
+    return entries
+
+
+class FibTable(object):
+    """
+    Index of the fib routes of all tables by route and by interface.
+    """
+
+    def __init__(self, entries=()):
+        self.entries = list(entries)
+        self.by_route = {}
+        self.by_address = {}
+        self.by_interface = {}
+
+        for entry in self.entries:
+            self.by_route.setdefault(entry.route, []).append(entry)
+            self.by_address.setdefault(entry.address, []).append(entry)
+            for interface in set(entry.interfaces):
+                self.by_interface.setdefault(interface, []).append(entry)
+
+    @classmethod
+    def from_output(cls, out):
+        """
+        Method to build the table from `goes vnet show ip fib` output.
+        :param out: Output of the fib command.
+        :return: FibTable instance.
+        """
+        return cls(parse_fib(out))
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, prefix):
+        return bool(self.lookup(prefix))
+
+    def lookup(self, prefix, table=None):
+        """
+        Method to get the routes for an exact prefix.
+        :param prefix: Prefix string, a bare address is a host route.
+        :param table: Optional fib table name, e.g. 'default'.
+        :return: List of FibEntry, one per table holding the route.
+        """
+        entries = self.by_route.get(parse_prefix(prefix), [])
+        return [e for e in entries if table is None or e.table == table]
+
+    def find(self, address, interface=None):
+        """
+        Method to get the routes whose destination address is the given
+        one, whatever their prefix length.
+        :param address: Address string, e.g. '192.168.120.5'.
+        :param interface: Optional interface the route must go out of.
+        :return: List of FibEntry.
+        """
+        entries = self.by_address.get(address, [])
+        return [e for e in entries
+                if interface is None or interface in e.interfaces]
+
+    def via(self, interface, kind=None):
+        """
+        Method to get the routes with a next hop on an interface.
+        :param interface: Interface name, e.g. 'xeth1'.
+        :param kind: Optional adjacency kind, e.g. 'rewrite'.
+        :return: List of FibEntry.
+        """
+        entries = self.by_interface.get(interface, [])
+        if kind is None:
+            return list(entries)
+        return [e for e in entries
+                if any(adj.interface == interface and adj.kind == kind
+                       for adj in e.adjacencies)]
+
+    def tables(self):
+        return sorted(set(entry.table for entry in self.entries))
+
+
+class FibSummary(object):
+    """
+    Route counts per fib table and adjacency heap usage, from
+    `goes vnet show ip fib sum`.
+    """
+
+    def __init__(self):
+        self.routes = OrderedDict()
+        self.adjacencies_used = None
+        self.adjacencies_free = None
+        self.other = []
+
+    @classmethod
+    def from_output(cls, out):
+        """
+        Method to parse `goes vnet show ip fib sum` output.
+        :param out: Output of the fib summary command.
+        :return: FibSummary instance.
+        """
+        summary = cls()
+
+        for line in (out or '').splitlines():
+            usage = _ADJ_USAGE_RE.search(line)
+            row = _FIB_SUMMARY_RE.match(line)
+            if usage:
+                summary.adjacencies_used = int(usage.group(1))
+                summary.adjacencies_free = int(usage.group(2))
+            elif row:
+                summary.routes[row.group('table')] = int(row.group('routes'))
+            elif line.strip() and not line.split()[0] == 'Table':
+                summary.other.append(line.strip())
+
+        return summary
+
+    @property
+    def total(self):
+        return sum(self.routes.values())
+
+    def __contains__(self, table):
+        return table in self.routes
+
+
+class HwInterface(object):
+    """
+    Counters of one interface of `goes vnet show hardware-interfaces`.
+    Counter names are lower cased; counters that are zero are not shown by
+    goes and so read as 0.
+    """
+
+    def __init__(self, name, link=None):
+        self.name = name
+        self.link = link
+        self.counters = OrderedDict()
+
+    def counter(self, name, default=0):
+        """
+        Method to get a counter value.
+        :param name: Counter name, e.g. 'port rx packets'.
+        :param default: Value of counters not in the output.
+        :return: Counter value as int.
+        """
+        return self.counters.get(name.lower(), default)
+
+    def __repr__(self):
+        return 'HwInterface({0!r}, {1!r})'.format(self.name, self.counters)
+
+
+def parse_hw_interfaces(out):
+    """
+    Method to parse the output of `goes vnet show ha`.
+    :param out: Output of the hardware interfaces command.
+    :return: OrderedDict of interface name to HwInterface.
+    """
+    interfaces = OrderedDict()
+    interface = None
+
+    for line in (out or '').splitlines():
+        if not line.strip():
+            continue
+
+        counter = _HW_COUNTER_RE.search(line)
+        head = line[:counter.start()] if counter else line
+
+        if not line[0].isspace():
+            fields = head.split()
+            if not fields or fields[0] == 'Name':
+                interface = None
+                continue
+            link = fields[-1] if fields[-1] in ('up', 'down') else None
+            interface = HwInterface(fields[0], link)
+            interfaces[interface.name] = interface
+
+        if counter and interface is not None:
+            interface.counters[counter.group('counter').lower()] = int(
+                counter.group('count'))
+
+    return interfaces
+
+
+class TcamEntry(object):
+    """
+    One line of `goes vnet show fe1 tcam` holding an ipv4 address.
+    """
+
+    def __init__(self, address, length, pipe, text):
+        self.address = address
+        self.length = length
+        self.pipe = pipe
+        self.text = text
+
+    @property
+    def is_drop(self):
+        return 'drop' in self.text.lower()
+
+    def __repr__(self):
+        return 'TcamEntry({0!r}, {1!r}, {2!r})'.format(self.address,
+                                                     self.length, self.pipe)
+
+
+class TcamTable(object):
+    """
+    Index of the fe1 tcam entries by address. The same route is expected
+    once per pipeline.
+    """
+
+    def __init__(self, entries=()):
+        self.entries = list(entries)
+        self.by_address = {}
+        for entry in self.entries:
+            self.by_address.setdefault(entry.address, []).append(entry)
+
+    @classmethod
+    def from_output(cls, out):
+        """
+        Method to parse `goes vnet show fe1 tcam` output. Each line holding
+        an ipv4 address is an entry for its first address; the pipeline is
+        taken from the last 'pipe N' header or field seen.
+        :param out: Output of the tcam command.
+        :return: TcamTable instance.
+        """
+        entries = []
+        pipe = None
+
+        for line in (out or '').splitlines():
+            pipe_match = _PIPE_RE.search(line)
+            if pipe_match:
+                pipe = int(pipe_match.group(1))
+
+            match = _TCAM_ADDRESS_RE.search(line)
+            if match:
+                length = match.group(2)
+                entries.append(TcamEntry(match.group(1),
+                                         int(length) if length else None,
+                                         pipe, line.strip()))
+
+        return cls(entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def find(self, address):
+        """
+        Method to get the entries of an address.
+        :param address: Address string, e.g. '10.0.1.0'.
+        :return: List of TcamEntry.
+        """
+        return list(self.by_address.get(address, []))
+
+
+class VnetSnapshot(object):
+    """
+    Per-run cache of `goes vnet show` outputs and their parsed tables, so
+    several checks share one invocation of each command. Call refresh()
+    after changing the configuration to take a new snapshot.
+    """
+
+    def __init__(self, module, run):
+        """
+        :param module: The Ansible module to fetch input parameters.
+        :param run: Function(module, cmd) used to execute the commands,
+            e.g. the module's execute_commands.
+        """
+        self.module = module
+        self.run = run
+        self.outputs = {}
+        self.parsed = {}
+
+    def output(self, cmd):
+        """
+        Method to get the output of a command, running it on first use.
+        :param cmd: Command to execute.
+        :return: Output of the command.
+        """
+        if cmd not in self.outputs:
+            self.outputs[cmd] = self.run(self.module, cmd)
+        return self.outputs[cmd]
+
+    def _parsed(self, cmd, parser):
+        if cmd not in self.parsed:
+            self.parsed[cmd] = parser(self.output(cmd))
+        return self.parsed[cmd]
+
+    def fib(self):
+        return self._parsed(FIB_CMD, FibTable.from_output)
+
+    def fib_summary(self):
+        return self._parsed(FIB_SUMMARY_CMD, FibSummary.from_output)
+
+    def hw_interfaces(self):
+        return self._parsed(HW_INTERFACES_CMD, parse_hw_interfaces)
+
+    def tcam(self):
+        return self._parsed(TCAM_CMD, TcamTable.from_output)
+
+    def refresh(self):
+        """
+        Method to drop the cached outputs, so the next access runs the
+        commands again.
+        """
+        self.outputs.clear()
+        self.parsed.clear()
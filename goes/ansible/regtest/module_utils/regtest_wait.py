@@ -0,0 +1,143 @@
+""" Polling helpers to wait for a switch to converge """
+
+#
+# This file is part of Ansible
+#
+# Ansible is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Ansible is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Ansible. If not, see <http://www.gnu.org/licenses/>.
+#
+
+import os
+import select
+import subprocess
+import time
+
+
+class RedisEventWatcher(object):
+    """
+    Runs `goes subscribe CHANNEL` in the background so that a waiter can
+    wake up as soon as goes publishes a change, instead of sleeping out
+    its whole poll interval.
+    """
+
+    def __init__(self, channel, match=None):
+        """
+        :param channel: Redis channel to subscribe to, e.g. 'platina-mk1'.
+        :param match: Optional substring; only messages containing it
+            wake the waiter (e.g. 'vnet.xeth1.link').
+        """
+        self.channel = channel
+        self.match = match
+        self._proc = None
+
+    def start(self):
+        devnull = open(os.devnull, 'wb')
+        try:
+            self._proc = subprocess.Popen(['goes', 'subscribe', self.channel],
+                                          stdout=subprocess.PIPE,
+                                          stderr=devnull,
+                                          close_fds=True)
+        except OSError:
+            # No goes binary, fall back to plain polling
+            self._proc = None
+        devnull.close()
+        return self
+
+    def stop(self):
+        if self._proc is not None and self._proc.poll() is None:
+            self._proc.terminate()
+            self._proc.wait()
+        self._proc = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def wait(self, timeout):
+        """
+        Method to block until a matching message arrives or timeout expires.
+        :param timeout: Maximum number of seconds to wait.
+        :return: True if woken up by a message, False on timeout.
+        """
+        if self._proc is None or self._proc.poll() is not None:
+            time.sleep(max(timeout, 0))
+            return False
+
+        deadline = time.time() + timeout
+        stdout = self._proc.stdout
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return False
+
+            ready, _, _ = select.select([stdout], [], [], remaining)
+            if not ready:
+                return False
+
+            line = os.read(stdout.fileno(), 4096)
+            if not line:
+                # Subscriber exited, sleep out the rest of the interval
+                self._proc = None
+                time.sleep(max(deadline - time.time(), 0))
+                return False
+
+            if self.match is None or self.match.encode('utf-8') in line:
+                return True
+
+
+def wait_until(predicate, timeout, interval=1, max_interval=10, backoff=2,
+               watcher=None, hash_dict=None, key=None):
+    """
+    Method to poll predicate until it returns a true value or timeout
+    expires. The poll interval starts at interval and is multiplied by
+    backoff after every failed check, up to max_interval.
+    :param predicate: Function taking no arguments, polled until it
+        returns a true value.
+    :param timeout: Overall deadline in seconds.
+    :param interval: Initial poll interval in seconds.
+    :param max_interval: Upper bound of the poll interval in seconds.
+    :param backoff: Factor by which the poll interval grows.
+    :param watcher: Optional started RedisEventWatcher; a published redis
+        event ends the current interval early.
+    :param hash_dict: Optional hash dictionary to record the measured time in.
+    :param key: Key under which the measured time is recorded.
+    :return: Tuple of (last predicate value, elapsed seconds).
+    """
+    start = time.time()
+    deadline = start + timeout
+
+    while True:
+        result = predicate()
+        now = time.time()
+        if result or now >= deadline:
+            break
+
+        sleep_time = min(interval, deadline - now)
+        if watcher is not None:
+            watcher.wait(sleep_time)
+        else:
+            time.sleep(sleep_time)
+
+        interval = min(interval * backoff, max_interval)
+
+    elapsed = time.time() - start
+
+    if hash_dict is not None and key:
+        if result:
+            hash_dict[key] = '{0:.2f}'.format(elapsed)
+        else:
+            hash_dict[key] = 'not converged in {0:.2f}'.format(elapsed)
+
+    return result, elapsed
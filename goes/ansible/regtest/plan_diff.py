@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+""" Compare the dry run command plans of two branches """
+
+#
+# This file is part of Ansible
+#
+# Ansible is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Ansible is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Ansible. If not, see <http://www.gnu.org/licenses/>.
+#
+
+#
+# Plans are written by callback_plugins/dry_run_plan.py. Run the same dry
+# run on each branch into its own plan directory, then compare them:
+#
+#   REGTEST_PLAN_DIR=/tmp/plans_master \
+#       ansible-playbook -i hosts_testbed1 run_regression.yml -e dry_run=True
+#   git checkout my_branch
+#   REGTEST_PLAN_DIR=/tmp/plans_branch \
+#       ansible-playbook -i hosts_testbed1 run_regression.yml -e dry_run=True
+#   ./plan_diff.py /tmp/plans_master /tmp/plans_branch
+#
+# Two plan files may also be given. Exits with 1 if the plans differ.
+#
+
+from __future__ import print_function
+
+import argparse
+import difflib
+import json
+import os
+import sys
+
+
+def load_plan(path):
+    """
+    Method to read a plan file.
+    :param path: Path of the plan file.
+    :return: Plan dict.
+    """
+    with open(path) as f:
+        return json.load(f)
+
+
+def plan_lines(plan):
+    """
+    Method to flatten a plan into one line per planned command.
+    Task positions are left out, so a task added to a playbook only shows
+    up as the commands it adds.
+    :param plan: Plan dict.
+    :return: List of '<host> | <task name> | <command>' strings.
+    """
+    lines = []
+    for step in plan.get('steps', []):
+        for cmd in step['cmds']:
+            lines.append('{} | {} | {}'.format(step['host'], step['name'],
+                                               cmd))
+    return lines
+
+
+def diff_plans(old, new, old_name, new_name):
+    """
+    Method to compare two plans.
+    :param old: Plan dict of the first branch.
+    :param new: Plan dict of the second branch.
+    :param old_name: Label of the first plan in the diff.
+    :param new_name: Label of the second plan in the diff.
+    :return: List of unified diff lines, empty if the plans are the same.
+    """
+    return list(difflib.unified_diff(plan_lines(old), plan_lines(new),
+                                     old_name, new_name, lineterm=''))
+
+
+def plan_files(path):
+    """
+    Method to list the plan files of a plan directory.
+    :param path: Plan directory.
+    :return: Sorted list of plan file names.
+    """
+    return sorted(name for name in os.listdir(path) if name.endswith('.json'))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Compare the dry run command plans of two branches')
+    parser.add_argument('old', help='Plan file or plan directory')
+    parser.add_argument('new', help='Plan file or plan directory')
+    parser.add_argument('--stat', action='store_true',
+                        help='Only print the number of added and removed '
+                             'commands per plan')
+    args = parser.parse_args()
+
+    if os.path.isdir(args.old) != os.path.isdir(args.new):
+        parser.error('Compare two plan files or two plan directories')
+
+    if os.path.isdir(args.old):
+        old_names = plan_files(args.old)
+        new_names = plan_files(args.new)
+        pairs = [(os.path.join(args.old, name), os.path.join(args.new, name))
+                 for name in old_names if name in new_names]
+        only_old = [name for name in old_names if name not in new_names]
+        only_new = [name for name in new_names if name not in old_names]
+    else:
+        pairs = [(args.old, args.new)]
+        only_old = only_new = []
+
+    differ = bool(only_old or only_new)
+    for name in only_old:
+        print('Only in {}: {}'.format(args.old, name))
+    for name in only_new:
+        print('Only in {}: {}'.format(args.new, name))
+
+    for old_path, new_path in pairs:
+        diff = diff_plans(load_plan(old_path), load_plan(new_path),
+                          old_path, new_path)
+        if not diff:
+            continue
+
+        differ = True
+        if args.stat:
+            added = sum(1 for line in diff[2:] if line.startswith('+'))
+            removed = sum(1 for line in diff[2:] if line.startswith('-'))
+            print('{}: +{} -{}'.format(os.path.basename(new_path), added,
+                                       removed))
+        else:
+            print('\n'.join(diff))
+
+    return 1 if differ else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
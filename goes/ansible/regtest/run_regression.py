@@ -0,0 +1,638 @@
+#!/usr/bin/env python
+""" Run the regression suites of run_regression.yml across testbeds """
+
+#
+# This file is part of Ansible
+#
+# Ansible is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Ansible is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Ansible. If not, see <http://www.gnu.org/licenses/>.
+#
+
+#
+# Each suite (quagga_main.yml, redis_main.yml, ...) uninstalls, resets and
+# installs what it needs, so suites are independent of each other and may
+# run on any testbed. One worker per testbed takes the longest remaining
+# suite whenever its testbed is free, using suite durations recorded by
+# earlier runs, and the summary reports of all testbeds are merged at the
+# end.
+#
+# Testbeds are told apart by their testbed_name and their switches, so two
+# inventories of the same switches (e.g. hosts_testbed1 and
+# hosts_testbed_vault) cannot be used together. All testbeds share one
+# server emulator and one packet generator: each testbed writes its own
+# summary report on the server emulator, and suites using the packet
+# generator run one at a time.
+#
+# Usage:
+#   ./run_regression.py -i hosts_testbed1 -i hosts_testbed2 -i hosts_testbed3
+#   ./run_regression.py -i hosts_testbed1 -i hosts_testbed2 --dry-run
+#   ./run_regression.py -i hosts_testbed_vault -i hosts_testbed2 \
+#       --pin upgrade_main=hosts_testbed_vault -e build_no=42
+#
+
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+
+from collections import namedtuple
+
+REGTEST_DIR = os.path.dirname(os.path.abspath(__file__))
+
+SUITES_PLAYBOOK = 'run_regression.yml'
+SETUP_PLAYBOOK = 'regression_setup.yml'
+
+SUITE_INCLUDE_RE = re.compile(r'^-\s*include:\s*(\S+_main\.yml)\s*$')
+PLAYBOOK_INCLUDE_RE = re.compile(r'^-\s*include:\s*(\S+\.yml)\s*$')
+
+# Hosts of an inventory shared by all testbeds, not part of one
+SHARED_HOSTS = ('server_emulator', 'packet_generator')
+
+# Inventory host lines: '<name> ansible_ssh_host=<address> ...'
+HOST_LINE_RE = re.compile(r'^(?P<name>[\w.-]+)\s+(?P<vars>.*\bansible_ssh_host=.*)$')
+
+# Estimated duration of one included playbook of a suite never run before
+DEFAULT_PLAYBOOK_SECONDS = 300
+
+# Number of most recent runs the estimate of a suite is based on
+HISTORY_RUNS = 5
+
+SuiteRun = namedtuple('SuiteRun', 'suite testbed rc duration log_file')
+
+
+def testbed_name(inventory):
+    """
+    Method to get the name of the testbed of an inventory file: the
+    testbed_name of its hosts, or else the file name without hosts_.
+    :param inventory: Inventory file, e.g. 'hosts_testbed_vault'.
+    :return: Testbed name, e.g. 'testbed1'.
+    """
+    for name, host_vars in read_hosts(inventory):
+        if 'testbed_name' in host_vars:
+            return host_vars['testbed_name']
+
+    name = os.path.basename(inventory)
+    return name[len('hosts_'):] if name.startswith('hosts_') else name
+
+
+def read_hosts(inventory):
+    """
+    Method to read the hosts of an INI inventory file.
+    :param inventory: Inventory file.
+    :return: List of (host name, dict of host variables) tuples.
+    """
+    hosts = []
+    try:
+        with open(inventory) as f:
+            for line in f:
+                match = HOST_LINE_RE.match(line.strip())
+                if not match:
+                    continue
+                host_vars = {}
+                for field in match.group('vars').split():
+                    key, sep, value = field.partition('=')
+                    if sep:
+                        host_vars[key] = value.strip('\'"')
+                hosts.append((match.group('name'), host_vars))
+    except IOError:
+        pass
+    return hosts
+
+
+def switch_addresses(inventory):
+    """
+    Method to get the addresses of the switches of an inventory.
+    :param inventory: Inventory file.
+    :return: Set of addresses, without the shared hosts.
+    """
+    return set(host_vars['ansible_ssh_host']
+               for name, host_vars in read_hosts(inventory)
+               if name not in SHARED_HOSTS)
+
+
+def check_inventories(inventories):
+    """
+    Method to verify that the inventories are different testbeds.
+    :param inventories: List of inventory files.
+    :return: Error message, None if they can run together.
+    """
+    seen = {}
+    for inventory in inventories:
+        name = testbed_name(inventory)
+        for other, (other_name, other_switches) in seen.items():
+            if name == other_name:
+                return '{} and {} are both testbed {}'.format(
+                    other, inventory, name)
+            shared = other_switches & switch_addresses(inventory)
+            if shared:
+                return '{} and {} share the switches {}'.format(
+                    other, inventory, ', '.join(sorted(shared)))
+        seen[inventory] = (name, switch_addresses(inventory))
+    return None
+
+
+def read_suites(playbook):
+    """
+    Method to get the suites included by the main regression playbook.
+    :param playbook: Path of the playbook, e.g. run_regression.yml.
+    :return: List of suite names in playbook order, e.g. ['quagga_main'].
+    """
+    suites = []
+    with open(playbook) as f:
+        for line in f:
+            match = SUITE_INCLUDE_RE.match(line.strip())
+            if match:
+                suites.append(os.path.splitext(match.group(1))[0])
+    return suites
+
+
+def suite_playbooks(suite):
+    """
+    Method to get the playbooks included by a suite.
+    :param suite: Suite name.
+    :return: List of playbook paths, relative to the regtest directory.
+    """
+    playbooks = []
+    try:
+        with open(os.path.join(REGTEST_DIR, suite + '.yml')) as f:
+            for line in f:
+                match = PLAYBOOK_INCLUDE_RE.match(line.strip())
+                if match:
+                    playbooks.append(match.group(1))
+    except IOError:
+        pass
+    return playbooks
+
+
+def count_playbooks(suite):
+    """
+    Method to count the playbooks included by a suite.
+    :param suite: Suite name.
+    :return: Number of included playbooks, at least 1.
+    """
+    return max(len(suite_playbooks(suite)), 1)
+
+
+def uses_packet_generator(suite):
+    """
+    Method to check if a suite runs plays on the shared packet generator.
+    :param suite: Suite name.
+    :return: True if one of its playbooks targets packet_generator.
+    """
+    for playbook in suite_playbooks(suite):
+        try:
+            with open(os.path.join(REGTEST_DIR, playbook)) as f:
+                if 'packet_generator' in f.read():
+                    return True
+        except IOError:
+            pass
+    return False
+
+
+def _median(values):
+    values = sorted(values)
+    middle = len(values) // 2
+    if len(values) % 2:
+        return values[middle]
+    return (values[middle - 1] + values[middle]) / 2.0
+
+
+class DurationHistory(object):
+    """
+    Durations of the suites in earlier runs, kept in a JSON file.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: Path of the JSON file, created on save if missing.
+        """
+        self.path = path
+        self.durations = {}
+        if os.path.exists(path):
+            try:
+                with open(path) as f:
+                    self.durations = json.load(f)
+            except (IOError, ValueError):
+                self.durations = {}
+
+    def estimate(self, suite):
+        """
+        Method to estimate how long a suite will run: the median of its
+        last runs, or a guess from its number of playbooks if it never ran.
+        :param suite: Suite name.
+        :return: Seconds.
+        """
+        previous = self.durations.get(suite, [])[-HISTORY_RUNS:]
+        if previous:
+            return _median(previous)
+        return count_playbooks(suite) * DEFAULT_PLAYBOOK_SECONDS
+
+    def add(self, suite, seconds):
+        runs = self.durations.setdefault(suite, [])
+        runs.append(round(seconds, 1))
+        del runs[:-HISTORY_RUNS]
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        with open(self.path, 'w') as f:
+            json.dump(self.durations, f, indent=2, sort_keys=True)
+
+
+class SuiteQueue(object):
+    """
+    Suites waiting to run, longest estimate first. A suite pinned to a
+    testbed is only handed out to that testbed, and of the exclusive suites,
+    those using the shared packet generator, only one runs at a time.
+    """
+
+    def __init__(self, suites, estimate, pins=None, exclusive=None):
+        """
+        :param suites: Iterable of suite names.
+        :param estimate: Function(suite) returning its estimated seconds.
+        :param pins: Optional dict of suite name to testbed name.
+        :param exclusive: Optional set of suites which may not run together.
+        """
+        self.pins = pins or {}
+        self.exclusive = set(exclusive or [])
+        self.pending = sorted(suites, key=estimate, reverse=True)
+        self.running_exclusive = None
+        self.cond = threading.Condition()
+
+    def allowed(self, suite, testbed):
+        return self.pins.get(suite, testbed) == testbed
+
+    def take(self, testbed, wait=True):
+        """
+        Method to take the next suite for a testbed. An exclusive suite is
+        skipped while another one runs; if only such suites are left for
+        the testbed, waits for it to be released.
+        :param testbed: Testbed name.
+        :param wait: False to return None instead of waiting.
+        :return: Suite name, or None if none is left for the testbed.
+        """
+        with self.cond:
+            while True:
+                allowed = [suite for suite in self.pending
+                           if self.allowed(suite, testbed)]
+                if not allowed:
+                    return None
+
+                for suite in allowed:
+                    if suite in self.exclusive:
+                        if self.running_exclusive is not None:
+                            continue
+                        self.running_exclusive = suite
+                    self.pending.remove(suite)
+                    return suite
+
+                if not wait:
+                    return None
+                self.cond.wait(1)
+
+    def release(self, suite):
+        """
+        Method to note that a suite finished.
+        :param suite: Suite name.
+        """
+        with self.cond:
+            if self.running_exclusive == suite:
+                self.running_exclusive = None
+            self.cond.notify_all()
+
+
+def plan(suites, testbeds, estimate, pins=None, exclusive=None):
+    """
+    Method to work out which testbed each suite would run on, the way the
+    workers hand them out when every suite takes its estimated time.
+    :param suites: List of suite names.
+    :param testbeds: List of testbed names.
+    :param estimate: Function(suite) returning its estimated seconds.
+    :param pins: Optional dict of suite name to testbed name.
+    :param exclusive: Optional set of suites which may not run together.
+    :return: Dict of testbed name to list of (suite, start, end) tuples.
+    """
+    queue = SuiteQueue(suites, estimate, pins, exclusive)
+    schedule = dict((testbed, []) for testbed in testbeds)
+    free_at = dict((testbed, 0) for testbed in testbeds)
+    exclusive_end = None
+    done = set()
+
+    while len(done) < len(testbeds):
+        testbed = min((tb for tb in testbeds if tb not in done),
+                      key=lambda tb: (free_at[tb], testbeds.index(tb)))
+        start = free_at[testbed]
+
+        # The exclusive suite running at start, if any, is released
+        if exclusive_end is not None and exclusive_end <= start:
+            queue.release(queue.running_exclusive)
+            exclusive_end = None
+
+        suite = queue.take(testbed, wait=False)
+        if suite is None:
+            if exclusive_end is None:
+                done.add(testbed)
+            else:
+                # Only exclusive suites are left: wait for the running one
+                free_at[testbed] = exclusive_end
+            continue
+
+        free_at[testbed] = start + estimate(suite)
+        if suite in queue.exclusive:
+            exclusive_end = free_at[testbed]
+        schedule[testbed].append((suite, start, free_at[testbed]))
+
+    return schedule
+
+
+class Scheduler(object):
+    """
+    Runs the suites on the testbeds, one ansible-playbook process per
+    testbed at a time and all testbeds concurrently.
+    """
+
+    def __init__(self, inventories, suites, history, log_dir, pins=None,
+                 extra_vars=None, exclusive=None):
+        """
+        :param inventories: List of inventory files, one per testbed.
+        :param suites: List of suite names.
+        :param history: DurationHistory of the suites.
+        :param log_dir: Directory for playbook logs and summary reports.
+        :param pins: Optional dict of suite name to testbed name.
+        :param extra_vars: Optional list of ansible -e arguments.
+        :param exclusive: Optional set of suites which may not run together.
+        """
+        self.inventories = dict((testbed_name(inv), inv) for inv in inventories)
+        self.testbeds = [testbed_name(inv) for inv in inventories]
+        self.history = history
+        self.log_dir = log_dir
+        self.extra_args = []
+        for extra_var in extra_vars or []:
+            self.extra_args += ['-e', extra_var]
+        self.queue = SuiteQueue(suites, history.estimate, pins, exclusive)
+        self.runs = []
+        self.lock = threading.Lock()
+
+    def testbed_args(self, testbed):
+        """
+        Method to get the extra variables of the ansible runs of a testbed.
+        testbed_name is always set, so that each testbed keeps its own
+        summary report on the shared server emulator.
+        :param testbed: Testbed name.
+        :return: List of ansible -e arguments.
+        """
+        return ['-e', 'testbed_name={}'.format(testbed)] + self.extra_args
+
+    def log(self, message):
+        with self.lock:
+            print('{} {}'.format(time.strftime('%H:%M:%S'), message))
+            sys.stdout.flush()
+
+    def ansible_playbook(self, testbed, playbook, log_name):
+        """
+        Method to run a playbook on a testbed.
+        :param testbed: Testbed name.
+        :param playbook: Playbook file, relative to the regtest directory.
+        :param log_name: Name of the log file in the log directory.
+        :return: Tuple of (exit code, log file path).
+        """
+        log_file = os.path.join(self.log_dir, log_name)
+        cmd = ['ansible-playbook', '-i', self.inventories[testbed],
+               playbook] + self.testbed_args(testbed)
+        with open(log_file, 'w') as log:
+            rc = subprocess.call(cmd, cwd=REGTEST_DIR, stdout=log,
+                                 stderr=subprocess.STDOUT)
+        return rc, log_file
+
+    def worker(self, testbed):
+        try:
+            rc, log_file = self.ansible_playbook(
+                testbed, SETUP_PLAYBOOK, '{}_setup.log'.format(testbed))
+            if rc:
+                self.log('{}: setup failed, see {}'.format(testbed, log_file))
+        except (IOError, OSError) as e:
+            self.log('{}: cannot run setup: {}'.format(testbed, e))
+
+        while True:
+            suite = self.queue.take(testbed)
+            if suite is None:
+                break
+
+            self.log('{}: starting {} (estimated {:.0f} min)'.format(
+                testbed, suite, self.history.estimate(suite) / 60))
+            start = time.time()
+            log_name = '{}_{}.log'.format(testbed, suite)
+            rc, log_file = 1, os.path.join(self.log_dir, log_name)
+            ran = False
+            try:
+                rc, log_file = self.ansible_playbook(testbed, suite + '.yml',
+                                                     log_name)
+                ran = True
+            except (IOError, OSError) as e:
+                self.log('{}: cannot run {}: {}'.format(testbed, suite, e))
+            finally:
+                # Always hand the suite back, exclusive suites block the
+                # other testbeds until then
+                duration = time.time() - start
+                self.queue.release(suite)
+
+            with self.lock:
+                self.runs.append(SuiteRun(suite, testbed, rc, duration,
+                                          log_file))
+                if ran:
+                    self.history.add(suite, duration)
+            self.log('{}: finished {} in {:.0f} min, exit code {}'.format(
+                testbed, suite, duration / 60, rc))
+
+    def run(self):
+        """
+        Method to run all suites.
+        :return: List of SuiteRun.
+        """
+        threads = []
+        for testbed in self.testbeds:
+            thread = threading.Thread(target=self.worker, args=(testbed,),
+                                      name=testbed)
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(1)
+
+        return self.runs
+
+    def fetch_summary(self, testbed):
+        """
+        Method to copy the summary report of a testbed from its server
+        emulator.
+        :param testbed: Testbed name.
+        :return: List of summary report lines, None if it cannot be fetched.
+        """
+        dest = os.path.join(self.log_dir,
+                            'regression_summary_file_{}'.format(testbed))
+        cmd = ['ansible', '-i', self.inventories[testbed], 'server_emulator',
+               '-b', '-m', 'fetch', '-a',
+               'src={{ regression_summary_report }} dest=' + dest +
+               ' flat=yes'] + self.testbed_args(testbed)
+        with open(os.devnull, 'w') as devnull:
+            rc = subprocess.call(cmd, cwd=REGTEST_DIR, stdout=devnull,
+                                 stderr=subprocess.STDOUT)
+        if rc or not os.path.exists(dest):
+            return None
+        with open(dest) as f:
+            return [line.rstrip('\n') for line in f if line.strip()]
+
+    def merge_summaries(self, path):
+        """
+        Method to merge the summary reports of all testbeds into one, each
+        line prefixed with the testbed it ran on.
+        :param path: Path of the merged summary report.
+        :return: Tuple of (merged lines, testbeds whose report is missing).
+        """
+        merged = []
+        missing = []
+        for testbed in self.testbeds:
+            lines = self.fetch_summary(testbed)
+            if lines is None:
+                missing.append(testbed)
+                continue
+            merged += ['[{}] {}'.format(testbed, line) for line in lines]
+
+        with open(path, 'w') as f:
+            f.write(''.join(line + '\n' for line in merged))
+
+        return merged, missing
+
+
+def parse_pins(pins, testbeds):
+    """
+    Method to parse --pin arguments.
+    :param pins: List of 'suite=inventory' strings.
+    :param testbeds: List of testbed names being used.
+    :return: Dict of suite name to testbed name.
+    """
+    parsed = {}
+    for pin in pins or []:
+        suite, sep, inventory = pin.partition('=')
+        if not sep:
+            raise ValueError('Invalid pin {}, expected suite=inventory'.format(
+                pin))
+        suite = os.path.splitext(suite)[0]
+        testbed = testbed_name(inventory)
+        if testbed not in testbeds:
+            raise ValueError('Suite {} pinned to unused inventory {}'.format(
+                suite, inventory))
+        parsed[suite] = testbed
+    return parsed
+
+
+def print_plan(schedule):
+    for testbed in sorted(schedule):
+        suites = schedule[testbed]
+        end = suites[-1][2] if suites else 0
+        print('{}: estimated {:.0f} min'.format(testbed, end / 60))
+        for suite, start, finish in suites:
+            print('    {:>5.0f} - {:>5.0f} min  {}'.format(
+                start / 60, finish / 60, suite))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Run the regression suites across testbeds in parallel')
+    parser.add_argument('-i', '--inventory', action='append', required=True,
+                        help='Inventory of a testbed to use, repeat for '
+                             'each testbed')
+    parser.add_argument('-s', '--suite', action='append',
+                        help='Suite to run, e.g. redis_main; defaults to '
+                             'all suites of ' + SUITES_PLAYBOOK)
+    parser.add_argument('--pin', action='append',
+                        help='Run a suite on one testbed only, '
+                             'e.g. upgrade_main=hosts_testbed1')
+    parser.add_argument('-e', '--extra-vars', action='append',
+                        help='Extra variables passed to ansible')
+    parser.add_argument('--history',
+                        default=os.path.expanduser(
+                            '~/.ansible/regression_suite_durations.json'),
+                        help='JSON file of suite durations of earlier runs')
+    parser.add_argument('--log-dir', default='/var/log/regression/scheduler',
+                        help='Directory for playbook logs and the merged '
+                             'summary report')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Only print which testbed runs which suite')
+    args = parser.parse_args()
+
+    error = check_inventories(args.inventory)
+    if error:
+        parser.error('Testbeds may not share switches: {}'.format(error))
+    testbeds = [testbed_name(inv) for inv in args.inventory]
+
+    suites = [os.path.splitext(s)[0] for s in args.suite or []]
+    suites = suites or read_suites(os.path.join(REGTEST_DIR, SUITES_PLAYBOOK))
+
+    try:
+        pins = parse_pins(args.pin, testbeds)
+    except ValueError as e:
+        parser.error(str(e))
+
+    # Suites using the packet generator shared by all testbeds
+    exclusive = set(suite for suite in suites if uses_packet_generator(suite))
+
+    history = DurationHistory(args.history)
+    schedule = plan(suites, testbeds, history.estimate, pins, exclusive)
+    print_plan(schedule)
+    if args.dry_run:
+        return 0
+
+    if not os.path.isdir(args.log_dir):
+        os.makedirs(args.log_dir)
+
+    scheduler = Scheduler(args.inventory, suites, history, args.log_dir,
+                          pins, args.extra_vars, exclusive)
+    runs = scheduler.run()
+    history.save()
+
+    summary_file = os.path.join(args.log_dir, 'regression_summary_file')
+    merged, missing = scheduler.merge_summaries(summary_file)
+
+    print('\nRegression summary report ({}):'.format(summary_file))
+    for line in merged:
+        print(line)
+
+    passed = sum(1 for line in merged if line.endswith(': Passed'))
+    failed = sum(1 for line in merged if 'Failed' in line)
+    print('\nPassed: {}, Failed: {}'.format(passed, failed))
+
+    errors = [run for run in runs if run.rc]
+    for run in errors:
+        print('{} on {} exited with code {}, see {}'.format(
+            run.suite, run.testbed, run.rc, run.log_file))
+    for testbed in missing:
+        print('Unable to fetch the summary report of {}'.format(testbed))
+
+    if failed or errors or missing:
+        print('Regression Failed')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
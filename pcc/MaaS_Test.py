@@ -12,11 +12,15 @@ import getopt
 import pdb
 from time import gmtime, strftime
 
+from Parallel_Runner import run_parallel
+
 
 class Main:
 
     test_suite_list = None
     run_count = 1
+    processes = 1
+    data_file = None
  
     def __init__(self):
          pass
@@ -28,7 +32,8 @@ class Main:
         """
 
         try:
-            opts, args = getopt.getopt(args, "h:i:c:", ["help=", "input-suite=", "run_cnt=", ])
+            opts, args = getopt.getopt(args, "h:i:c:p:d:", ["help=", "input-suite=", "run_cnt=",
+                                                            "processes=", "data=", ])
         except getopt.GetoptError as err:
             cls.help()
         for opt, arg in opts:
@@ -42,6 +47,14 @@ class Main:
                 except:
                     print("\n\nnumber expected as run count....") 
                     cls.help()
+            elif opt in ('-p', '--processes'):
+                try:
+                    cls.processes = int(arg)
+                except:
+                    print("\n\nnumber expected as processes....")
+                    cls.help()
+            elif opt in ('-d', '--data'):
+                cls.data_file = str(arg)
             else:
                 cls.help()
 
@@ -70,6 +83,13 @@ class Main:
            -c / --run-cnt         [Optional] Gives tags to execute selected test from suite
                                   By default all test cases from suite will be execute                                    
 
+           -p / --processes       [Optional] Number of worker processes running the repeats at the same time
+                                  By default the suite is repeated one run after another
+
+           -d / --data            [Mandatory with -p] Test data file of the suite, given to every worker
+                                  in place of the suite's own test data, with the site, tenant, group,
+                                  role and cluster names suffixed by _w<worker id>
+
 
        Example:
        -------
@@ -80,6 +100,10 @@ class Main:
        2. Execute single test number of times
           python Main.py -i 'pcc_login_test.robot' -c 5
 
+       3. Execute single test number of times, 5 runs at a time, merged into one report.
+          Only for suites not adding, updating or deleting nodes, which the runs would share
+          python MaaS_Test.py -i 'pcc_login_test.robot' -c 20 -p 5 -d test_data/vm215/Login_Test_215.py
+
         """
         print(help_str)
         sys.exit(0) 
@@ -98,7 +122,14 @@ class Main:
         cls.arg_parser(args)
         if not cls.test_suite_list:
             cls.help()
-        pdb.set_trace()
+
+        if cls.processes > 1:
+            if not cls.data_file:
+                print("\n\ntest data file (-d) expected with processes....")
+                cls.help()
+            sys.exit(run_parallel([cls.test_suite_list], cls.get_current_time(), cls.processes,
+                                  cls.data_file, repeat=cls.run_count))
+
         for count in range(cls.run_count):
            if not os.path.isfile(str(cls.test_suite_list)):
                print("test suite file not present at location: {0}".format(cls.test_suite_list))
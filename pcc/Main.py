@@ -12,11 +12,15 @@ import getopt
 import pdb
 from time import gmtime, strftime
 
+from Parallel_Runner import run_parallel
+
 
 class Main:
     
     test_suite_list = []
     tags = []
+    processes = 1
+    data_file = None
  
     def __init__(self):
          pass
@@ -28,7 +32,8 @@ class Main:
         """
          
         try:
-            opts, args = getopt.getopt(args, "h:i:t:", ["help=", "input-suite=", "tags=", ])
+            opts, args = getopt.getopt(args, "h:i:t:p:d:", ["help=", "input-suite=", "tags=",
+                                                            "processes=", "data=", ])
         except getopt.GetoptError as err:
             cls.help()
         for opt, arg in opts:
@@ -38,6 +43,14 @@ class Main:
                 cls.test_suite_list = list(arg.split())
             elif opt in ('-t', '--tags'):
                 cls.tags = list(arg.split())
+            elif opt in ('-p', '--processes'):
+                try:
+                    cls.processes = int(arg)
+                except:
+                    print("\n\nnumber expected as processes....")
+                    cls.help()
+            elif opt in ('-d', '--data'):
+                cls.data_file = str(arg)
             else:
                 cls.help()
 
@@ -66,6 +79,13 @@ class Main:
            -t / --tags           [Optional] Gives tags to execute selected test from suite
                                  By default all test cases from suite will be execute                                    
 
+           -p / --processes      [Optional] Number of worker processes running suites at the same time
+                                 By default suites are executed one after another
+
+           -d / --data           [Mandatory with -p] Test data file of the suites, given to every worker
+                                 in place of the suite's own test data, with the site, tenant, group,
+                                 role and cluster names suffixed by _w<worker id>
+
 
        Example:
        -------
@@ -77,6 +97,11 @@ class Main:
     
        3. Execute single test suite with selected test case
           python Main.py -i 'pcc_regression_test.robot' -t 'node_management'
+
+       4. Execute multiple test suites sharing one test data file in 2 worker processes,
+          merged into one report. Suites run at the same time must not add, update or delete
+          the same nodes
+          python Main.py -i '<PATH to test suite> <PATH to test suite>' -p 2 -d <PATH to test data>
   
         """
         print(help_str)
@@ -97,6 +122,13 @@ class Main:
         if not cls.test_suite_list:
             cls.help()
 
+        if cls.processes > 1:
+            if not cls.data_file:
+                print("\n\ntest data file (-d) expected with processes....")
+                cls.help()
+            sys.exit(run_parallel(cls.test_suite_list, cls.get_current_time(), cls.processes,
+                                  cls.data_file, cls.tags))
+
         for test_suite in list(cls.test_suite_list):
            if not os.path.isfile(str(test_suite)):
                print("test suite file not present at location: {0}".format(test_suite))
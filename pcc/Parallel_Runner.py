@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+
+#######################################
+#
+# Run Robot Suites Sharded Across Worker Processes
+#
+#######################################
+
+import os
+import subprocess
+import time
+from collections import namedtuple
+
+PCC_DIR = os.path.dirname(os.path.abspath(__file__))
+WORKER_DATA = os.path.join(PCC_DIR, "test_data", "Worker_Data.py")
+
+# One robot run of a suite. Its tests stay in one worker, as they share
+# the ids kept with Set Suite Variable
+Shard = namedtuple("Shard", "index suite")
+
+
+def make_shards(test_suite_list, repeat=1):
+    """ Split suites into shards, each run by one worker process
+        ``repeat`` number of times each suite is run
+    """
+    suites = []
+    for test_suite in test_suite_list:
+        if not os.path.isfile(str(test_suite)):
+            print("test suite file not present at location: {0}".format(test_suite))
+            print("skipping test execution......")
+            continue
+        suites.append(test_suite)
+
+    shards = []
+    for count in range(repeat):
+        for test_suite in suites:
+            shards.append(Shard(len(shards) + 1, test_suite))
+    return shards
+
+
+def robot_cmd(shard, log_dir, data_file, tags=None):
+    """ Robot command line of a shard. Each worker gets its own worker_id,
+        and its site, tenant, group, role and cluster names from the test
+        data get a _w<worker_id> suffix so workers do not collide on PCC
+    """
+    worker_vars = "{0}:{1}:{2}".format(WORKER_DATA, shard.index,
+                                       os.path.abspath(data_file))
+
+    cmd = ["robot",
+           "--output", os.path.join(log_dir, "output_{0}.xml".format(shard.index)),
+           "--log", "NONE", "--report", "NONE",
+           "--variablefile", worker_vars]
+    for tag in list(tags or []):
+        cmd += ["-i", str(tag)]
+    cmd.append(shard.suite)
+    return cmd
+
+
+def run_shards(shards, processes, log_dir, data_file, tags=None):
+    """ Run the shards, at most `processes` at a time, and return the
+        output files of the finished ones
+    """
+    if not os.path.isdir(log_dir):
+        os.makedirs(log_dir)
+
+    pending = list(shards)
+    running = []
+    outputs = []
+
+    while pending or running:
+        while pending and len(running) < max(1, processes):
+            shard = pending.pop(0)
+            cmd = robot_cmd(shard, log_dir, data_file, tags)
+            console = open(os.path.join(log_dir, "console_{0}.txt".format(shard.index)), "w")
+            print("worker {0} starting: {1}".format(shard.index, " ".join(cmd)))
+            proc = subprocess.Popen(cmd, stdout=console, stderr=subprocess.STDOUT)
+            running.append((shard, proc, console, time.time()))
+
+        time.sleep(1)
+        for item in list(running):
+            shard, proc, console, start = item
+            if proc.poll() is None:
+                continue
+            console.close()
+            running.remove(item)
+            print("worker {0} finished in {1:.0f}s with rc {2}: {3}".format(
+                shard.index, time.time() - start, proc.returncode, shard.suite))
+            output = os.path.join(log_dir, "output_{0}.xml".format(shard.index))
+            if os.path.isfile(output):
+                outputs.append((shard.index, output))
+
+    return [output for index, output in sorted(outputs)]
+
+
+def merge_outputs(outputs, time_str, name="PCC"):
+    """ Combine the output files of all workers into one log and report
+    """
+    if not outputs:
+        print("no output files to merge")
+        return 1
+
+    cmd = ["rebot", "--name", name,
+           "-l", "./logs/log_{0}.html".format(time_str),
+           "-r", "./logs/report_{0}.html".format(time_str),
+           "-o", "./logs/output_{0}.xml".format(time_str)] + outputs
+    print("merging {0} outputs: {1}".format(len(outputs), " ".join(cmd)))
+    return subprocess.call(cmd)
+
+
+def run_parallel(test_suite_list, time_str, processes, data_file, tags=None,
+                 repeat=1):
+    """ Shard the suites, run the shards in worker processes and merge
+        their outputs into ./logs/{log,report,output}_<time_str>
+        ``data_file`` test data of the suites, given to every worker with
+            the names of the objects it creates made unique
+    """
+    if not os.path.isfile(str(data_file)):
+        print("test data file not present at location: {0}".format(data_file))
+        return 1
+
+    shards = make_shards(test_suite_list, repeat)
+    if not shards:
+        return 1
+
+    log_dir = os.path.join(".", "logs", time_str)
+    print("running {0} shards over {1} worker processes".format(len(shards), processes))
+    start = time.time()
+    outputs = run_shards(shards, processes, log_dir, data_file, tags)
+    print("all shards finished in {0:.0f}s".format(time.time() - start))
+    return merge_outputs(outputs, time_str)
@@ -7,6 +7,73 @@
 #
 ###########################################
 
+import ast
+import json
+from collections import OrderedDict
+
+try:
+    string_types = basestring
+except NameError:
+    string_types = str
+
+
+class Response_Data(object):
+    """ PCC response parsed once, with its records indexed by field value
+        on first lookup, so that each further lookup is a dict access.
+    """
+
+    # Number of parsed responses kept, keyed by the response object
+    CACHE_SIZE = 8
+    _cache = OrderedDict()
+
+    def __init__(self, resp_data):
+        if isinstance(resp_data, string_types):
+            try:
+                resp_data = json.loads(resp_data)
+            except ValueError:
+                resp_data = ast.literal_eval(resp_data)
+
+        self.resp_data = resp_data
+        if isinstance(resp_data, dict):
+            self.data = resp_data.get('Data')
+        else:
+            self.data = resp_data
+        self.records = self.data if isinstance(self.data, list) else []
+        self._indexes = {}
+
+    @classmethod
+    def of(cls, resp_data):
+        """ Get the parsed response, reusing it when the same response
+            object is validated again
+        """
+        key = id(resp_data)
+        cached = cls._cache.get(key)
+        if cached is not None and cached[0] is resp_data:
+            return cached[1]
+
+        model = cls(resp_data)
+        # The response is kept with its model so that its id is not reused
+        cls._cache[key] = (resp_data, model)
+        while len(cls._cache) > cls.CACHE_SIZE:
+            cls._cache.popitem(last=False)
+        return model
+
+    def index(self, field):
+        """ Get the records by str(value) of `field`, first record wins
+        """
+        if field not in self._indexes:
+            index = {}
+            for record in self.records:
+                if isinstance(record, dict) and field in record:
+                    index.setdefault(str(record[field]), record)
+            self._indexes[field] = index
+        return self._indexes[field]
+
+    def get(self, field, value):
+        """ Get the first record whose `field` is `value`, None if none is
+        """
+        return self.index(field).get(str(value))
+
 
 class Data_Parser:
 
@@ -15,16 +82,12 @@ class Data_Parser:
         """ find added node from node list
         """
         try:
-            if resp_data['Data'] != None:
-                for data in eval(str(resp_data))['Data']:
-                    if str(data['Name']) == str(node_name):
-                        if host:
-                            if str(data['Host']) == str(host):
-                                return True, str(data['Id'])
-                            else:
-                                return False, None
-                        return True, str(data['Id'])
-            return False, None
+            data = Response_Data.of(resp_data).get('Name', node_name)
+            if data is None:
+                return False, None
+            if host and str(data['Host']) != str(host):
+                return False, None
+            return True, str(data['Id'])
         except Exception:
             return False, None
 
@@ -33,11 +96,8 @@ class Data_Parser:
         """ find added node manage status
         """
         try:
-            for data in eval(str(resp_data))['Data']:
-                if str(data['Name']) == str(node_name):
-                    if str(data['managed']) == str(status):
-                        return True
-            return False
+            data = Response_Data.of(resp_data).get('Name', node_name)
+            return data is not None and str(data['managed']) == str(status)
         except Exception:
             return False
 
@@ -46,9 +106,9 @@ class Data_Parser:
         """ Get Expected Group from the group list
         """
         try:
-            for data in eval(str(resp_data))['Data']:
-                if str(data['Name']) == str(expect_group):
-                    return True, str(data['Id'])
+            data = Response_Data.of(resp_data).get('Name', expect_group)
+            if data is not None:
+                return True, str(data['Id'])
             return False, None
         except Exception:
             return False, None
@@ -58,9 +118,9 @@ class Data_Parser:
         """ Get Expected Role from the group list
         """
         try:
-            for data in eval(str(resp_data))['Data']:
-                if str(data['name']) == str(expect_role):
-                    return True, str(data['id'])
+            data = Response_Data.of(resp_data).get('name', expect_role)
+            if data is not None:
+                return True, str(data['id'])
             return False, None
         except Exception:
             return False, None
@@ -70,9 +130,9 @@ class Data_Parser:
         """ Get Expected Site from the site list
         """
         try:
-            for data in eval(str(resp_data))['Data']:
-                if str(data['Name']) == str(expect_site):
-                    return True, str(data['Id'])
+            data = Response_Data.of(resp_data).get('Name', expect_site)
+            if data is not None:
+                return True, str(data['Id'])
             return False, None
         except Exception:
             return False, None
@@ -82,9 +142,9 @@ class Data_Parser:
         """ Get Expected Site Description from the site list
         """
         try:
-            for data in eval(str(resp_data))['Data']:
-                if str(data['Description']) == str(expect_desc):
-                    return True, str(data['Id'])
+            data = Response_Data.of(resp_data).get('Description', expect_desc)
+            if data is not None:
+                return True, str(data['Id'])
             return False, None
         except Exception:
             return False, None
@@ -94,10 +154,9 @@ class Data_Parser:
         """ validated updated site in node
         """
         try:
-            for data in eval(str(resp_data))['Data']:
-                if str(data['Name']) == str(node_name):
-                    if int(data['Site_Id']) == int(site_id):
-                        return True, str(data['Id'])
+            data = Response_Data.of(resp_data).get('Name', node_name)
+            if data is not None and int(data['Site_Id']) == int(site_id):
+                return True, str(data['Id'])
             return False, None
         except Exception:
             return False, None
@@ -107,9 +166,9 @@ class Data_Parser:
         """get tenant id from tenant list
         """
         try:
-            for tenant in response:
-                if str(tenant['name']) == str(tenant_name):
-                    return True, str(tenant['id'])
+            tenant = Response_Data.of(response).get('name', tenant_name)
+            if tenant is not None:
+                return True, str(tenant['id'])
             return False, None
         except Exception:
             return False, None
@@ -119,10 +178,9 @@ class Data_Parser:
         """Verify Tenant Parent
         """
         try:
-            for tenant in response:
-                if str(tenant['name']) == str(tenant_name):
-                    if int(parent_id) == int(tenant['owner']):  
-                        return True, str(tenant['id'])
+            tenant = Response_Data.of(response).get('name', tenant_name)
+            if tenant is not None and int(parent_id) == int(tenant['owner']):
+                return True, str(tenant['id'])
             return False, None
         except Exception:
             return False, None
@@ -132,10 +190,9 @@ class Data_Parser:
         """ validated Assigned Group in node
         """
         try:
-            for data in eval(str(resp_data))['Data']:
-                if str(data['Name']) == str(node_name):
-                    if int(data['ClusterId']) == int(group_id):
-                        return True, str(data['Id'])
+            data = Response_Data.of(resp_data).get('Name', node_name)
+            if data is not None and int(data['ClusterId']) == int(group_id):
+                return True, str(data['Id'])
             return False, None
         except Exception:
             return False, None
@@ -145,10 +202,9 @@ class Data_Parser:
         """ validated Assigned Roles in node
         """
         try:
-            for data in eval(str(resp_data))['Data']:
-                if str(data['Name']) == str(node_name):
-                    if int(role_id) in list(data['roles']):
-                        return True, str(data['Id'])
+            data = Response_Data.of(resp_data).get('Name', node_name)
+            if data is not None and int(role_id) in list(data['roles']):
+                return True, str(data['Id'])
             return False, None
         except Exception:
             return False, None
@@ -158,10 +214,9 @@ class Data_Parser:
         """ validated Assigned Tenant in node
         """
         try:
-            for data in eval(str(resp_data))['Data']:
-                if str(data['Name']) == str(node_name):
-                    if int(tenant_id) == int(data['owner']):
-                        return True, str(data['Id'])
+            data = Response_Data.of(resp_data).get('Name', node_name)
+            if data is not None and int(tenant_id) == int(data['owner']):
+                return True, str(data['Id'])
             return False, None
         except Exception:
             return False, None
@@ -170,39 +225,22 @@ class Data_Parser:
     def get_maas_role_id(resp_data):
         """ Get MaaS role Id from response
         """
-        try:
-            for data in eval(str(resp_data))['Data']:
-                if str(data['name']) == "MaaS":
-                    return True, str(data['id'])
-            return False, None
-        except Exception:
-            return False, None
+        return Data_Parser.validate_roles(resp_data, "MaaS")
 
     @staticmethod
     def get_lldp_role_id(resp_data):
         """ Get LLDP role Id from response
         """
-        try:
-            for data in eval(str(resp_data))['Data']:
-                if str(data['name']) == "LLDP":
-                    return True, str(data['id'])
-            return False, None
-        except Exception:
-            return False, None
+        return Data_Parser.validate_roles(resp_data, "LLDP")
 
     @staticmethod
     def validate_node_online_status(resp_data, node_name):
         """ Verify Node Online Status
         """
         try:
-            if resp_data['Data'] != None:
-                for data in eval(str(resp_data))['Data']:
-                    if str(data['Name']) == str(node_name):
-                        if str(data['nodeAvailabilityStatus']['connectionStatus']) == "online":
-                            return True
-                        else:
-                            return False
-            return False
+            data = Response_Data.of(resp_data).get('Name', node_name)
+            return data is not None and \
+                str(data['nodeAvailabilityStatus']['connectionStatus']) == "online"
         except Exception:
             return False
 
@@ -211,14 +249,8 @@ class Data_Parser:
         """ Verify Node Online Status
         """
         try:
-            if resp_data['Data'] != None:
-                for data in eval(str(resp_data))['Data']:
-                    if str(data['Name']) == str(node_name):
-                        if str(data['provisionStatus']) == "Finished":
-                            return True
-                        else:
-                            return False
-            return False
+            data = Response_Data.of(resp_data).get('Name', node_name)
+            return data is not None and str(data['provisionStatus']) == "Finished"
         except Exception:
             return False
 
@@ -239,10 +271,9 @@ class Data_Parser:
         """ verify added cluster from cluster list
         """
         try:
-            if resp_data['Data'] != None:
-                for data in eval(str(resp_data))['Data']:
-                    if str(data['name']) == str(cluster_name):
-                        return True, str(data['ID'])
+            data = Response_Data.of(resp_data).get('name', cluster_name)
+            if data is not None:
+                return True, str(data['ID'])
             return False, None
         except Exception:
             return False, None
@@ -252,10 +283,7 @@ class Data_Parser:
         """ Get Server ID added After PXE boot
         """
         try:
-            for data in eval(str(resp_data))['Data']:
-                if str(data['deployStatus']) == "installed":
-                    return True
-            return False
+            return "installed" in Response_Data.of(resp_data).index('deployStatus')
         except Exception:
             return False
 
@@ -263,7 +291,7 @@ class Data_Parser:
     def verify_app_present_in_cluster(resp_data, app_name):
         """Verify Installed App Present in cluster details"""
         try:
-            for data in eval(str(resp_data))['Data']:
+            for data in Response_Data.of(resp_data).records:
                 if str(app_name) in str(data['apps']):
                     return True
             return False
@@ -275,10 +303,8 @@ class Data_Parser:
         """ Verify added Node Present in Cluster
         """
         try:
-            for data in eval(str(resp_data))['Data']["nodes"]:
-                if int(data['id']) == int(node_id):
-                    return True
-            return False
+            nodes = Response_Data.of(resp_data).data["nodes"]
+            return any(int(data['id']) == int(node_id) for data in nodes)
         except Exception:
             return False
 
@@ -287,7 +313,7 @@ class Data_Parser:
         """ verify Deleted Cluster
         """
         try:
-            if cluster_name in eval(str(resp_data))['Data']:
+            if cluster_name in Response_Data.of(resp_data).data:
                 return False
             return True
         except Exception:
@@ -13,6 +13,9 @@ from robot.api import logger
 from robot.libraries.OperatingSystem import OperatingSystem
 from SSHLibrary import SSHLibrary
 
+from Data_Parser import Response_Data
+from Parallel_Ssh import Parallel_Ssh
+
 
 def robot_logger(msg):
     """Custom logger
@@ -21,10 +24,33 @@ def robot_logger(msg):
     logger.info(str(msg_str), html=True, also_console = True)
 
 
+# Commands cleaning up a node, run as one script as root
+CLEAN_UP_SCRIPT = {
+    "Invader": [
+        "crontab -r",
+        "ps -aef | grep supervisord | awk '{print $2}' | xargs kill -9",
+        "ps -aef | grep tinyproxy | awk '{print $2}' | xargs kill -9",
+        "ps -aef | grep dnsmasq | awk '{print $2}' | xargs kill -9",
+        "ps -aef | grep pccagent | awk '{print $2}' | xargs kill -9",
+        "ps -aef | grep collector | awk '{print $2}' | xargs kill -9",
+        "service maas-ROOT stop",
+        "apt-get remove -y dnsmasq tinyproxy supervisor lighttpd",
+        "rm -rf /srv/maas/",
+        "rm -rf /etc/network/interfaces.d/maas-xeth*",
+    ],
+    "Server": [
+        "crontab -r",
+        "ps -aef | grep pccagent | awk '{print $2}' | xargs kill -9",
+        "ps -aef | grep collector | awk '{print $2}' | xargs kill -9",
+    ],
+}
+
+
 class Entry_Criteria_Api(OperatingSystem, SSHLibrary):
 
     def __init__(self):
         self.master_node = None
+        self.ssh = Parallel_Ssh()
 
     def get_available_node_data(self, resp_data):
         """Check any Invader or Server is available in node list
@@ -37,7 +63,7 @@ class Entry_Criteria_Api(OperatingSystem, SSHLibrary):
             if not resp_data['Data']:
                 return False, None, None
             else:
-                for index, data in enumerate(eval(str(resp_data))['Data']):
+                for index, data in enumerate(Response_Data.of(resp_data).records):
                     node_data.update({index:{"name":data['Name'], "ID" : str(data["Id"]), \
                                              "HOST" : str(data["Host"])}})
                     node_id_lst.append(int(data['Id']))
@@ -53,133 +79,84 @@ class Entry_Criteria_Api(OperatingSystem, SSHLibrary):
         node_type_dict = {}
 
         try:
-            for data in node_data:
-                cmd = "ssh-keygen -f \"/home/pcc/.ssh/known_hosts\" -R {0}".format(node_data[data]["HOST"])
-                try:
-                    code, output = self.run_and_return_rc_and_output(cmd)
-                except:
-                    pass
-                robot_logger("cmd-{0} o/p={1}".format(str(cmd), output))
-
-                cmd = "ssh {0} \'{1}\'".format(node_data[data]["HOST"], "goes status")
-                try:
-                    code, output = self.run_and_return_rc_and_output(cmd)
-                except:
-                    pass
-                robot_logger("cmd-{0} o/p={1}".format(str(cmd), output))
-
+            nodes = [node_data[data] for data in node_data]
+            for node in nodes:
+                self.forget_host_key(node["HOST"])
+
+            # Ask all nodes at once
+            results, elapsed = self.ssh.run_all(
+                [(node["HOST"], "goes status") for node in nodes])
+            robot_logger("goes status on {0} nodes took {1:.1f}s".format(
+                len(nodes), elapsed))
+
+            for node, (code, output) in zip(nodes, results):
+                robot_logger("cmd-ssh {0} goes status o/p={1}".format(
+                    node["HOST"], output))
                 if "goes: command not found" in output:
-                    robot_logger("Node {0} is Server".format(node_data[data]["name"]))
-                    node_type_dict.update({node_data[data]["HOST"] : "Server"})
+                    robot_logger("Node {0} is Server".format(node["name"]))
+                    node_type_dict.update({node["HOST"] : "Server"})
                 elif "No route to host" in output:
-                    robot_logger("Node {0} is not connected with PCC".format(node_data[data]["name"]))
+                    robot_logger("Node {0} is not connected with PCC".format(node["name"]))
                 else:
-                    robot_logger("Node {0} is an Invader".format(node_data[data]["name"]))
-                    node_type_dict.update({node_data[data]["HOST"] : "Invader"})
+                    robot_logger("Node {0} is an Invader".format(node["name"]))
+                    node_type_dict.update({node["HOST"] : "Invader"})
             return node_type_dict
         except:
             return node_type_dict
 
-    def clean_invader(self, ip_addr):
-        """ Clean Invader from Backend
-        """
-        try:
-            login_op = self.open_connection(ip_addr)
-            robot_logger("login over invader Ip = ", ip_addr)
-            self.login("pcc", "cals0ft")
-
-            out = self.execute_command("sudo -s")
-            robot_logger("cmd = {} and o/p = {1}".format("sudo -s", out))
-
-            out = self.execute_command("crontab -r")
-            robot_logger("cmd = {} and o/p = {1}".format("crontab -r", out))
-            time.sleep(1)
-
-            out = self.execute_command("ps -aef | grep supervisord | awk '{print $2}' | xargs kill -9")
-            robot_logger("cmd = {} and o/p = {1}".format("kill supervisord", out))
-            time.sleep(1)
-
-            out = self.execute_command("ps -aef | grep tinyproxy | awk '{print $2}' | xargs kill -9")
-            robot_logger("cmd = {} and o/p = {1}".format("kill tinyproxy", out))
-            time.sleep(1)
-                       
-            out = self.execute_command("ps -aef | grep dnsmasq | awk '{print $2}' | xargs kill -9")
-            robot_logger("cmd = {} and o/p = {1}".format("kill dnsmasq", out))                  
-            time.sleep(1)
-
-            out = self.execute_command("ps -aef | grep dnsmasq | awk '{print $2}' | xargs kill -9")
-            robot_logger("cmd = {} and o/p = {1}".format("kill dnsmasq", out))
-            time.sleep(1)
-                     
-            out = self.execute_command("ps -aef | grep pccagent | awk '{print $2}' | xargs kill -9")
-            robot_logger("cmd = {} and o/p = {1}".format("kill pccagent ", out))
-            time.sleep(1)
-
-            out = self.execute_command("ps -aef | grep collector | awk '{print $2}' | xargs kill -9")
-            robot_logger("cmd = {} and o/p = {1}".format("kill collector ", out))
-            time.sleep(1)
-
-            out = self.execute_command("service maas-ROOT stop")
-            robot_logger("cmd = {} and o/p = {1}".format("service maas-ROOT stop", out))
-            time.sleep(3)
-
-            out = self.execute_command("apt-get remove -y dnsmasq tinyproxy supervisor lighttpd")
-            robot_logger("cmd = {} and o/p = {1}".format("apt-get remove -y dnsmasq tinyproxy supervisor lighttpd", out))
-            time.sleep(10)
-                      
-            out = self.execute_command("rm -rf /srv/maas/")
-            robot_logger("cmd = {} and o/p = {1}".format("rm -rf /srv/maas/", out))
-            time.sleep(1)
-
-            out = self.execute_command("rm -rf /etc/network/interfaces.d/maas-xeth*")
-            robot_logger("cmd = {} and o/p = {1}".format("rm -rf /etc/network/interfaces.d/maas-xeth*", out))
-            time.sleep(1)
-            # Terminating the session with Invader
-            self.close_connection()
-        except:
-              pass
-
-    def clear_server(self, ip_addr):
-        """ Clear server From Backend
+    def forget_host_key(self, ip_addr):
+        """ Remove the known host key of a node, which changes on reinstall
         """
         cmd = "ssh-keygen -f \"/home/pcc/.ssh/known_hosts\" -R {0}".format(ip_addr)
+        output = None
         try:
             code, output = self.run_and_return_rc_and_output(cmd)
         except:
             pass
         robot_logger("cmd-{0} o/p={1}".format(str(cmd), output))
 
-        cmd = "ssh {0} \'{1}\'".format((ip_addr, "sudo crontab -r"))
-        try:
-            code, output = self.run_and_return_rc_and_output(cmd)
-        except:
-            pass
-        robot_logger("cmd-{0} o/p={1}".format(str(cmd), output))
+    def clean_invader(self, ip_addr):
+        """ Clean Invader from Backend
+        """
+        return self.clean_nodes({ip_addr: "Invader"})
 
-        cmd = "ssh {0} \'{1}\'".format((ip_addr, "sudo ps -aef | grep pccagent | awk '{print $2}' | xargs kill -9"))
-        try:
-            code, output = self.run_and_return_rc_and_output(cmd)
-        except:
-            pass
-        robot_logger("cmd-{0} o/p={1}".format(str(cmd), output))
+    def clear_server(self, ip_addr):
+        """ Clear server From Backend
+        """
+        return self.clean_nodes({ip_addr: "Server"})
 
-        cmd = "ssh {0} \'{1}\'".format((ip_addr, "sudo ps -aef | grep collector | awk '{print $2}' | xargs kill -9"))
-        try:
-            code, output = self.run_and_return_rc_and_output(cmd)
-        except:
-            pass
-        robot_logger("cmd-{0} o/p={1}".format(str(cmd), output))
+    def clean_nodes(self, node_type):
+        """ Clean Invaders and Servers from Backend, all at the same time,
+            each with one script over one ssh session
+        """
+        jobs = []
+        for ip, type in node_type.items():
+            if str(type) not in CLEAN_UP_SCRIPT:
+                continue
+            self.forget_host_key(ip)
+            jobs.append((ip, CLEAN_UP_SCRIPT[str(type)]))
+
+        results, elapsed = self.ssh.run_all(
+            [(ip, "sudo sh -s", Parallel_Ssh.shell_script(lines))
+             for ip, lines in jobs])
+        robot_logger("Clean up of {0} nodes took {1:.1f}s".format(
+            len(jobs), elapsed))
+
+        for (ip, lines), (code, output) in zip(jobs, results):
+            robot_logger("Clean up of {0} rc = {1} and o/p = {2}".format(
+                ip, code, output))
+        return all(code != 255 for code, output in results)
+
+    def close_node_connections(self):
+        """ Close the ssh connections kept open to the nodes
+        """
+        self.ssh.close_all()
 
     def node_clean_up_from_back_end_command(self, node_type):
         """ Clean Node Server or Invader from back End
         """
         try:
-            for ip, type in eval(str(node_type)).items():
-                if str(type) == "Server":
-                    self.clean_invader(ip)
-                elif str(type) == "Invader":
-                    self.clean_server(ip)
-            return True
+            return self.clean_nodes(dict(node_type))
         except:
             return False
 
@@ -210,14 +187,10 @@ class Entry_Criteria_Api(OperatingSystem, SSHLibrary):
         """Get Server ID added After PXE boot
         """
         try:
-            if resp_data['Data'] != None:
-                for data in eval(str(resp_data))['Data']:
-                    if data.has_key('bmc'):
-                    	if str(data['bmc']) == str(bmc_host):
-                            return True, str(data['Id'])
-                return False, None
-            else:
-                return False, None
+            data = Response_Data.of(resp_data).get('bmc', bmc_host)
+            if data is not None:
+                return True, str(data['Id'])
+            return False, None
         except Exception:
             return False, None
 
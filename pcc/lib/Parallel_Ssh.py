@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+
+################################################
+#
+# Parallel SSH executor over multiplexed connections
+#
+################################################
+
+import os
+import subprocess
+import time
+from multiprocessing.pool import ThreadPool
+
+
+class Parallel_Ssh(object):
+    """ Runs commands and scripts on many nodes at the same time with the
+        ssh client. Each node gets one master connection, kept open for
+        `persist` after its last use (OpenSSH ControlMaster), which every
+        further command to it reuses without a new handshake or login.
+    """
+
+    def __init__(self, control_dir="/tmp/pcc_ssh", persist="10m",
+                 max_sessions=16, connect_timeout=10):
+        self.control_dir = control_dir
+        self.persist = persist
+        self.max_sessions = max(1, int(max_sessions))
+        self.connect_timeout = int(connect_timeout)
+        self.hosts = set()
+
+    def ssh_args(self, host):
+        """ Get the ssh command line to `host`, sharing its master connection
+        """
+        if not os.path.isdir(self.control_dir):
+            try:
+                os.makedirs(self.control_dir)
+            except OSError:
+                # Created by a concurrent session
+                if not os.path.isdir(self.control_dir):
+                    raise
+        return ["ssh",
+                "-o", "ControlMaster=auto",
+                "-o", "ControlPath={0}/%r@%h:%p".format(self.control_dir),
+                "-o", "ControlPersist={0}".format(self.persist),
+                "-o", "ConnectTimeout={0}".format(self.connect_timeout),
+                "-o", "BatchMode=yes",
+                "-o", "StrictHostKeyChecking=no",
+                str(host)]
+
+    def run(self, host, cmd, script=None):
+        """ Run `cmd` on `host`, with `script` as its standard input if given
+            Returns rc and output, stdout and stderr merged
+        """
+        self.hosts.add(str(host))
+        try:
+            proc = subprocess.Popen(self.ssh_args(host) + [cmd],
+                                    stdin=subprocess.PIPE,
+                                    stdout=subprocess.PIPE,
+                                    stderr=subprocess.STDOUT,
+                                    close_fds=True)
+        except OSError as err:
+            return 255, str(err)
+
+        out = proc.communicate(script.encode('utf-8') if script else None)[0]
+        return proc.returncode, out.decode('utf-8', 'replace').rstrip()
+
+    @staticmethod
+    def shell_script(lines):
+        """ Join command `lines` into one shell script for `sh -s`, which
+            echoes each command before its output
+        """
+        return "set -x\n" + "\n".join(lines) + "\n"
+
+    def run_all(self, jobs):
+        """ Run ``(host, cmd)`` or ``(host, cmd, script)`` jobs at the same
+            time, at most `max_sessions` at once
+            Returns one (rc, output) per job, in job order, and the seconds
+            all took
+        """
+        jobs = list(jobs)
+        if not jobs:
+            return [], 0.0
+
+        start = time.time()
+        pool = ThreadPool(min(self.max_sessions, len(jobs)))
+        try:
+            results = pool.map(lambda job: self.run(*job), jobs)
+        finally:
+            pool.close()
+            pool.join()
+        return results, time.time() - start
+
+    def close_all(self):
+        """ Close the master connections opened to all nodes
+        """
+        with open(os.devnull, 'w') as devnull:
+            for host in sorted(self.hosts):
+                args = self.ssh_args(host)
+                try:
+                    subprocess.call(args[:-1] + ["-O", "exit", host],
+                                    stdout=devnull, stderr=subprocess.STDOUT)
+                except OSError:
+                    pass
+        self.hosts = set()
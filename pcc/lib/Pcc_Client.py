@@ -0,0 +1,307 @@
+#!/usr/bin/env python
+
+################################################
+#
+# Pooled PCC API client with bulk request keywords
+#
+################################################
+
+import base64
+import json
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+
+import requests
+from requests.adapters import HTTPAdapter
+from robot.api import logger
+from robot.utils import timestr_to_secs
+
+from Data_Parser import Data_Parser, Response_Data
+
+try:
+    from requests.packages.urllib3.exceptions import InsecureRequestWarning
+    requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
+except (AttributeError, ImportError):
+    pass
+
+
+def robot_logger(msg):
+    """Custom logger
+    """
+    msg_str = "\n{0}\n".format(msg)
+    logger.info(str(msg_str), html=True, also_console=True)
+
+
+# Node states Wait Until Node State can wait for, and their check
+NODE_STATES = {
+    'present': lambda data, name: Data_Parser.validate_node(data, name)[0],
+    'online': Data_Parser.validate_node_online_status,
+    'provisioned': Data_Parser.validate_node_provision_status,
+}
+
+
+def token_expiry(token):
+    """Get the expiry time of a JWT bearer token, None if it has none
+    """
+    try:
+        payload = token.split('.')[1]
+        payload += '=' * (-len(payload) % 4)
+        return float(json.loads(base64.urlsafe_b64decode(str(payload)))['exp'])
+    except Exception:
+        return None
+
+
+class Pcc_Client(object):
+    """ Client for the PCC REST API keeping one pooled HTTPS session for
+        all tests of a run, refreshing its bearer token from the login API
+        before it expires or when a request is rejected with 401, and
+        sending bulk requests concurrently over the pool.
+
+        ``Open Pcc Client    ${server_url}    ${user_name}    ${user_pwd}``
+        ``@{resps}    Post Concurrently    ${add_node}    @{nodes}``
+    """
+
+    ROBOT_LIBRARY_SCOPE = 'GLOBAL'
+
+    # Seconds before the token expiry at which it is refreshed
+    TOKEN_MARGIN = 60
+
+    def __init__(self, login_uri="/security/auth/", pool_size=16,
+                 timeout=60):
+        self.login_uri = login_uri
+        self.pool_size = int(pool_size)
+        self.timeout = float(timeout)
+        self.server_url = None
+        self.credentials = None
+        self.session = None
+        self.token = None
+        self.token_expiry = None
+        self._token_lock = threading.Lock()
+
+    def open_pcc_client(self, server_url, user_name, user_pwd,
+                        pool_size=None, verify=False):
+        """ Open a pooled session to the PCC at `server_url` and log in.
+            A session already open to the same PCC and user is reused.
+            ``pool_size`` maximum number of connections kept open and of
+                requests sent at the same time
+        """
+        if pool_size is not None:
+            self.pool_size = int(pool_size)
+
+        if self.session is not None and \
+           (self.server_url, self.credentials) == \
+           (server_url.rstrip('/'), (user_name, user_pwd)):
+            return self.get_bearer_token()
+
+        self.close_pcc_client()
+        self.server_url = server_url.rstrip('/')
+        self.credentials = (user_name, user_pwd)
+
+        self.session = requests.Session()
+        self.session.verify = verify in (True, 'True', 'true')
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size,
+                              max_retries=1)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        return self.refresh_token()
+
+    def close_pcc_client(self):
+        """ Close the pooled session and its connections
+        """
+        if self.session is not None:
+            self.session.close()
+        self.session = None
+        self.token = None
+        self.token_expiry = None
+
+    def refresh_token(self):
+        """ Log in again and return the new bearer token
+        """
+        with self._token_lock:
+            return self._login()
+
+    def get_bearer_token(self):
+        """ Return the bearer token, refreshed first if about to expire
+        """
+        with self._token_lock:
+            if self.token is None or (
+                    self.token_expiry is not None and
+                    time.time() > self.token_expiry - self.TOKEN_MARGIN):
+                return self._login()
+            return self.token
+
+    def _login(self):
+        if self.session is None:
+            raise RuntimeError("No PCC client open, use Open Pcc Client first")
+
+        user_name, user_pwd = self.credentials
+        resp = self.session.post(
+            self.server_url + self.login_uri,
+            json={'username': user_name, 'password': user_pwd},
+            timeout=self.timeout)
+        if resp.status_code != 200:
+            raise RuntimeError("Login to {0} failed with status {1}: {2}".format(
+                self.server_url, resp.status_code, resp.text))
+
+        token = str(resp.json()['token'])
+        self.token = 'Bearer ' + token
+        self.token_expiry = token_expiry(token)
+        return self.token
+
+    def _request(self, method, uri, json=None, params=None):
+        token = self.get_bearer_token()
+        url = self.server_url + uri
+
+        resp = self.session.request(method, url, json=json, params=params,
+                                    headers={'Authorization': token},
+                                    timeout=self.timeout)
+        if resp.status_code == 401:
+            # Token revoked or expired early: log in once more and retry
+            with self._token_lock:
+                if self.token == token:
+                    self._login()
+                token = self.token
+            resp = self.session.request(method, url, json=json, params=params,
+                                        headers={'Authorization': token},
+                                        timeout=self.timeout)
+        return resp
+
+    def pcc_get(self, uri, params=None):
+        """ Send a GET request to `uri` of the PCC
+        """
+        return self._request('get', uri, params=params)
+
+    def pcc_post(self, uri, json=None, params=None):
+        """ Send a POST request with the `json` body to `uri` of the PCC
+        """
+        return self._request('post', uri, json=json, params=params)
+
+    def pcc_put(self, uri, json=None, params=None):
+        """ Send a PUT request with the `json` body to `uri` of the PCC
+        """
+        return self._request('put', uri, json=json, params=params)
+
+    def pcc_delete(self, uri, json=None, params=None):
+        """ Send a DELETE request to `uri` of the PCC
+        """
+        return self._request('delete', uri, json=json, params=params)
+
+    def _fan_out(self, method, uri, payloads, max_workers):
+        payloads = list(payloads)
+        if not payloads:
+            return []
+
+        workers = min(int(max_workers or self.pool_size), len(payloads))
+        start = time.time()
+
+        def send(payload):
+            try:
+                return self._request(method, uri, json=payload)
+            except requests.RequestException as err:
+                return err
+
+        pool = ThreadPool(workers)
+        try:
+            resps = pool.map(send, payloads)
+        finally:
+            pool.close()
+            pool.join()
+
+        robot_logger("{0} {1} requests to {2} in {3:.2f}s over {4} "
+                     "connections".format(len(payloads), method.upper(), uri,
+                                          time.time() - start, workers))
+        for resp in resps:
+            if isinstance(resp, Exception):
+                raise resp
+        return resps
+
+    def post_concurrently(self, uri, *payloads, **kwargs):
+        """ Send one POST request per payload to `uri` at the same time,
+            e.g. to add many nodes, sites or tenants, and return the
+            responses in payload order.
+            ``max_workers`` optional limit of requests sent at a time,
+                the pool size by default
+        """
+        return self._fan_out('post', uri, payloads, kwargs.get('max_workers'))
+
+    def put_concurrently(self, uri, *payloads, **kwargs):
+        """ Send one PUT request per payload to `uri` at the same time and
+            return the responses in payload order.
+            ``max_workers`` optional limit of requests sent at a time,
+                the pool size by default
+        """
+        return self._fan_out('put', uri, payloads, kwargs.get('max_workers'))
+
+    def delete_concurrently(self, uri, *payloads, **kwargs):
+        """ Send one DELETE request per payload to `uri` at the same time
+            and return the responses in payload order.
+            ``max_workers`` optional limit of requests sent at a time,
+                the pool size by default
+        """
+        return self._fan_out('delete', uri, payloads,
+                             kwargs.get('max_workers'))
+
+    def wait_until_node_state(self, node_name, state='online',
+                              timeout='15 minutes', uri='/pccserver/node/',
+                              interval=2, max_interval=30):
+        """ Poll the node list, searched for `node_name` only, until the
+            node reaches `state` and return the seconds it took.
+            ``state`` present, online or provisioned
+            ``timeout`` time to wait, e.g. 90s or 15 minutes
+            ``interval`` seconds before the first poll, doubled after each
+                poll up to ``max_interval``
+        """
+        if state not in NODE_STATES:
+            raise ValueError("Unknown node state {0}, expected one of {1}".format(
+                state, ', '.join(sorted(NODE_STATES))))
+        check = NODE_STATES[state]
+
+        params = {'page': 0, 'limit': 50, 'sortBy': 'name', 'sortDir': 'asc',
+                  'search': node_name}
+        interval = float(interval)
+        start = time.time()
+        deadline = start + timestr_to_secs(timeout)
+        polls = 0
+        node = None
+
+        while True:
+            polls += 1
+            resp = self.pcc_get(uri, params=params)
+            if resp.status_code == 200:
+                data = resp.json()
+                if check(data, node_name):
+                    elapsed = time.time() - start
+                    robot_logger("Node {0} {1} after {2:.1f}s and {3} polls".format(
+                        node_name, state, elapsed, polls))
+                    return round(elapsed, 1)
+                node = Response_Data.of(data).get('Name', node_name)
+
+            if time.time() + interval > deadline:
+                break
+            time.sleep(interval)
+            interval = min(interval * 2, float(max_interval))
+
+        raise AssertionError(
+            "Node {0} not {1} after {2:.0f}s, last state: {3}".format(
+                node_name, state, time.time() - start,
+                self._node_state(node) if node else 'not in node list'))
+
+    @staticmethod
+    def _node_state(node):
+        return "connectionStatus={0} provisionStatus={1}".format(
+            (node.get('nodeAvailabilityStatus') or {}).get('connectionStatus'),
+            node.get('provisionStatus'))
+
+    @staticmethod
+    def get_failed_responses(resps, status=200):
+        """ Return a message for every response without the expected
+            `status` code, empty if all succeeded
+        """
+        failed = []
+        for index, resp in enumerate(resps):
+            if str(resp.status_code) != str(status):
+                failed.append("request {0}: status {1}: {2}".format(
+                    index + 1, resp.status_code, resp.text))
+        return failed
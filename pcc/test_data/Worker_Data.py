@@ -0,0 +1,43 @@
+############################################
+#
+# Per Worker Test Data for Parallel Runs
+#
+############################################
+
+# Variable file given to each worker of Main.py -p / MaaS_Test.py -p as
+#   --variablefile Worker_Data.py:<worker_id>:<test data file>
+# It loads the test data file and appends _w<worker_id> to the names of the
+# sites, tenants, groups, roles and clusters the tests create, and to the
+# names referring to them, so concurrent workers do not collide on PCC.
+
+import runpy
+import types
+
+# Names of PCC objects created by the tests
+CREATED_NAME_SUFFIXES = ("_site_name", "_tenant_name", "_group_name",
+                         "_role_name")
+
+
+def get_variables(worker_id, data_file):
+    suffix = "_w{0}".format(worker_id)
+    variables = {}
+
+    for name, value in runpy.run_path(data_file).items():
+        if name.startswith("_") or isinstance(value, types.ModuleType):
+            continue
+        variables[name] = value
+
+    created = set()
+    for name, value in variables.items():
+        if isinstance(value, str) and (
+                name == "cluster_name" or
+                (name.startswith("create") and name.endswith(CREATED_NAME_SUFFIXES))):
+            created.add(value)
+
+    for name, value in list(variables.items()):
+        if name.endswith("_name") and isinstance(value, str) and value in created:
+            variables[name] = value + suffix
+
+    variables["worker_id"] = int(worker_id)
+    variables["worker_suffix"] = suffix
+    return variables